@@ -1,53 +1,551 @@
 import os
+import time
+import logging
+import argparse
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
 import pandas as pd
-from parser import parse_pdf, load_categories
+import pypdfium2 as pdfium
+from parser import parse_table, load_categories, parser_fingerprint, ParseState
+from categorizer import CategoryMatcher, categorize_frame
+from cache import ParseCache
+from sinks import open_sink, SINKS
+from normalize import normalize_frame, detect_format, whole_units
+from templates import TemplateRegistry, union_bbox
+from store import TransactionStore, categories_fingerprint
+from dedup import Deduplicator
+from extractors import EXTRACTORS, DEFAULT_EXTRACTOR, Extractor, get_extractor
+from rowbatch import RowBatch
+from metrics import Metrics, PROFILERS, current, use
+from ocr import PageOcr, DEFAULT_DPI, DEFAULT_LANG
+from fx import FxRates
 
-def analyze(input_source="pdfs", output_file="report.xlsx", categories_file="categories.json"):
+logger = logging.getLogger(__name__)
+
+PAGES_PER_TASK = 50  # длинные выписки режем на куски по столько страниц
+STREAM_CHUNK_ROWS = 5000  # размер пачки строк в режиме stream
+
+@dataclass
+class FileResult:
+    path: str
+    rows: RowBatch = field(default_factory=RowBatch, repr=False)
+    seconds: float = 0.0
+    error: str = None
+    cached: bool = False
+    count: int = 0  # в режиме stream rows не хранятся, только их число
+    duplicates: int = 0  # строк файла, уже встреченных в предыдущих файлах
+    learned: dict = None  # шаблон банка, выученный при разборе (уже добавлен в registry)
+
+@dataclass
+class AnalysisResult:
+    df: pd.DataFrame = None
+    summary: pd.DataFrame = None
+    files: list = field(default_factory=list)
+    metrics: Metrics = None
+
+    def __iter__(self):
+        # чтобы работало старое `df, summary = analyze(...)`
+        return iter((self.df, self.summary))
+
+    @property
+    def errors(self):
+        return {f.path: f.error for f in self.files if f.error}
+
+@dataclass
+class _ChunkResult:
+    path: str
+    pages: tuple
+    rows: RowBatch = field(default_factory=RowBatch)
+    seconds: float = 0.0
+    indices: dict = None
+    orphans: list = field(default_factory=list)
+    learned: dict = None
+    error: str = None
+    metrics: Metrics = None  # замеры процесса пула
+
+def _engine_key(extractor):
+    # строки другого движка и с OCR кэшируются отдельно: движок по умолчанию без OCR не меняет старые ключи.
+    # Распознанный текст зависит от языков и разрешения, они входят в ключ ("rus+eng" — допустимое имя файла)
+    if extractor is None:
+        return None
+    if extractor.ocr is not None:
+        return f"{extractor.name}-ocr-{extractor.ocr.lang}-{extractor.ocr.dpi}"
+    return None if extractor.name == DEFAULT_EXTRACTOR else extractor.name
+
+def _parse_chunk(path, pages, registry=None, extractor: Extractor = None, metrics: Metrics = None):
+    start = time.perf_counter()
+    # шапка таблицы может быть в предыдущем куске — безымянные таблицы откладываем
+    state = ParseState(keep_orphans=pages is not None and pages[0] > 0)
+    result = _ChunkResult(path, pages, metrics=metrics)
+    collector = metrics or current()  # в процессе пула — свой сборщик, его замеры вернутся с результатом
+    with use(collector), collector.stage("parse", path), collector.profiled(path, pages):
+        try:
+            extractor = extractor or get_extractor()
+            result.rows = RowBatch.concat(extractor.extract_batches(path, pages=pages, state=state, registry=registry))
+            result.indices = state.saved_indices
+            result.orphans = state.orphans
+            result.learned = state.learned
+        except Exception as e:
+            result.error = f"{type(e).__name__}: {e}"
+    result.seconds = time.perf_counter() - start
+    return result
+
+def _split_pages(path, pages_per_task):
+    try:
+        # число страниц — через pdfium: pdfplumber грузится, только если файл и правда разбирается им
+        doc = pdfium.PdfDocument(path)
+        total = len(doc)
+        doc.close()
+    except Exception:
+        return [None]  # битый файл упадёт сам в своём воркере
+    if total <= pages_per_task:
+        return [None]
+    return [(start, min(start + pages_per_task, total)) for start in range(0, total, pages_per_task)]
+
+def _merge_chunks(path, chunks, registry=None):
+    result = FileResult(path)
+    saved_indices = None
+    learned = None
+    for chunk in chunks:
+        result.seconds += chunk.seconds
+        if chunk.error:
+            result.error = chunk.error if chunk.pages is None else f"страницы {chunk.pages[0] + 1}-{chunk.pages[1]}: {chunk.error}"
+            result.rows = RowBatch()
+            return result
+        if chunk.orphans and saved_indices is not None:
+            state = ParseState(saved_indices)
+            for page_number, table_number, table in chunk.orphans:
+                parse_table(table, None, state, page_number, table_number, out=result.rows)
+        result.rows.extend(chunk.rows)
+        if chunk.indices is not None:
+            saved_indices = chunk.indices
+        if chunk.learned is not None:
+            if learned is None:
+                learned = chunk.learned
+            elif chunk.learned.get("bbox"):
+                learned["bbox"] = union_bbox(learned.get("bbox"), chunk.learned["bbox"])
+    result.learned = learned
+    if learned is not None and registry is not None:
+        registry.add(learned)
+    return result
+
+def parse_files(files, workers=None, pages_per_task=PAGES_PER_TASK, cache: ParseCache = None, rebuild=False,
+                registry: TemplateRegistry = None, extractor: Extractor = None, digests=None):
     """
-    input_source: str (папка) или list (список файлов)
+    Разбирает файлы в сырые строки (без категорий), при workers > 1 — в пуле процессов.
+    cache: ParseCache — уже разобранные файлы берутся из него; rebuild=True — перечитать всё.
+    registry: TemplateRegistry — шаблоны банков, новые шаблоны сохраняются в нём.
+    extractor: движок извлечения (см. extractors), None — pdfplumber.
+    digests: уже посчитанные SHA-256 файлов в порядке files, для ключей кэша.
+    Возвращает список FileResult в том же порядке, что и files.
     """
-    categories = load_categories(categories_file)
-    all_rows = []
+    results = [None] * len(files)
+    keys = {}
+    pending = []
+    metrics = current()
+    for i, path in enumerate(files):
+        if cache is not None:
+            start = time.perf_counter()
+            try:
+                keys[i] = cache.key(path, _engine_key(extractor), digests[i] if digests else None)
+            except OSError as e:
+                results[i] = FileResult(path, error=f"{type(e).__name__}: {e}")
+                continue
+            rows = None if rebuild else cache.get(keys[i])
+            metrics.cache(path, rows is not None)
+            if rows is not None:
+                results[i] = FileResult(path, rows, time.perf_counter() - start, cached=True)
+                continue
+        pending.append(i)
 
-    # Преобразуем вход в список файлов
-    if isinstance(input_source, str):
-        # Папка
-        files = [os.path.join(input_source, f) for f in os.listdir(input_source) if f.endswith(".pdf")]
-    elif isinstance(input_source, list):
-        # Список файлов
-        files = [f for f in input_source if f.endswith(".pdf")]
+    if not workers or workers <= 1:
+        for i in pending:
+            results[i] = _merge_chunks(files[i], [_parse_chunk(files[i], None, registry, extractor)], registry)
     else:
-        raise TypeError("input_source должен быть строкой (папка) или списком файлов.")
+        tasks = [(i, pages) for i in pending for pages in _split_pages(files[i], pages_per_task)]
+        chunks = {i: [] for i in pending}
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_parse_chunk, files[i], pages, registry, extractor, metrics.child())
+                       for i, pages in tasks]
+            for (i, pages), future in zip(tasks, futures):
+                try:
+                    chunks[i].append(future.result())
+                except Exception as e:  # например, воркер упал целиком
+                    chunks[i].append(_ChunkResult(files[i], pages, error=f"{type(e).__name__}: {e}"))
+                if chunks[i][-1].metrics is not None:
+                    metrics.merge(chunks[i][-1].metrics)
+        for i in pending:
+            with metrics.stage("merge", files[i]):
+                results[i] = _merge_chunks(files[i], chunks[i], registry)
 
-    for file_path in files:
-        all_rows.extend(parse_pdf(file_path, categories))
+    for result in results:
+        result.count = len(result.rows)
+        metrics.file(result.path, result.count, result.seconds, result.error)
+    if registry is not None:
+        registry.save()
+    if cache is not None:
+        for i in pending:
+            if not results[i].error:
+                cache.put(keys[i], results[i].rows)
+    return results
 
-    if not all_rows:
-        print("Нет транзакций для анализа.")
-        return None, None
-
-    df = pd.DataFrame(all_rows)
-
-    # Преобразуем даты в datetime с автоматическим определением формата
-    df['date'] = pd.to_datetime(df['date'], dayfirst=True, errors='coerce', infer_datetime_format=True)
+def _prepare(df: pd.DataFrame, matcher: CategoryMatcher, fmt=None, fx: FxRates = None) -> pd.DataFrame:
+    # Даты и суммы одной выписки приводим к типам по колонкам, формат определяется один раз на файл
+    df = categorize_frame(normalize_frame(df, fmt), matcher)
 
     # Удаляем строки, где дата не распознана
     df = df.dropna(subset=['date'])
+    if fx is not None:
+        # amount (и все сводки) — в валюте отчёта; исходная сумма остаётся в amount_minor и currency
+        converted = fx.convert(df["amount_minor"], df["currency"], df["date"])
+        missing = converted.isna() & df["amount_minor"].notna()
+        if missing.any():
+            logger.warning("Нет курса к %s для %d строк (%s): в суммы они не входят", fx.target, missing.sum(),
+                           ", ".join(sorted(df.loc[missing, "currency"].unique())))
+        df["amount"] = whole_units(converted)
+    return df
 
-    # Добавляем округление до минуты для удаления дубликатов
-    df['minute'] = df['date'].dt.floor('T')
-    df = df.drop_duplicates(subset=['minute', 'amount', 'description'], keep='first')
-    df = df.drop(columns='minute')
+def _warn_currencies(currencies, fx: FxRates = None):
+    if fx is None and len(currencies) > 1:
+        logger.warning("В выписках несколько валют (%s): суммы сложены без пересчёта, задайте курсы (--fx-rates)",
+                       ", ".join(sorted(currencies)))
 
-    summary = df.groupby("category")["amount"].sum().reset_index()
+def _rebatch(batches, size):
+    # постраничные RowBatch -> пачки не меньше size строк (последняя — что осталось)
+    chunk = RowBatch()
+    for batch in batches:
+        chunk.extend(batch)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = RowBatch()
+    if chunk:
+        yield chunk
 
-    # Записываем в Excel
-    with pd.ExcelWriter(output_file, engine="openpyxl") as writer:
-        summary.to_excel(writer, sheet_name="Сводка", index=False)
-        df.to_excel(writer, sheet_name="Детализация", index=False)
+def _iter_pdf_chunks(path, registry, chunk_rows, extractor=None):
+    state = ParseState()
+    extractor = extractor or get_extractor()
+    yield from _rebatch(extractor.extract_batches(path, state=state, registry=registry), chunk_rows)
+    if state.learned is not None and registry is not None:
+        registry.add(state.learned)
+        registry.save()
 
-    print(f"Отчет сохранен в {output_file}")
+def _iter_file_chunks(result: FileResult, cache: ParseCache, rebuild, chunk_rows, registry=None, extractor=None):
+    # сырые строки файла пачками: из кэша, если есть, иначе постранично из PDF с записью в кэш
+    if cache is None:
+        yield from _iter_pdf_chunks(result.path, registry, chunk_rows, extractor)
+        return
+    key = cache.key(result.path, _engine_key(extractor))
+    batches = None if rebuild else cache.get_batches(key)
+    current().cache(result.path, batches is not None)
+    if batches is not None:
+        result.cached = True
+        yield from batches
+        return
+    with cache.writer(key) as writer:
+        for chunk in _iter_pdf_chunks(result.path, registry, chunk_rows, extractor):
+            writer.write(chunk)
+            yield chunk
+
+def _analyze_stream(files, output_file, matcher, cache, rebuild, registry=None, dedup=None, output_format=None,
+                    chunk_rows=STREAM_CHUNK_ROWS, extractor=None, fx=None):
+    file_results = []
+    if dedup is None:
+        dedup = Deduplicator()
+    totals = defaultdict(float)
+    currencies = set()
+    metrics = current()
+
+    with open_sink(output_file, output_format) as sink:
+        for path in files:
+            result = FileResult(path)
+            file_results.append(result)
+            start = time.perf_counter()
+            fmt = None
+            try:
+                chunks = _iter_file_chunks(result, cache, rebuild, chunk_rows, registry, extractor)
+                with metrics.profiled(path):
+                    while True:
+                        # разбор идёт внутри next(): его время меряем отдельно от обработки пачки
+                        with metrics.stage("parse", path):
+                            chunk = next(chunks, None)
+                        if chunk is None:
+                            break
+                        result.count += len(chunk)
+                        with metrics.stage("prepare", path):
+                            df = chunk.to_frame()
+                            if fmt is None:
+                                fmt = detect_format(df)
+                            df = _prepare(df, matcher, fmt, fx)
+                        currencies.update(df["currency"].unique())
+                        with metrics.stage("dedup", path):
+                            df = dedup.filter(df, path)
+                        for category, amount in df.groupby("category")["amount"].sum().items():
+                            totals[category] += amount
+                        with metrics.stage("write", path):
+                            sink.write(df)
+            except Exception as e:
+                # строки, уже записанные до ошибки, остаются в отчёте
+                result.error = f"{type(e).__name__}: {e}"
+            result.seconds = time.perf_counter() - start
+            result.duplicates = dedup.duplicates[path]
+            metrics.file(path, result.count, result.seconds, result.error)
+
+        summary = pd.Series(totals, dtype=float).sort_index().rename_axis("category").rename("amount").reset_index()
+        sink.write_summary(summary)
+    _warn_currencies(currencies, fx)
+
+    dedup.save()
+    logger.info("Отчет сохранен в %s", output_file)
+    return AnalysisResult(None, summary, file_results)
+
+def store_fingerprint(extractor: Extractor = None, fx: FxRates = None) -> str:
+    """Отпечаток всего, от чего зависят строки в хранилище: при его смене файлы перечитываются."""
+    fingerprint = parser_fingerprint()
+    if _engine_key(extractor):
+        # смена движка — повод перечитать PDF, как и смена настроек парсера
+        fingerprint += f"-{_engine_key(extractor)}"
+    if fx is not None:
+        # суммы в хранилище — в валюте отчёта: новые курсы или валюта пересчитывают все файлы (из кэша разбора)
+        fingerprint += f"-fx{fx.fingerprint}-{fx.target}"
+    return fingerprint
+
+def store_results(store: TransactionStore, file_results, hashes, matcher: CategoryMatcher, rules, removed=(),
+                  fingerprint=None, fx: FxRates = None):
+    """
+    Разобранные файлы -> хранилище: нормализация, категории, пересчёт валют и одна транзакция записи.
+    Файлы с ошибкой пропускаются — в манифест они не попадают и будут разобраны в следующий раз.
+    fingerprint: store_fingerprint, с которым разобраны все файлы хранилища (None — не менять).
+    Возвращает (записанные пути, окно дат пересчёта дубликатов и сводки или None).
+    """
+    metrics = current()
+    with metrics.stage("prepare"):
+        frames = {r.path: _prepare(r.rows.to_frame(), matcher, fx=fx) if r.rows else None
+                  for r in file_results if not r.error}
+    _warn_currencies({c for df in frames.values() if df is not None for c in df["currency"].unique()}, fx)
+    with metrics.stage("store"):
+        window = store.update(frames, {path: hashes[path] for path in frames}, removed, rules=rules)
+    with store.connection:
+        if fingerprint is not None:
+            store.set_meta("parser", fingerprint)
+        store.set_meta("categories", rules)
+    if window:
+        logger.info("Дубликаты и сводка пересчитаны за %s — %s", window[0], window[1])
+    return list(frames), window
+
+def _analyze_incremental(files, output_file, categories, matcher, store: TransactionStore, workers, cache, rebuild,
+                         registry=None, output_format=None, extractor=None, fx=None, folders=()):
+    fingerprint = store_fingerprint(extractor, fx)
+    changed, hashes, removed = store.diff(files, force=rebuild or store.get_meta("parser") != fingerprint,
+                                          folders=folders)
+    rules = categories_fingerprint(categories)
+    known_rules = store.get_meta("categories")
+    recategorize = known_rules != rules
+    metrics = current()
+    if recategorize:
+        # категории пересчитываются по уже сохранённым строкам, PDF не перечитываются
+        with metrics.stage("recategorize"):
+            moved = store.recategorize(matcher)
+        if known_rules is not None:
+            logger.info("Правила категорий изменились: категория сменилась у %d строк", moved)
+
+    parsed = {r.path: r for r in parse_files(changed, workers=workers, cache=cache, rebuild=rebuild,
+                                                 registry=registry, extractor=extractor)}
+    stored, _ = store_results(store, parsed.values(), hashes, matcher, rules, removed, fingerprint, fx)
+
+    manifest = store.manifest()
+    duplicates = store.duplicates()
+    file_results = [parsed.get(path) or FileResult(path, cached=True, count=manifest[path][3]) for path in files]
+    for result in file_results:
+        result.duplicates = duplicates.get(result.path, 0)
+    summary = store.summary()
+    if stored or removed or recategorize or not os.path.exists(output_file):
+        with metrics.stage("write"), open_sink(output_file, output_format) as sink:
+            for df in store.iter_frames():
+                sink.write(df)
+            sink.write_summary(summary)
+        logger.info("Отчет сохранен в %s", output_file)
+    else:
+        logger.info("Новых выписок нет, отчет %s не изменился", output_file)
+    return AnalysisResult(None, summary, file_results)
+
+def _analyze_files(files, output_file, matcher, workers, cache, rebuild, registry=None, dedup=None,
+                   output_format=None, extractor=None, fx=None):
+    file_results = parse_files(files, workers=workers, cache=cache, rebuild=rebuild, registry=registry,
+                               extractor=extractor)
+    if dedup is None:
+        dedup = Deduplicator()
+    df, summary = build_report(file_results, matcher, dedup, fx)
+    if df is None:
+        logger.info("Нет транзакций для анализа.")
+        return AnalysisResult(files=file_results)
+
+    with current().stage("write"), open_sink(output_file, output_format) as sink:
+        sink.write_summary(summary)
+        sink.write(df)
+
+    dedup.save()
+    logger.info("Отчет сохранен в %s", output_file)
+    return AnalysisResult(df, summary, file_results)
+
+def build_report(file_results, matcher: CategoryMatcher, dedup: Deduplicator = None, fx: FxRates = None):
+    """
+    Разобранные файлы -> (df, summary): нормализация, категории и дедупликация в порядке файлов.
+    Файлы с ошибкой пропускаются; (None, None), если строк нет совсем.
+    fx: курсы — amount и сводка в валюте отчёта fx.target; без них суммы разных валют складываются как есть.
+    """
+    # Дубликаты отсеиваются пофайлово по хэшам ключей, без общей таблицы ключей
+    if dedup is None:
+        dedup = Deduplicator()
+    frames = []
+    metrics = current()
+    for r in file_results:
+        if r.rows:
+            with metrics.stage("prepare", r.path):
+                df = _prepare(r.rows.to_frame(), matcher, fx=fx)
+            with metrics.stage("dedup", r.path):
+                frames.append(dedup.filter(df, r.path))
+            r.duplicates = dedup.duplicates[r.path]
+    if not frames:
+        return None, None
+    df = pd.concat(frames, ignore_index=True)
+    _warn_currencies(set(df["currency"].unique()), fx)
+    summary = df.groupby("category")["amount"].sum().reset_index()
     return df, summary
 
+def analyze(input_source="pdfs", output_file="report.xlsx", categories_file="categories.json", workers=None,
+            cache=True, rebuild=False, stream=False, templates=True, incremental=False, dedup=None, output_format=None,
+            engine=DEFAULT_EXTRACTOR, ocr=False, fx=None, currency=None, metrics=None):
+    """
+    input_source: str (папка или один PDF) или list (список файлов)
+    workers: число процессов для разбора PDF (None или 1 — в текущем процессе)
+    cache: True — кэш разбора в папке по умолчанию, ParseCache — свой, False — без кэша
+    rebuild: разобрать все PDF заново и перезаписать кэш
+    stream: разбирать файлы по одному постранично и писать отчёт пачками, не собирая
+            все строки в памяти (workers не используется, df в результате — None)
+    templates: True — шаблоны банков из файла по умолчанию, TemplateRegistry — свои, False — без шаблонов
+    incremental: True — хранилище транзакций по умолчанию, TransactionStore — своё. Разбираются только
+                 новые и изменённые PDF, отчёт пишется из хранилища (df в результате — None).
+                 Из хранилища убираются только файлы, пропавшие из папки input_source;
+                 для одного файла или списка ничего не удаляется
+    output_format: "xlsx", "parquet", "feather", "csv" или "sqlite"; None — по расширению output_file
+    engine: движок извлечения таблиц — имя из extractors.EXTRACTORS ("pdfplumber", "camelot-lattice",
+            "camelot-stream", "text", "auto") или свой Extractor
+    ocr: True — распознавать страницы без текстового слоя (сканы) локальным tesseract с настройками
+         по умолчанию, ocr.PageOcr — со своими (dpi, языки, размер пула, кэш); False — сканы пропускаются
+    fx: курсы валют — путь к CSV (date, currency, rate к KZT) или FxRates; суммы и сводки пересчитываются
+        в валюту отчёта, точная сумма со знаком и валюта строки остаются в amount_minor и currency
+    currency: валюта отчёта при fx (по умолчанию — базовая валюта курсов)
+    metrics: True — собрать замеры разбора (время по файлам, страницам и этапам, пропущенные таблицы,
+             попадания в кэш) в новый Metrics, Metrics — в свой; результат — в AnalysisResult.metrics
+    dedup: Deduplicator с файлом — ключи строк запоминаются между запусками, и в отчёт
+           попадают только операции, которых не было в прошлых отчётах (кроме incremental)
+    """
+    categories = load_categories(categories_file)
+    matcher = CategoryMatcher(categories)
+    extractor = get_extractor(engine, ocr=PageOcr() if ocr is True else ocr or None)
+
+    # Преобразуем вход в список файлов
+    folders = []  # папки, перечисленные целиком: только из них файлы могут пропасть из хранилища
+    if isinstance(input_source, str) and os.path.isfile(input_source):
+        files = [input_source]
+    elif isinstance(input_source, str):
+        # Папка
+        files = [os.path.join(input_source, f) for f in sorted(os.listdir(input_source)) if f.endswith(".pdf")]
+        folders.append(input_source)
+    elif isinstance(input_source, list):
+        # Список файлов
+        files = [f for f in input_source if f.endswith(".pdf")]
+    else:
+        raise TypeError("input_source должен быть строкой (папка) или списком файлов.")
+
+    if cache is True:
+        cache = ParseCache()
+    if templates is True:
+        templates = TemplateRegistry()
+    if metrics is True:
+        metrics = Metrics()
+    if isinstance(fx, str):
+        fx = FxRates.load(fx)
+    if fx is not None and currency:
+        fx = fx.to(currency)
+    with use(metrics or current()):
+        if incremental:
+            store = TransactionStore() if incremental is True else incremental
+            try:
+                result = _analyze_incremental(files, output_file, categories, matcher, store, workers, cache or None,
+                                              rebuild, templates or None, output_format, extractor, fx, folders)
+            finally:
+                if incremental is True:
+                    store.close()
+        elif stream:
+            result = _analyze_stream(files, output_file, matcher, cache or None, rebuild, templates or None, dedup,
+                                     output_format, extractor=extractor, fx=fx)
+        else:
+            result = _analyze_files(files, output_file, matcher, workers, cache or None, rebuild, templates or None,
+                                    dedup, output_format, extractor, fx)
+    result.metrics = metrics or None
+    return result
+
+def main(argv=None, prog=None):
+    ap = argparse.ArgumentParser(prog=prog, description="Анализ банковских выписок")
+    ap.add_argument("input", nargs="?", default="pdfs", help="папка с PDF или один PDF")
+    ap.add_argument("-o", "--output", default="report.xlsx")
+    ap.add_argument("-f", "--format", choices=list(SINKS), default=None,
+                    help="формат отчёта; по умолчанию — по расширению файла")
+    ap.add_argument("-c", "--categories", default="categories.json")
+    ap.add_argument("-w", "--workers", type=int, default=None, help="число процессов для разбора PDF")
+    ap.add_argument("--no-cache", action="store_true", help="не использовать кэш разбора")
+    ap.add_argument("--rebuild", action="store_true", help="разобрать все PDF заново и обновить кэш")
+    ap.add_argument("--stream", action="store_true", help="потоковый разбор с ограниченной памятью")
+    ap.add_argument("-e", "--engine", choices=list(EXTRACTORS), default=DEFAULT_EXTRACTOR,
+                    help="движок извлечения таблиц; auto — выбрать по первым страницам каждого банка")
+    ap.add_argument("--no-templates", action="store_true", help="не использовать шаблоны банков")
+    ap.add_argument("--ocr", action="store_true", help="распознавать страницы-сканы (нужен tesseract)")
+    ap.add_argument("--ocr-dpi", type=int, default=DEFAULT_DPI, help="разрешение растра для OCR")
+    ap.add_argument("--ocr-lang", default=DEFAULT_LANG, help="языки tesseract")
+    ap.add_argument("--ocr-workers", type=int, default=None, help="число процессов OCR (по умолчанию — по ядрам)")
+    ap.add_argument("--fx-rates", default=None,
+                    help="CSV дневных курсов (date, currency, rate к KZT): суммы пересчитываются в валюту отчёта")
+    ap.add_argument("--currency", default=None, help="валюта отчёта для --fx-rates (по умолчанию KZT)")
+    ap.add_argument("--incremental", action="store_true",
+                    help="разбирать только новые и изменённые PDF, остальное брать из хранилища транзакций")
+    ap.add_argument("--store", default=None, help="файл хранилища транзакций для --incremental")
+    ap.add_argument("--dedup-state", default=None,
+                    help="файл .npy с ключами прошлых запусков: в отчёт попадут только новые операции")
+    ap.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+                    help="подробность диагностики; DEBUG — по страницам и таблицам")
+    ap.add_argument("--metrics", default=None,
+                    help="файл замеров разбора: .json или .prom (текстовый формат Prometheus)")
+    ap.add_argument("--profile", choices=PROFILERS, default=None, help="профилировать разбор каждого файла")
+    ap.add_argument("--profile-dir", default="profiles", help="папка для профилей --profile")
+    args = ap.parse_args(argv)
+    logging.basicConfig(level=args.log_level, format="%(message)s")
+
+    fx = None
+    if args.fx_rates:
+        try:
+            fx = FxRates.load(args.fx_rates, target=args.currency)
+        except ValueError as e:
+            ap.error(str(e))
+    incremental = args.incremental
+    if incremental and args.store:
+        incremental = TransactionStore(args.store)
+    result = analyze(args.input, args.output, args.categories, workers=args.workers,
+                     cache=not args.no_cache, rebuild=args.rebuild, stream=args.stream,
+                     templates=not args.no_templates, incremental=incremental,
+                     dedup=Deduplicator(args.dedup_state) if args.dedup_state else None, output_format=args.format,
+                     engine=args.engine,
+                     ocr=PageOcr(args.ocr_dpi, args.ocr_lang, args.ocr_workers) if args.ocr else False,
+                     fx=fx,
+                     metrics=Metrics(args.profile, args.profile_dir) if args.metrics or args.profile else None)
+    if args.metrics:
+        result.metrics.save(args.metrics)
+    for f in result.files:
+        status = f"ошибка: {f.error}" if f.error else f"{f.count} строк" + (" (кэш)" if f.cached else "")
+        if f.duplicates:
+            status += f", дубликатов {f.duplicates}"
+        print(f"{f.path}: {status}, {f.seconds:.2f} с")
+
 if __name__ == "__main__":
-    analyze()
\ No newline at end of file
+    main()
@@ -0,0 +1,76 @@
+"""
+Сравнение parser.categorize и CategoryMatcher.
+
+    python benchmarks/bench_categorize.py --rows 200000 --scale 20
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parser import categorize, load_categories
+from categorizer import CategoryMatcher
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+NOISE = ["Покупка", "Оплата", "KASPI", "QR", "Almaty", "Astana", "ТОО", "ИП", "Перевод с карты",
+         "Пополнение", "Shymkent", "MCC: 5411", "POS", "Card *1234"]
+
+def inflate(categories, scale):
+    # Синтетический справочник: каждая категория повторяется scale раз с уникальными словами
+    result = {}
+    for i in range(scale):
+        for cat, keywords in categories.items():
+            suffix = f" #{i}" if i else ""
+            result[cat + suffix] = [k + suffix for k in keywords]
+    return result
+
+def make_descriptions(categories, rows, hit_rate, seed):
+    rnd = random.Random(seed)
+    keywords = [k for kws in categories.values() for k in kws]
+    descriptions = []
+    for _ in range(rows):
+        words = rnd.sample(NOISE, 4)
+        if rnd.random() < hit_rate:
+            words.insert(rnd.randrange(len(words) + 1), rnd.choice(keywords))
+        words.append(str(rnd.randint(0, 10 ** 6)))
+        descriptions.append(" ".join(words))
+    return descriptions
+
+def timed(func, descriptions):
+    start = time.perf_counter()
+    result = [func(d) for d in descriptions]
+    return time.perf_counter() - start, result
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--categories", default=os.path.join(ROOT, "categories.json"))
+    ap.add_argument("--rows", type=int, default=50000)
+    ap.add_argument("--scale", type=int, default=20, help="во сколько раз размножить справочник")
+    ap.add_argument("--hit-rate", type=float, default=0.5)
+    ap.add_argument("--seed", type=int, default=42)
+    args = ap.parse_args()
+
+    categories = inflate(load_categories(args.categories), args.scale)
+    keywords = sum(len(v) for v in categories.values())
+    descriptions = make_descriptions(categories, args.rows, args.hit_rate, args.seed)
+
+    start = time.perf_counter()
+    matcher = CategoryMatcher(categories)
+    build = time.perf_counter() - start
+
+    old_time, old = timed(lambda d: categorize(d, categories), descriptions)
+    new_time, new = timed(matcher.categorize, descriptions)
+    mismatches = sum(a != b for a, b in zip(old, new))
+
+    print(f"Категорий: {len(categories)}, ключевых слов: {keywords}, строк: {args.rows}")
+    print(f"Сборка CategoryMatcher: {build * 1000:.1f} мс")
+    print(f"categorize:      {old_time:.3f} с ({args.rows / old_time:,.0f} строк/с)")
+    print(f"CategoryMatcher: {new_time:.3f} с ({args.rows / new_time:,.0f} строк/с)")
+    print(f"Ускорение: x{old_time / new_time:.1f}, расхождений: {mismatches}")
+
+if __name__ == "__main__":
+    main()
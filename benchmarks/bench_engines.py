@@ -0,0 +1,104 @@
+"""
+Движки извлечения (extractors.EXTRACTORS) на синтетических выписках каждого банка:
+страниц и строк в секунду, пиковая память процесса и полнота относительно эталона генератора.
+Каждый движок запускается в отдельном процессе, чтобы пиковая память не смешивалась.
+
+    python benchmarks/bench_engines.py --files 6 --pages 10 --rows 40
+"""
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pypdfium2 as pdfium
+from extractors import EXTRACTORS, get_extractor
+from synth import LAYOUTS, generate_corpus
+
+MIN_RECALL = 0.99  # движок с меньшей полнотой не рекомендуется, как бы быстр он ни был
+
+def _key(row):
+    # строка считается найденной, если совпали дата и сумма (пробелы внутри суммы не важны)
+    return "".join(str(row.get("date", "")).split()), "".join(str(row.get("amount", "")).split())
+
+def _run(engine, paths):
+    # в дочернем процессе: найденные ключи строк по файлам, время и пиковая память (ru_maxrss)
+    extractor = get_extractor(engine)
+    found = {}
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for path in paths:
+            found[path] = [_key(row) for row in extractor.extract(path)]
+    seconds = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peak //= 1024  # на macOS ru_maxrss в байтах, в Linux — в килобайтах
+    return found, seconds, peak
+
+def _recall(found, truth, paths):
+    expected = Counter(_key(row) for path in paths for row in truth[path])
+    got = Counter(key for path in paths for key in found[path])
+    return sum((expected & got).values()) / max(sum(expected.values()), 1)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--files", type=int, default=6)
+    ap.add_argument("--pages", type=int, default=10)
+    ap.add_argument("--rows", type=int, default=30, help="строк на страницу")
+    ap.add_argument("--cover-pages", type=int, default=2, help="страниц без операций в каждом файле")
+    ap.add_argument("--engine", action="append", choices=list(EXTRACTORS),
+                    help="какие движки сравнивать; по умолчанию — все установленные")
+    args = ap.parse_args()
+
+    engines = args.engine or [name for name, factory in EXTRACTORS.items() if name != "auto" and factory().available()]
+    skipped = [name for name in EXTRACTORS if name not in engines and name != "auto"]
+    context = multiprocessing.get_context("spawn")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        truth = {}
+        paths = generate_corpus(tmp, args.files, args.pages, args.rows, cover_pages=args.cover_pages, truth=truth)
+        layouts = {}
+        for path in paths:
+            layouts.setdefault(os.path.basename(path).rsplit("_", 1)[0], []).append(path)
+        pages = {path: len(pdfium.PdfDocument(path)) for path in paths}
+        print(f"Файлов: {len(paths)}, страниц: {sum(pages.values())}, "
+              f"строк: {sum(len(rows) for rows in truth.values())}")
+        if skipped:
+            print(f"Не установлены: {', '.join(skipped)}")
+
+        results = {}
+        for engine in engines:
+            with context.Pool(1) as pool:
+                results[engine] = pool.apply(_run, (engine, paths))
+
+        print(f"{'движок':<16} {'стр/с':>7} {'строк/с':>8} {'пик, МБ':>8} {'полнота':>8}")
+        for engine, (found, seconds, peak) in results.items():
+            rows = sum(len(keys) for keys in found.values())
+            recall = _recall(found, truth, paths)
+            print(f"{engine:<16} {sum(pages.values()) / seconds:7.1f} {rows / seconds:8.0f} "
+                  f"{peak / 1024:8.0f} {recall:8.3f}")
+
+        print(f"\nРекомендация по банкам (самый быстрый с полнотой не ниже {MIN_RECALL}):")
+        for layout in LAYOUTS:
+            if layout not in layouts:
+                continue
+            group = layouts[layout]
+            speeds = []
+            for engine, (found, seconds, _) in results.items():
+                recall = _recall(found, truth, group)
+                # время на группу — пропорционально её доле страниц
+                share = sum(pages[p] for p in group) / sum(pages.values())
+                speeds.append((seconds * share, engine, recall))
+            good = [(s, engine) for s, engine, recall in sorted(speeds) if recall >= MIN_RECALL]
+            detail = ", ".join(f"{engine} {recall:.3f}" for _, engine, recall in speeds)
+            print(f"{layout:<10} {good[0][1] if good else 'нет подходящего':<16} ({detail})")
+
+if __name__ == "__main__":
+    main()
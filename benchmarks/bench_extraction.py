@@ -0,0 +1,81 @@
+"""
+Скорость извлечения таблиц: полный разбор каждой страницы против
+предфильтра страниц без операций и шаблонов банка (движки "lines" и "words").
+
+    python benchmarks/bench_extraction.py --files 6 --pages 10 --rows 40 --cover-pages 2
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pdfplumber
+from parser import ParseState, parse_pdf
+from templates import TemplateRegistry
+from synth import generate_corpus
+
+def run(paths, repeat, **kwargs):
+    # лучшее из repeat прогонов: на загруженной машине разброс большой
+    best = None
+    for _ in range(repeat):
+        rows = []
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for path in paths:
+                rows.extend(parse_pdf(path, state=ParseState(), **kwargs))
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return rows, best
+
+def learn(paths, engine):
+    registry = TemplateRegistry(None)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for path in paths:
+            state = ParseState()
+            parse_pdf(path, state=state, registry=registry)
+            if state.learned is not None:
+                registry.add(state.learned)
+    for template in registry.templates:
+        template["engine"] = engine
+    return registry
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--files", type=int, default=6)
+    ap.add_argument("--pages", type=int, default=10)
+    ap.add_argument("--rows", type=int, default=30, help="строк на страницу")
+    ap.add_argument("--cover-pages", type=int, default=2, help="страниц без операций в каждом файле")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--corpus", help="папка с готовыми PDF вместо синтетических")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.corpus:
+            paths = sorted(os.path.join(args.corpus, f) for f in os.listdir(args.corpus) if f.lower().endswith(".pdf"))
+        else:
+            paths = generate_corpus(tmp, args.files, args.pages, args.rows, cover_pages=args.cover_pages)
+        pages = 0
+        for path in paths:
+            with pdfplumber.open(path) as pdf:
+                pages += len(pdf.pages)
+
+        baseline, base_time = run(paths, args.repeat, registry=None, prefilter=False)
+        variants = [
+            ("предфильтр", dict(registry=None)),
+            ("шаблон, lines", dict(registry=learn(paths, "lines"))),
+            ("шаблон, words", dict(registry=learn(paths, "words"))),
+        ]
+        print(f"Файлов: {len(paths)}, страниц: {pages}, строк: {len(baseline)}")
+        print(f"{'без оптимизаций':<16} {base_time:6.2f} с ({pages / base_time:6.1f} стр/с)")
+        for name, kwargs in variants:
+            rows, seconds = run(paths, args.repeat, **kwargs)
+            same = "совпадает" if rows == baseline else f"РАСХОЖДЕНИЕ ({len(rows)} строк)"
+            print(f"{name:<16} {seconds:6.2f} с ({pages / seconds:6.1f} стр/с), x{base_time / seconds:.1f}, {same}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Пересчёт сумм в валюту отчёта: pandas.merge_asof (сортировка строк по дате, группы по валюте)
+против fx.FxRates.convert (один searchsorted по ключу валюта+день, без сортировки строк).
+
+    python benchmarks/bench_fx.py --rows 5000000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+from fx import FxRates
+
+CURRENCIES = ("KZT", "USD", "RUB", "EUR")
+
+def make_data(rows, days, seed):
+    rnd = np.random.default_rng(seed)
+    start = np.datetime64("2020-01-01")
+    rates = pd.DataFrame({
+        "date": np.tile(start + np.arange(days), 3),
+        "currency": np.repeat(["USD", "RUB", "EUR"], days),
+        "rate": np.concatenate([rnd.uniform(400, 500, days), rnd.uniform(4, 7, days), rnd.uniform(450, 550, days)]),
+    })
+    df = pd.DataFrame({
+        "date": pd.to_datetime(start + rnd.integers(0, days, rows)),
+        "currency": pd.Series(rnd.choice(CURRENCIES, rows, p=[0.7, 0.15, 0.1, 0.05]), dtype="str"),
+        "amount_minor": pd.array(rnd.integers(-10**9, 10**9, rows), dtype="Int64"),
+    })
+    return rates, df
+
+def with_merge_asof(rates, df, base="KZT"):
+    rows = df.reset_index().sort_values("date")
+    rates = rates.assign(currency=rates["currency"].astype("str")).sort_values("date")
+    merged = pd.merge_asof(rows, rates, on="date", by="currency", direction="backward")
+    rate = merged["rate"].where(merged["currency"] != base, 1.0)
+    converted = (merged["amount_minor"].astype("Float64") * rate).round().astype("Int64")
+    return pd.Series(converted.to_numpy(), index=merged["index"].to_numpy()).sort_index()
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=5_000_000)
+    ap.add_argument("--days", type=int, default=2000)
+    ap.add_argument("--seed", type=int, default=42)
+    args = ap.parse_args()
+
+    rates, df = make_data(args.rows, args.days, args.seed)
+
+    start = time.perf_counter()
+    old = with_merge_asof(rates, df)
+    old_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    fx = FxRates(rates)
+    new = fx.convert(df["amount_minor"], df["currency"], df["date"])
+    new_time = time.perf_counter() - start
+
+    same = (old.to_numpy() == new.to_numpy()).mean()
+    print(f"Строк: {args.rows}, курсов: {len(rates)}")
+    print(f"merge_asof:   {old_time:.2f} с ({args.rows / old_time:,.0f} строк/с)")
+    print(f"searchsorted: {new_time:.2f} с ({args.rows / new_time:,.0f} строк/с)")
+    print(f"Ускорение: x{old_time / new_time:.1f}, совпадение сумм {same:.1%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Построчная нормализация дат и сумм (как раньше в parse_pdf) против normalize.normalize_frame.
+
+    python benchmarks/bench_normalize.py --rows 1000000
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+from parser import normalize_date
+from normalize import normalize_frame
+
+def legacy_amount(amount_str):
+    # прежний разбор суммы из parse_pdf
+    amount_str = amount_str.replace("₸", "")
+    matches = re.findall(r"[+-]?\d[\d\s,.]*", amount_str)
+    if not matches:
+        return None
+    try:
+        normalized = matches[0].replace(" ", "").replace(" ", "")
+        if "," in normalized and "." in normalized:
+            normalized = normalized.replace(",", "")
+        elif "," in normalized and "." not in normalized:
+            normalized = normalized.replace(",", ".")
+        return round(abs(float(normalized)))
+    except ValueError:
+        return None
+
+def make_rows(rows, seed):
+    rnd = random.Random(seed)
+    dates, amounts = [], []
+    for _ in range(rows):
+        dates.append(f"{rnd.randint(1, 28):02d}.{rnd.randint(1, 12):02d}.20{rnd.randint(20, 25)}")
+        whole = f"{rnd.randint(1, 2_000_000):,}".replace(",", " ")
+        amounts.append(f"{rnd.choice('-+')} {whole},{rnd.randint(0, 99):02d} ₸")
+    return dates, amounts
+
+def legacy(dates, amounts):
+    rows = [{"date": normalize_date(d), "amount": legacy_amount(a)} for d, a in zip(dates, amounts)]
+    df = pd.DataFrame(rows)
+    df["date"] = pd.to_datetime(df["date"], dayfirst=True, errors="coerce")
+    return df
+
+def vectorized(dates, amounts):
+    return normalize_frame(pd.DataFrame({"date": dates, "amount": amounts}))
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=1_000_000)
+    ap.add_argument("--seed", type=int, default=42)
+    args = ap.parse_args()
+
+    dates, amounts = make_rows(args.rows, args.seed)
+
+    start = time.perf_counter()
+    old = legacy(dates, amounts)
+    old_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    new = vectorized(dates, amounts)
+    new_time = time.perf_counter() - start
+
+    same_dates = (old["date"].to_numpy() == new["date"].to_numpy()).mean()
+    same_amounts = (old["amount"].astype("Int64") == new["amount"]).mean()
+    print(f"Строк: {args.rows}")
+    print(f"построчно:      {old_time:.2f} с ({args.rows / old_time:,.0f} строк/с)")
+    print(f"по колонкам:    {new_time:.2f} с ({args.rows / new_time:,.0f} строк/с)")
+    print(f"Ускорение: x{old_time / new_time:.1f}, совпадение дат {same_dates:.1%}, сумм {same_amounts:.1%}")
+
+if __name__ == "__main__":
+    main()
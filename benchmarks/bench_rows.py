@@ -0,0 +1,83 @@
+"""
+Сырые строки выписки списком словарей (как раньше возвращал parser.parse_table) против
+rowbatch.RowBatch: память на строку, размер pickle (так строки возвращаются из пула
+процессов) и время перевода в DataFrame.
+
+    python benchmarks/bench_rows.py --rows 1000000
+"""
+import argparse
+import gc
+import os
+import pickle
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+from rowbatch import RowBatch
+
+DESCRIPTIONS = ("Покупка", "Перевод", "Пополнение", "Снятие", "Разное")
+DETAILS = ("MAGNUM CASH&CARRY", "Kaspi Gold", "ИП Иванов", "SMALL АЛМАТЫ", "Яндекс Go")
+
+def make_cells(rows, seed):
+    # ячейки таблицы, как их отдаёт pdfplumber: каждая строка — отдельный объект str
+    rnd = random.Random(seed)
+    for _ in range(rows):
+        whole = f"{rnd.randint(1, 2_000_000):,}".replace(",", " ")
+        yield (f"{rnd.randint(1, 28):02d}.{rnd.randint(1, 12):02d}.{rnd.randint(20, 25)}",
+               rnd.choice(DESCRIPTIONS) + "", f"{rnd.choice('-+')} {whole},{rnd.randint(0, 99):02d} ₸",
+               "KZT" if rnd.random() < 0.9 else "USD", rnd.choice(DETAILS) + f" {rnd.randint(1, 999)}",
+               rnd.randint(1, 200))
+
+def as_dicts(cells):
+    return [{"date": date, "description": desc, "amount": amount, "currency": currency, "details": details,
+             "page": page} for date, desc, amount, currency, details, page in cells]
+
+def as_batch(cells):
+    batch = RowBatch()
+    for date, desc, amount, currency, details, page in cells:
+        batch.append(date, desc, amount, currency=currency, details=details, page=page)
+    return batch
+
+def measure(build, rows, seed):
+    # время — без tracemalloc (он замедляет выделения в разы), память — отдельной сборкой
+    start = time.perf_counter()
+    build(make_cells(rows, seed))
+    seconds = time.perf_counter() - start
+    gc.collect()
+    tracemalloc.start()
+    result = build(make_cells(rows, seed))
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size, seconds
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=1_000_000)
+    ap.add_argument("--seed", type=int, default=42)
+    args = ap.parse_args()
+
+    dicts, dicts_bytes, dicts_time = measure(as_dicts, args.rows, args.seed)
+    batch, batch_bytes, batch_time = measure(as_batch, args.rows, args.seed)
+
+    start = time.perf_counter()
+    old = pd.DataFrame(dicts)
+    old_frame = time.perf_counter() - start
+    start = time.perf_counter()
+    new = batch.to_frame()
+    new_frame = time.perf_counter() - start
+
+    same = all(old[c].astype(str).equals(new[c].astype(str)) for c in old.columns)
+    print(f"Строк: {args.rows}")
+    print(f"{'':<16} {'байт/строку':>12} {'сборка, с':>10} {'pickle, МБ':>11} {'DataFrame, с':>13}")
+    for name, size, built, obj, frame in (("список словарей", dicts_bytes, dicts_time, dicts, old_frame),
+                                          ("RowBatch", batch_bytes, batch_time, batch, new_frame)):
+        pickled = len(pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)) / 2**20
+        print(f"{name:<16} {size / args.rows:12.0f} {built:10.2f} {pickled:11.1f} {frame:13.2f}")
+    print(f"Память: в {dicts_bytes / batch_bytes:.1f} раза меньше, DataFrame совпадает: {same}")
+
+if __name__ == "__main__":
+    main()
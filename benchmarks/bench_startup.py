@@ -0,0 +1,73 @@
+"""
+Время запуска команд bank-analyzer (cli.py): полное время процесса и время импортов по
+`python -X importtime`, плюс какие тяжёлые зависимости команда загрузила.
+
+    python benchmarks/bench_startup.py --repeat 5
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from synth import generate_statement
+
+HEAVY = ("pandas", "pyarrow", "numpy", "pdfplumber", "openpyxl", "camelot", "streamlit", "plotly")
+IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+def _run(args, cwd):
+    start = time.perf_counter()
+    done = subprocess.run([sys.executable, "-X", "importtime", os.path.join(ROOT, "cli.py"), *args],
+                          cwd=cwd, capture_output=True, text=True)
+    seconds = time.perf_counter() - start
+    if done.returncode != 0:
+        raise RuntimeError(f"{' '.join(args)}: {done.stderr[-500:]}")
+    imports, heavy = 0, set()
+    for line in done.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if not match:
+            continue
+        if not match.group(3):  # верхний уровень дерева импортов: cumulative уже включает вложенные
+            imports += int(match.group(2))
+        if match.group(4) in HEAVY:
+            heavy.add(match.group(4))
+    return seconds, imports / 1e6, heavy
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf = os.path.join(tmp, "statement.pdf")
+        generate_statement(pdf, pages=2, rows_per_page=20)
+        # categories.json из корня проекта; первый прогон report наполняет кэш и хранилище
+        with open(os.path.join(ROOT, "categories.json"), encoding="utf-8") as src, \
+                open(os.path.join(tmp, "categories.json"), "w", encoding="utf-8") as dst:
+            dst.write(src.read())
+        report = ["report", pdf, "-o", "report.csv", "--incremental", "--store", "store.sqlite"]
+        _run(report, tmp)
+
+        commands = [
+            ("--help", ["--help"]),
+            ("stats", ["stats", "--store", "store.sqlite"]),
+            ("categorize текст", ["categorize", "MAGNUM CASH&CARRY"]),
+            ("parse (кэш)", ["parse", pdf]),
+            ("report (без изменений)", report),
+            ("report csv", ["report", pdf, "-o", "full.csv"]),
+            ("report xlsx", ["report", pdf, "-o", "full.xlsx"]),
+        ]
+        print(f"{'команда':<24} {'процесс, с':>10} {'импорты, с':>10}  тяжёлые зависимости")
+        for name, command in commands:
+            runs = [_run(command, tmp) for _ in range(args.repeat)]
+            seconds = min(r[0] for r in runs)
+            imports = min(r[1] for r in runs)
+            print(f"{name:<24} {seconds:10.3f} {imports:10.3f}  {', '.join(sorted(runs[0][2])) or '—'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,431 @@
+"""
+Регрессионный прогон на синтетических выписках (synth.py): parser.parse_pdf, backup.parse_pdf,
+категоризация, дедупликация (с сохранением ключей), analyze (и отчёт, прерванный ошибкой), агрегаты
+дашборда по хранилищу транзакций (куб, страница детализации, выгрузки) и разбор с шаблонами банков на выписках разной
+длины (число строк сверяется с эталоном генератора, даты операций должны различаться; те же выписки
+разбирает и движок text),
+инкрементальный analyze с общим хранилищем (сверяется, какие файлы в нём остались). Каждый замер идёт
+в отдельном процессе: лучшее время из --repeat запусков, пропускная способность и пиковая память.
+Результат пишется в JSON; с --baseline прогон сравнивается с сохранённым и завершается с кодом 1,
+если какой-то замер медленнее базового больше чем на --threshold.
+
+    python benchmarks/regression.py --baseline baseline.json --update-baseline
+    python benchmarks/regression.py --baseline baseline.json --threshold 0.2 --output bench.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from synth import LAYOUTS, MERCHANTS, OPERATIONS, generate_corpus
+
+CATEGORIES_FILE = os.path.join(ROOT, "categories.json")
+DATE_SPREAD_ROWS = 30  # в синтетической выписке с таким числом строк операции идут не в один день
+DEDUP_CHUNK_ROWS = 10000  # строк в пачке дедупликации
+PACKAGES = ("pandas", "numpy", "pyarrow", "pdfplumber", "pypdfium2", "camelot")
+
+def _matcher():
+    from categorizer import CategoryMatcher
+    from parser import load_categories
+    return CategoryMatcher(load_categories(CATEGORIES_FILE))
+
+def _case_parser(ctx):
+    from parser import parse_pdf
+    matcher = _matcher()
+
+    def run():
+        for path in ctx["paths"]:
+            parse_pdf(path, matcher)
+    return run, ctx["pages"], "стр"
+
+def _case_backup(ctx):
+    from extractors import CamelotExtractor
+    if not CamelotExtractor().available():
+        return None
+    import backup
+    matcher = _matcher()
+
+    def run():
+        for path in ctx["paths"]:
+            backup.parse_pdf(path, matcher)
+    return run, ctx["pages"], "стр"
+
+def _texts(rows, seed):
+    import random
+    rnd = random.Random(seed)
+    return [f"{rnd.choice(OPERATIONS)} {rnd.choice(MERCHANTS)} {rnd.randint(1, 999)}" for _ in range(rows)]
+
+def _case_categorize(ctx):
+    import pandas as pd
+    matcher = _matcher()
+    texts = pd.Series(_texts(ctx["table_rows"], ctx["seed"]))
+
+    def run():
+        matcher.categorize_many(texts)
+    return run, len(texts), "строк"
+
+def _check_sink_failure(workdir, df):
+    # ошибка посреди записи не оставляет недописанный отчёт ни в одном формате
+    import sqlite3
+    from sinks import SINKS, open_sink
+    for fmt in SINKS:
+        path = os.path.join(workdir, f"failed.{fmt}")
+        try:
+            with open_sink(path, fmt) as sink:
+                sink.write(df)
+                raise RuntimeError("прерванная запись")
+        except RuntimeError:
+            pass
+        if fmt == "sqlite":
+            with contextlib.closing(sqlite3.connect(path)) as connection:
+                left = connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall()
+        else:
+            left = [name for name in os.listdir(workdir) if name.startswith("failed.") and name.endswith(fmt)]
+        if left:
+            raise AssertionError(f"{fmt}: после ошибки записи остался недописанный отчёт: {left}")
+
+def _case_analyze(ctx):
+    from analyzer import analyze
+    output = os.path.join(ctx["workdir"], "report.csv")
+    _check_sink_failure(ctx["workdir"], _frame(100, ctx["seed"]))
+
+    def run():
+        analyze(ctx["corpus"], output, CATEGORIES_FILE, cache=False, templates=False)
+    return run, ctx["pages"], "стр"
+
+def _check_text_engine(paths, truth):
+    # запасной текстовый движок разбирает выписки всех банков, в том числе английскую (даты "2 5 2024")
+    from extractors import TextExtractor
+    wrong = []
+    for path in paths:
+        amounts = [row["amount"] for row in TextExtractor().extract(path)]
+        if amounts != [row["amount"] for row in truth[path]]:
+            wrong.append(f"{os.path.basename(path)}: {len(amounts)} из {len(truth[path])}")
+    if wrong:
+        raise AssertionError("движок text разобрал строки не так, как в эталоне — " + ", ".join(wrong))
+
+def _case_templates(ctx):
+    # шаблон банка выучивается по первой (короткой) выписке, следующие длиннее: строки не должны теряться
+    from analyzer import parse_files
+    from normalize import normalize_frame
+    from templates import TemplateRegistry
+    paths, truth = ctx["varied_paths"], ctx["varied_truth"]
+    _check_text_engine(paths, truth)
+
+    def run():
+        results = parse_files(paths, registry=TemplateRegistry(None))
+        lost = [f"{os.path.basename(r.path)}: {r.count} из {len(truth[r.path])}"
+                for r in results if r.count != len(truth[r.path])]
+        if lost:
+            raise AssertionError("строки потеряны — " + ", ".join(lost))
+        # операции выписки идут в разные дни: разбор дат и срезы по дням проверяются не на одной дате
+        same_day = [os.path.basename(r.path) for r in results if r.count >= DATE_SPREAD_ROWS
+                    and normalize_frame(r.rows.to_frame())["date"].dt.normalize().nunique() < 2]
+        if same_day:
+            raise AssertionError("все операции выписки в один день — " + ", ".join(same_day))
+    return run, len(paths), "файл"
+
+def _case_incremental(ctx):
+    # хранилище наполняют папка корпуса, копия varied и отдельный файл: из хранилища убирается
+    # только файл, пропавший из разобранной папки, чужие выписки остаются
+    import shutil
+    from analyzer import analyze
+    from store import TransactionStore
+    folder = os.path.join(ctx["workdir"], "incremental")
+    path = os.path.join(ctx["workdir"], "incremental.sqlite")
+    output = os.path.join(ctx["workdir"], "incremental.csv")
+
+    def run():
+        shutil.rmtree(folder, ignore_errors=True)
+        shutil.copytree(os.path.dirname(ctx["varied_paths"][0]), folder)
+        if os.path.exists(path):
+            os.remove(path)
+        with TransactionStore(path) as store:
+            for source in (ctx["corpus"], folder, ctx["paths"][0]):
+                analyze(source, output, CATEGORIES_FILE, cache=False, templates=False, incremental=store)
+            os.remove(os.path.join(folder, sorted(os.listdir(folder))[0]))
+            analyze(folder, output, CATEGORIES_FILE, cache=False, templates=False, incremental=store)
+            kept = set(store.manifest())
+        expected = set(ctx["paths"]) | {os.path.join(folder, name) for name in os.listdir(folder)}
+        if kept != expected:
+            raise AssertionError(f"в хранилище лишние {sorted(kept - expected)}, недостающие {sorted(expected - kept)}")
+    return run, len(ctx["paths"]) + len(ctx["varied_paths"]), "файл"
+
+def _frame(rows, seed):
+    # строки хранилища, из которого читает дашборд: нормализованные и категоризированные
+    import numpy as np
+    import pandas as pd
+    from normalize import whole_units
+    from parser import load_categories
+    rnd = np.random.default_rng(seed)
+    categories = list(load_categories(CATEGORIES_FILE)) + ["Без категории"]
+    minor = pd.Series(rnd.integers(-50_000_000, 50_000_000, rows))
+    return pd.DataFrame({
+        "date": pd.to_datetime(np.datetime64("2022-01-01") + rnd.integers(0, 1000, rows)),
+        "description": pd.Series(rnd.choice(OPERATIONS, rows), dtype="str"),
+        "amount": whole_units(minor),
+        "category": pd.Series(rnd.choice(categories, rows), dtype="str"),
+        "amount_minor": minor,
+        "currency": "KZT",
+        "details": pd.Series(rnd.choice(MERCHANTS, rows), dtype="str"),
+    })
+
+def _check_dedup_roundtrip(path, df):
+    # ключи переживают save и загрузку, а пустой набор (прогон без строк) не ломает следующий запуск
+    from dedup import Deduplicator
+    Deduplicator(path).save()
+    empty = Deduplicator(path)
+    if len(empty) or not empty.mask(df).all():
+        raise AssertionError("после сохранения пустого набора ключей строки считаются дубликатами")
+    empty.save()
+    if Deduplicator(path).mask(df).any():
+        raise AssertionError("сохранённые ключи не узнаются после загрузки")
+
+def _case_dedup(ctx):
+    from dedup import Deduplicator
+    df = _frame(ctx["table_rows"], ctx["seed"])
+    _check_dedup_roundtrip(os.path.join(ctx["workdir"], "dedup_keys.npy"), df.head(DEDUP_CHUNK_ROWS))
+
+    def run():
+        # как в analyze --stream: пачками, каждая сверяется со всеми ключами до неё
+        dedup = Deduplicator()
+        for start in range(0, len(df), DEDUP_CHUNK_ROWS):
+            dedup.mask(df.iloc[start:start + DEDUP_CHUNK_ROWS])
+    return run, len(df), "строк"
+
+def _dashboard_store(workdir, rows, seed):
+    # хранилище заполняется заранее в отдельном процессе: запись не входит ни во время, ни в пиковую
+    # память замера (ru_maxrss основного процесса наследуется дочерними)
+    from store import TransactionStore
+    path = os.path.join(workdir, "dashboard.sqlite")
+    source = os.path.join(workdir, "dashboard.pdf")  # файл, к которому в манифесте привязаны строки
+    open(source, "wb").close()
+    with TransactionStore(path) as store:
+        store.update({source: _frame(rows, seed)}, {source: ""})
+    return path
+
+def _check_exports(detail):
+    # кнопки выгрузки дашборда: data — функция, streamlit вызывает её по нажатию и переводит результат
+    # в bytes (convert_data_to_bytes_and_infer_mime); неподдерживаемый тип — ошибка на клике
+    import io
+    import pandas as pd
+    try:
+        from streamlit.runtime.media_file_manager import MediaFileManager
+        from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+    except ImportError:
+        return
+    storage = MemoryMediaFileStorage("/media")
+    manager = MediaFileManager(storage)
+    positions = detail.positions(detail.select(search="magnum"))
+    readers = {
+        "csv": (detail.export_csv, lambda data: pd.read_csv(io.BytesIO(data), sep=";", encoding="utf-8-sig")),
+        "parquet": (detail.export_parquet, lambda data: pd.read_parquet(io.BytesIO(data))),
+    }
+    for name, (export, read) in readers.items():
+        file_id = manager.add_deferred(lambda: export(positions), None, name, file_name=f"export.{name}")
+        data = storage.get_file(os.path.basename(manager.execute_deferred(file_id))).content
+        if len(read(data)) != len(positions):
+            raise AssertionError(f"выгрузка {name}: {len(read(data))} строк из {len(positions)}")
+
+def _case_dashboard(ctx):
+    from detail import StoreDetail
+    from store import TransactionStore
+    path = ctx["dashboard_store"]
+    detail = StoreDetail(path)
+    _check_exports(detail)
+
+    def run():
+        # то же, что делает дашборд при первом показе и смене фильтров
+        with TransactionStore(path) as store:
+            cube = store.cube()
+        part = cube.slice(cube.min_date, cube.max_date)
+        cube.total("Пополнения")
+        part.by_category()
+        part.by_month()
+        part.by_month_category()
+        for category in [None] + part.present_categories()[:3]:
+            selection = detail.select(cube.min_date, cube.max_date, category=category, search="magnum")
+            positions = detail.positions(selection, sort="amount")
+            len(positions)
+            detail.page(positions)
+    return run, ctx["table_rows"], "строк"
+
+CASES = {
+    "parser.parse_pdf": _case_parser,
+    "backup.parse_pdf": _case_backup,
+    "categorize": _case_categorize,
+    "dedup": _case_dedup,
+    "analyze": _case_analyze,
+    "dashboard": _case_dashboard,
+    "templates": _case_templates,
+    "incremental": _case_incremental,
+}
+
+def _run(name, ctx, repeat):
+    # в дочернем процессе: лучшее время из repeat запусков и пиковая память процесса (ru_maxrss)
+    logging.disable(logging.CRITICAL)
+    os.chdir(ctx["workdir"])  # backup.parse_pdf пишет parsed_transactions.csv в текущую папку
+    with contextlib.redirect_stdout(io.StringIO()):
+        case = CASES[name](ctx)
+        if case is None:
+            return None
+        run, units, unit = case
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            times.append(time.perf_counter() - start)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peak //= 1024  # на macOS ru_maxrss в байтах, в Linux — в килобайтах
+    seconds = min(times)
+    return {"seconds": seconds, "units": units, "unit": unit, "throughput": units / seconds, "peak_kb": peak}
+
+def _versions():
+    from importlib.metadata import PackageNotFoundError, version
+    versions = {}
+    for package in PACKAGES:
+        try:
+            versions[package] = version(package if package != "camelot" else "camelot-py")
+        except PackageNotFoundError:
+            versions[package] = None
+    return versions
+
+def compare(results, baseline, threshold, memory_threshold=None):
+    """
+    Отклонения от базового прогона по каждому замеру: (имя, изменение скорости, изменение памяти, регрессия).
+    Скорость сравнивается по пропускной способности, так что базовый прогон на другом объёме корпуса тоже годится.
+    """
+    rows = []
+    for name, result in results.items():
+        base = (baseline or {}).get(name)
+        if result is not None and "error" in result:
+            rows.append((name, None, None, True))
+            continue
+        if result is None or base is None or "error" in base:
+            rows.append((name, None, None, False))
+            continue
+        slower = base["throughput"] / result["throughput"] - 1
+        heavier = result["peak_kb"] / base["peak_kb"] - 1
+        regressed = slower > threshold or (memory_threshold is not None and heavier > memory_threshold)
+        rows.append((name, slower, heavier, regressed))
+    return rows
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--files", type=int, default=4)
+    ap.add_argument("--pages", type=int, default=10)
+    ap.add_argument("--rows", type=int, default=30, help="строк на страницу")
+    ap.add_argument("--header-rows", type=int, choices=(1, 2), default=2, help="строк в шапке таблицы")
+    ap.add_argument("--cover-pages", type=int, default=1, help="страниц без операций в каждом файле")
+    ap.add_argument("--varied-rows", type=int, nargs="+", default=[5, 70, 30],
+                    help="строк в выписках одного банка по очереди для замера templates")
+    ap.add_argument("--table-rows", type=int, default=500_000,
+                    help="строк в наборе данных для категоризации, дедупликации и агрегатов дашборда")
+    ap.add_argument("--repeat", type=int, default=3, help="запусков на замер, берётся лучший")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--case", action="append", choices=list(CASES), help="какие замеры запускать; по умолчанию — все")
+    ap.add_argument("--output", default="bench_results.json", help="куда записать результаты (JSON)")
+    ap.add_argument("--baseline", help="JSON базового прогона для сравнения")
+    ap.add_argument("--threshold", type=float, default=0.2, help="допустимое замедление, доля (0.2 — на 20%%)")
+    ap.add_argument("--memory-threshold", type=float, help="допустимый рост пиковой памяти, доля; по умолчанию не проверяется")
+    ap.add_argument("--update-baseline", action="store_true", help="записать результаты в --baseline вместо сравнения")
+    args = ap.parse_args()
+
+    names = args.case or list(CASES)
+    params = {key: getattr(args, key) for key in ("files", "pages", "rows", "header_rows", "cover_pages", "varied_rows",
+                                                  "table_rows", "repeat", "seed")}
+    context = multiprocessing.get_context("spawn")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus = os.path.join(tmp, "corpus")
+        workdir = os.path.join(tmp, "work")
+        os.makedirs(workdir)
+        truth = {}
+        paths = generate_corpus(corpus, args.files, args.pages, args.rows, list(LAYOUTS), args.cover_pages, args.seed,
+                                truth, header_rows=args.header_rows)
+        varied_truth = {}
+        varied_paths = generate_corpus(os.path.join(tmp, "varied"), len(LAYOUTS) * len(args.varied_rows), 1,
+                                       args.varied_rows, list(LAYOUTS), 0, args.seed, varied_truth,
+                                       header_rows=args.header_rows)
+        ctx = {"paths": paths, "corpus": corpus, "workdir": workdir, "seed": args.seed, "table_rows": args.table_rows,
+               "pages": len(paths) * (args.pages + args.cover_pages), "varied_paths": varied_paths,
+               "varied_truth": varied_truth}
+        if "dashboard" in names:
+            with context.Pool(1) as pool:
+                ctx["dashboard_store"] = pool.apply(_dashboard_store, (workdir, args.table_rows, args.seed))
+        print(f"Файлов: {len(paths)}, страниц: {ctx['pages']}, строк в выписках: "
+              f"{sum(len(rows) for rows in truth.values())}, строк в наборе данных: {args.table_rows}")
+
+        results = {}
+        for name in names:
+            with context.Pool(1) as pool:
+                try:
+                    results[name] = pool.apply(_run, (name, ctx, args.repeat))
+                except Exception as e:  # замер с проверкой результата не прошёл
+                    results[name] = {"error": f"{type(e).__name__}: {e}"}
+
+    report = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "packages": _versions(),
+        "params": params,
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    baseline = None
+    if args.baseline and not args.update_baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("params") != params:
+            print("Внимание: параметры базового прогона другие, сравнивается пропускная способность")
+
+    rows = compare(results, baseline and baseline["results"], args.threshold, args.memory_threshold)
+    print(f"{'замер':<18} {'время, с':>9} {'единиц/с':>16} {'пик, МБ':>8} {'скорость':>9} {'память':>8}")
+    for name, slower, heavier, regressed in rows:
+        result = results[name]
+        if result is None:
+            print(f"{name:<18} пропущен (зависимость не установлена)")
+            continue
+        if "error" in result:
+            print(f"{name:<18} ОШИБКА: {result['error']}")
+            continue
+        change = f"{-slower:+9.0%} {heavier:+8.0%}" if slower is not None else f"{'—':>9} {'—':>8}"
+        print(f"{name:<18} {result['seconds']:9.3f} {result['throughput']:10,.0f} {result['unit']:<5} "
+              f"{result['peak_kb'] / 1024:8.0f} {change}{'  РЕГРЕССИЯ' if regressed else ''}")
+    print(f"Результаты: {args.output}")
+
+    errors = [name for name, result in results.items() if result is not None and "error" in result]
+    if errors:
+        print(f"Замеры с ошибкой: {', '.join(errors)}")
+        return 1
+    if args.update_baseline and args.baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Базовый прогон обновлён: {args.baseline}")
+        return 0
+    failed = [name for name, _, _, regressed in rows if regressed]  # ошибки уже отсеяны выше
+    if failed:
+        print(f"Медленнее базового больше чем на {args.threshold:.0%}"
+              f"{' или тяжелее по памяти' if args.memory_threshold is not None else ''}: {', '.join(failed)}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
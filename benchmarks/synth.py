@@ -0,0 +1,190 @@
+"""
+Генератор синтетических PDF-выписок для бенчмарков.
+
+    python benchmarks/synth.py out_dir --files 5 --pages 20 --rows 30 --layout kaspi --header-rows 2
+    python benchmarks/synth.py out_dir --files 9 --pages 1 --rows 5 70 30
+"""
+import argparse
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.platypus import PageBreak, Paragraph, SimpleDocTemplate, Table, TableStyle
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parser import column_map
+
+# Шапки таблиц в терминах column_map: так выглядят выписки разных банков
+LAYOUTS = {
+    "kaspi": ["Дата", "Сумма", "Операция", "Детали"],
+    "halyk": ["Дата", "Описание", "Сумма", "Валюта"],
+    "english": ["Date", "Description", "Amount", "Transaction currency", "Details"],
+    "forte": ["Дата", "Описание", "Детализация", "Сумма", "Валюта"],
+}
+TITLES = {
+    "kaspi": "Выписка по Kaspi Gold",
+    "halyk": "Выписка по карточному счёту",
+    "english": "Account statement",
+    "forte": "Выписка по текущему счёту",
+}
+# Вторая строка двухстрочной шапки — уточнения без цифр (parser.looks_like_headers склеит их с первой)
+HEADER_QUALIFIERS = {
+    "date": ("операции", "of transaction"),
+    "amount": ("в валюте счёта", "in account currency"),
+}
+# Англоязычные выписки: даты без ведущих нулей через пробел, суммы с точкой и кодом валюты
+# (на страницах-продолжениях нет ни ₸, ни дат dd.mm.yy — их не должен отсеять parser.page_has_transactions)
+FOREIGN_LAYOUTS = {"english"}
+# Дата операции: по умолчанию dd.mm.yy, у части банков — со временем
+DATE_FORMATS = {"halyk": "%d.%m.%Y %H:%M"}
+MINUTES_BETWEEN_ROWS = 600  # до стольких минут между соседними операциями: дни в выписке сменяются
+OPERATIONS = ["Покупка", "Перевод", "Пополнение", "Снятие", "Purchase", "Transfer"]
+MERCHANTS = ["MAGNUM CASH&CARRY", "Starbucks", "ИП Иванов", "YANDEX.GO", "Kaspi Gold", "кафе PLOV",
+             "SMALL", "Wolt", "Airba Fresh", "ТОО Рога и копыта", "Avtobys", "GALMART"]
+CURRENCIES = ["KZT", "KZT", "KZT", "USD", "RUB"]
+LEGAL_TEXT = (
+    "Настоящий документ сформирован автоматически и не требует подписи. "
+    "Банк не несёт ответственности за операции, совершённые третьими лицами. "
+    "Сведения составляют банковскую тайну и предоставляются только владельцу счёта."
+)
+FONT_NAME = "SynthFont"
+FONT_CANDIDATES = [
+    os.environ.get("BANK_ANALYZER_FONT", ""),
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/dejavu/DejaVuSans.ttf",
+    "/Library/Fonts/Arial Unicode.ttf",
+    "C:\\Windows\\Fonts\\arial.ttf",
+]
+
+def _register_font():
+    if FONT_NAME in pdfmetrics.getRegisteredFontNames():
+        return
+    candidates = list(FONT_CANDIDATES)
+    try:
+        import matplotlib
+        candidates.append(os.path.join(matplotlib.get_data_path(), "fonts", "ttf", "DejaVuSans.ttf"))
+    except ImportError:
+        pass
+    for path in candidates:
+        if path and os.path.exists(path):
+            pdfmetrics.registerFont(TTFont(FONT_NAME, path))
+            return
+    raise RuntimeError("Не найден TTF-шрифт с кириллицей, укажите путь в BANK_ANALYZER_FONT")
+
+def _column_kind(header):
+    header = header.lower()
+    for kind, aliases in column_map.items():
+        if any(a.lower() in header for a in aliases):
+            return kind
+    return None
+
+def _cell(kind, rnd, moment, layout):
+    foreign = layout in FOREIGN_LAYOUTS
+    if kind == "date":
+        if foreign:
+            return f"{moment.day} {moment.month} {moment.year}"
+        return moment.strftime(DATE_FORMATS.get(layout, "%d.%m.%y"))
+    if kind == "amount":
+        if foreign:
+            return f"{rnd.choice(('-', ''))}{rnd.randint(1, 5000)}.{rnd.randint(0, 99):02d} USD"
+        whole = f"{rnd.randint(100, 500000):,}".replace(",", " ")
+        return f"{rnd.choice('-+')} {whole},{rnd.randint(0, 99):02d} ₸"
+    if kind == "currency":
+        return "USD" if foreign else rnd.choice(CURRENCIES)
+    if kind == "description":
+        return rnd.choice(OPERATIONS)
+    return rnd.choice(MERCHANTS)
+
+def _header_rows(headers, kinds, count):
+    rows = [headers]
+    if count > 1:
+        rows.append([HEADER_QUALIFIERS.get(kind, ("", ""))[h.isascii()] for h, kind in zip(headers, kinds)])
+    return rows
+
+def generate_statement(path, layout="kaspi", pages=3, rows_per_page=30, cover_pages=1, seed=0, header_rows=1):
+    """
+    Пишет выписку: cover_pages страниц юридического текста без операций, заголовок,
+    таблица с шапкой на первой странице и таблицы-продолжения без шапки на остальных.
+    header_rows: 1 — шапка в одну строку, 2 — в две («Дата» / «операции»).
+    Возвращает записанные транзакции — словари {вид колонки: текст ячейки} (эталон для проверки разбора).
+    """
+    _register_font()
+    rnd = random.Random(seed)
+    headers = LAYOUTS[layout]
+    kinds = [_column_kind(h) for h in headers]
+    text_style = ParagraphStyle("synth", fontName=FONT_NAME, fontSize=9, leading=12)
+    table_style = TableStyle([
+        ("GRID", (0, 0), (-1, -1), 0.5, "black"),
+        ("FONT", (0, 0), (-1, -1), FONT_NAME, 8),
+    ])
+    moment = datetime(2024, 1, 1) + timedelta(days=rnd.randint(0, 300), minutes=rnd.randint(0, 24 * 60))
+
+    story = []
+    truth = []
+    for _ in range(cover_pages):
+        story.append(Paragraph(TITLES[layout], text_style))
+        story += [Paragraph(LEGAL_TEXT, text_style) for _ in range(12)]
+        story.append(PageBreak())
+    for page in range(pages):
+        data = []
+        if page == 0:
+            story.append(Paragraph(TITLES[layout], text_style))
+            story.append(Paragraph(f"Период: {moment:%d.%m.%Y} - {moment + timedelta(days=90):%d.%m.%Y}", text_style))
+            data += _header_rows(headers, kinds, header_rows)
+        for _ in range(rows_per_page):
+            moment += timedelta(minutes=rnd.randint(0, MINUTES_BETWEEN_ROWS))
+            row = [_cell(kind, rnd, moment, layout) for kind in kinds]
+            data.append(row)
+            truth.append(dict(zip(kinds, row)))
+        table = Table(data)
+        table.setStyle(table_style)
+        story += [table, PageBreak()]
+
+    SimpleDocTemplate(path, pagesize=A4).build(story)
+    return truth
+
+def generate_corpus(directory, files=5, pages=3, rows_per_page=30, layouts=None, cover_pages=1, seed=0, truth=None,
+                    header_rows=1):
+    """
+    Набор выписок по кругу из layouts; возвращает список путей. truth: dict — сюда пишутся эталоны по путям.
+    rows_per_page: число или список — тогда выписки одного банка по очереди получают разное число строк
+    (шаблон банка выучивается по первой, а следующие длиннее или короче).
+    """
+    os.makedirs(directory, exist_ok=True)
+    layouts = layouts or list(LAYOUTS)
+    paths = []
+    for i in range(files):
+        layout = layouts[i % len(layouts)]
+        path = os.path.join(directory, f"{layout}_{i:03d}.pdf")
+        rows_count = rows_per_page if isinstance(rows_per_page, int) else \
+            rows_per_page[i // len(layouts) % len(rows_per_page)]
+        rows = generate_statement(path, layout, pages, rows_count, cover_pages, seed + i, header_rows)
+        if truth is not None:
+            truth[path] = rows
+        paths.append(path)
+    return paths
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("directory")
+    ap.add_argument("--files", type=int, default=5)
+    ap.add_argument("--pages", type=int, default=3)
+    ap.add_argument("--rows", type=int, nargs="+", default=[30],
+                    help="строк на страницу; несколько чисел — по очереди для выписок одного банка")
+    ap.add_argument("--layout", action="append", choices=list(LAYOUTS))
+    ap.add_argument("--cover-pages", type=int, default=1, help="страниц без операций в начале")
+    ap.add_argument("--header-rows", type=int, choices=(1, 2), default=1, help="строк в шапке таблицы")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    paths = generate_corpus(args.directory, args.files, args.pages, args.rows, args.layout,
+                            args.cover_pages, args.seed, header_rows=args.header_rows)
+    print(f"Создано файлов: {len(paths)} в {args.directory}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+import os
+import hashlib
+import pyarrow as pa
+import pyarrow.ipc as ipc
+from parser import parser_fingerprint
+from rowbatch import RowBatch
+
+DEFAULT_CACHE_DIR = ".parse_cache"
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+BATCH_ROWS = 10000
+
+ROW_SCHEMA = pa.schema([
+    ("date", pa.string()),
+    ("description", pa.string()),
+    ("amount", pa.string()),
+    ("currency", pa.string()),
+    ("details", pa.string()),
+    ("page", pa.int32()),
+])
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+class ParseCache:
+    """
+    Кэш разобранных (ещё не категоризированных) строк на диске, формат Arrow IPC.
+    Ключ — SHA-256 содержимого PDF плюс отпечаток настроек парсера, так что
+    переименованный или заново загруженный файл попадает в тот же кэш.
+    При превышении max_bytes удаляются давно не читанные записи (LRU по mtime).
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, fingerprint=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.fingerprint = fingerprint or parser_fingerprint()
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, path: str, engine: str = None, digest: str = None) -> str:
+        """
+        engine — имя движка извлечения, если строки получены не движком по умолчанию.
+        digest — уже посчитанный SHA-256 файла, чтобы не читать его второй раз.
+        """
+        key = f"{digest or file_sha256(path)}-{self.fingerprint}"
+        return f"{key}-{engine}" if engine else key
+
+    def _entry_path(self, key):
+        return os.path.join(self.directory, key + ".arrow")
+
+    def get(self, key):
+        """RowBatch строк из кэша или None, если записи нет."""
+        batches = self.get_batches(key)
+        if batches is None:
+            return None
+        return RowBatch.concat(batches)
+
+    def get_batches(self, key):
+        """
+        Генератор RowBatch по BATCH_ROWS строк (в памяти одна пачка) или None, если записи нет.
+        """
+        entry = self._entry_path(key)
+        try:
+            source = pa.memory_map(entry)
+            reader = ipc.open_file(source)
+        except (FileNotFoundError, pa.ArrowInvalid):
+            return None
+        os.utime(entry)  # отмечаем использование для LRU
+        return self._read_batches(source, reader)
+
+    @staticmethod
+    def _read_batches(source, reader):
+        with source:
+            for i in range(reader.num_record_batches):
+                # буферы из memory_map копируются в пачку: файл закрывается после чтения
+                yield RowBatch.from_arrow(reader.get_batch(i))
+
+    def put(self, key, rows: RowBatch):
+        with self.writer(key) as writer:
+            writer.write(rows)
+
+    def writer(self, key):
+        """Запись по частям; запись появляется в кэше только после успешного закрытия."""
+        return _EntryWriter(self, self._entry_path(key))
+
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".arrow"):
+                try:
+                    stat = os.stat(os.path.join(self.directory, name))
+                except FileNotFoundError:  # запись уже вытеснил другой процесс
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith(".arrow"):
+                os.remove(os.path.join(self.directory, name))
+
+class _EntryWriter:
+    def __init__(self, cache, entry):
+        self.cache = cache
+        self.entry = entry
+        self.tmp = f"{entry}.{os.getpid()}.tmp"  # одну запись могут писать несколько процессов сразу
+        self.sink = pa.OSFile(self.tmp, "wb")
+        self.writer = ipc.new_file(self.sink, ROW_SCHEMA, options=ipc.IpcWriteOptions(compression="zstd"))
+
+    def write(self, rows: RowBatch):
+        if rows:
+            for batch in rows.to_arrow(ROW_SCHEMA).to_batches(max_chunksize=BATCH_ROWS):
+                self.writer.write_batch(batch)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.writer.close()
+        self.sink.close()
+        if exc_type is None:
+            os.replace(self.tmp, self.entry)
+            self.cache.evict()
+        else:
+            os.remove(self.tmp)
+        return False
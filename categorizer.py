@@ -0,0 +1,151 @@
+from collections import deque
+
+DEFAULT_CATEGORY = "Без категории"
+
+# Кириллические буквы, которые в выписках выглядят как латинские (после casefold).
+# Ключевые слова и описания приводятся к одной форме, поэтому "МAGNUM" с русской М
+# совпадёт с "MAGNUM".
+LOOKALIKES = {
+    "а": "a", "в": "b", "е": "e", "ё": "e", "к": "k", "м": "m", "н": "h",
+    "о": "o", "р": "p", "с": "c", "т": "t", "у": "y", "х": "x", "і": "i",
+}
+SPACES = ("\u00a0", "\u202f", "\u2007", "\n", "\r", "\t")
+CASEFOLD_EXTRA = {"ß": "ss", "ς": "σ"}
+
+_TRANSLATION = str.maketrans({**LOOKALIKES, **{ch: " " for ch in SPACES}})
+
+def normalize_text(text: str) -> str:
+    return text.casefold().translate(_TRANSLATION)
+
+def rules_diff(old: dict, new: dict):
+    """
+    Нормализованные ключевые слова, добавленные или убранные при переходе от правил old к new:
+    категорию могут сменить только строки, в тексте которых есть одно из них.
+    None — затронута может быть любая строка (переставлены категории, пустое ключевое слово).
+    """
+    common = [name for name in new if name in old]
+    if common != [name for name in old if name in new]:
+        return None
+    old_pairs = {(name, normalize_text(keyword)) for name, keywords in old.items() for keyword in keywords}
+    new_pairs = {(name, normalize_text(keyword)) for name, keywords in new.items() for keyword in keywords}
+    keywords = {keyword for _, keyword in old_pairs ^ new_pairs}
+    if "" in keywords:
+        return None
+    return keywords
+
+def _normalize_array(texts: "pa.Array") -> "pa.Array":
+    import pyarrow.compute as pc
+
+    # normalize_text по всему столбцу в Arrow: utf8_lower + те же замены; от casefold отличается
+    # только у редких букв, из них в выписках встречается разве что ß
+    texts = pc.utf8_lower(texts)
+    for source, target in {**CASEFOLD_EXTRA, **LOOKALIKES, **{ch: " " for ch in SPACES}}.items():
+        texts = pc.replace_substring(texts, source, target)
+    return texts
+
+def contains_any(texts: "pd.Series", keywords) -> "np.ndarray":
+    """Маска текстов, содержащих хотя бы одно из нормализованных ключевых слов."""
+    # numpy, pandas и pyarrow нужны только при перекатегоризации хранилища
+    import numpy as np
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    # тексты повторяются, поэтому проверяются только различные
+    codes, uniques = pd.factorize(texts.fillna(""))
+    normalized = _normalize_array(pa.array(uniques, type=pa.string()))
+    mask = np.zeros(len(uniques), dtype=bool)
+    for keyword in keywords:
+        mask |= pc.match_substring(normalized, keyword).to_numpy(zero_copy_only=False)
+    return mask[codes]
+
+class CategoryMatcher:
+    """
+    Автомат Ахо-Корасик по ключевым словам из categories.json.
+    Описание проходится один раз; при нескольких совпадениях побеждает
+    категория, которая раньше стоит в файле (как в parser.categorize).
+    """
+
+    def __init__(self, categories: dict, default: str = DEFAULT_CATEGORY):
+        self.categories = categories
+        self.default = default
+        self.names = list(categories)
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [None]  # минимальный индекс категории, оканчивающейся в состоянии
+        self._always = None  # категория с пустым ключевым словом совпадает всегда
+
+        for index, keywords in enumerate(categories.values()):
+            for keyword in keywords:
+                self._add(normalize_text(keyword), index)
+        self._build_failure_links()
+
+    def _add(self, keyword, index):
+        if not keyword:
+            if self._always is None:
+                self._always = index
+            return
+        state = 0
+        for ch in keyword:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(None)
+                self._goto[state][ch] = nxt
+            state = nxt
+        if self._out[state] is None or index < self._out[state]:
+            self._out[state] = index
+
+    def _build_failure_links(self):
+        goto, fail, out = self._goto, self._fail, self._out
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in goto[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                target = goto[f].get(ch, 0)
+                fail[nxt] = target if target != nxt else 0
+                inherited = out[fail[nxt]]
+                if inherited is not None and (out[nxt] is None or inherited < out[nxt]):
+                    out[nxt] = inherited
+
+    def match_index(self, text: str):
+        """Индекс победившей категории или None."""
+        goto, fail, out = self._goto, self._fail, self._out
+        best = self._always
+        if best == 0:
+            return 0
+        state = 0
+        for ch in normalize_text(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            found = out[state]
+            if found is not None and (best is None or found < best):
+                best = found
+                if best == 0:
+                    break
+        return best
+
+    def categorize(self, text: str) -> str:
+        index = self.match_index(text)
+        return self.default if index is None else self.names[index]
+
+    def categorize_many(self, texts) -> list:
+        # в выписках описания повторяются (магазины, переводы), каждый текст разбираем один раз
+        known = {}
+        return [known[t] if t in known else known.setdefault(t, self.categorize(t)) for t in texts]
+
+def categorize_frame(df: "pd.DataFrame", matcher: CategoryMatcher) -> "pd.DataFrame":
+    # категории ставятся после разбора, поэтому правка categories.json не требует перечитывать PDF
+    text = df["description"].fillna("")
+    if "details" in df.columns:
+        text = text + " " + df["details"].fillna("")
+    category = matcher.categorize_many(text.str.strip())
+    df.insert(df.columns.get_loc("amount") + 1, "category", category)
+    return df
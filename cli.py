@@ -0,0 +1,144 @@
+"""
+bank-analyzer: точка входа командной строки.
+
+    python cli.py parse pdfs -w 4           # разобрать PDF в кэш разбора
+    python cli.py categorize "MAGNUM 123"   # категория текста; без текста — перекатегоризация хранилища
+    python cli.py report pdfs -o report.parquet --incremental
+    python cli.py stats                     # сводка хранилища транзакций
+    python cli.py ingest --inbox inbox      # демон: новые PDF из папки -> хранилище (параметры — ingest --help)
+
+Модули с тяжёлыми зависимостями (pandas, pyarrow, pdfplumber, openpyxl, camelot) импортируются внутри
+команд, так что каждая команда платит только за то, чем пользуется: stats и --help не грузят pandas,
+categorize с текстом — ничего, кроме правил категорий.
+"""
+import os
+import sys
+import logging
+import argparse
+from contextlib import closing
+
+# как store.DEFAULT_STORE_FILE и переменная дашборда; store здесь не импортируется — он тянет pandas
+STORE_FILE = os.environ.get("BANK_ANALYZER_STORE", "transactions.sqlite")
+
+def _files(source):
+    if os.path.isdir(source):
+        return [os.path.join(source, f) for f in sorted(os.listdir(source)) if f.endswith(".pdf")]
+    return [source]
+
+def _parse(args):
+    from analyzer import parse_files
+    from cache import ParseCache
+    from extractors import get_extractor
+    from templates import TemplateRegistry
+    from ocr import PageOcr
+
+    files = [f for source in args.input for f in _files(source)]
+    results = parse_files(files, workers=args.workers, cache=ParseCache(), rebuild=args.rebuild,
+                          registry=None if args.no_templates else TemplateRegistry(),
+                          extractor=get_extractor(args.engine, ocr=PageOcr(args.ocr_dpi) if args.ocr else None))
+    for f in results:
+        status = f"ошибка: {f.error}" if f.error else f"{f.count} строк" + (" (кэш)" if f.cached else "")
+        print(f"{f.path}: {status}, {f.seconds:.2f} с")
+    return 1 if any(f.error for f in results) else 0
+
+def _categorize(args):
+    from parser import load_categories
+    from categorizer import CategoryMatcher
+
+    matcher = CategoryMatcher(load_categories(args.categories))
+    if args.text:
+        for text in args.text:
+            print(f"{text}: {matcher.categorize(text)}")
+        return 0
+
+    from store import TransactionStore, categories_fingerprint
+
+    with closing(TransactionStore(args.store)) as store:
+        moved = store.recategorize(matcher)
+        with store.connection:
+            store.set_meta("categories", categories_fingerprint(matcher.categories))
+    print(f"Категория сменилась у {moved} строк")
+    return 0
+
+def _report(args, rest):
+    from analyzer import main as analyzer_main
+
+    # параметры отчёта — те же, что у analyzer.py
+    analyzer_main(rest, prog="bank-analyzer report")
+    return 0
+
+def _ingest(args, rest):
+    from ingest import main as ingest_main
+
+    return ingest_main(rest, prog="bank-analyzer ingest")
+
+def _stats(args):
+    # только небольшие таблицы хранилища (files, summary, daily, meta) и только чтение — без pandas
+    import sqlite3
+    import urllib.request
+
+    if not os.path.exists(args.store):
+        print(f"Хранилище {args.store} не найдено")
+        return 1
+    uri = "file:" + urllib.request.pathname2url(os.path.abspath(args.store)) + "?mode=ro"
+    with closing(sqlite3.connect(uri, uri=True)) as connection:
+        files, parsed = connection.execute("SELECT COUNT(*), COALESCE(SUM(rows), 0) FROM files").fetchone()
+        kept, total = connection.execute(
+            "SELECT COALESCE(SUM(count), 0), COALESCE(SUM(amount), 0) FROM summary").fetchone()
+        first, last = connection.execute("SELECT MIN(day), MAX(day) FROM daily").fetchone()
+        revision = connection.execute("SELECT value FROM meta WHERE key = 'revision'").fetchone()
+        categories = connection.execute(
+            "SELECT category, amount, count FROM summary WHERE count > 0 ORDER BY amount DESC").fetchall()
+    print(f"Хранилище: {args.store}, ревизия {revision[0] if revision else 0}")
+    print(f"Файлов: {files}, строк: {parsed}, без дубликатов: {kept}")
+    if first is not None:
+        print(f"Период: {first} — {last}")
+    print(f"Сумма: {total:,}".replace(",", " "))
+    for category, amount, count in categories:
+        print(f"  {category}: {amount:,} ({count} операций)".replace(",", " "))
+    return 0
+
+def build_parser():
+    ap = argparse.ArgumentParser(prog="bank-analyzer", description="Анализ банковских выписок")
+    ap.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"])
+    commands = ap.add_subparsers(dest="command", required=True)
+
+    parse = commands.add_parser("parse", help="разобрать PDF в кэш разбора")
+    parse.add_argument("input", nargs="+", help="PDF или папки с PDF")
+    parse.add_argument("-w", "--workers", type=int, default=None, help="число процессов для разбора PDF")
+    # список движков не берётся из extractors, чтобы --help не импортировал парсер
+    parse.add_argument("-e", "--engine", default="pdfplumber",
+                       help="движок извлечения: pdfplumber, camelot, camelot-lattice, camelot-stream, text, auto")
+    parse.add_argument("--rebuild", action="store_true", help="разобрать заново и обновить кэш")
+    parse.add_argument("--no-templates", action="store_true", help="не использовать шаблоны банков")
+    parse.add_argument("--ocr", action="store_true", help="распознавать страницы-сканы (нужен tesseract)")
+    parse.add_argument("--ocr-dpi", type=int, default=300, help="разрешение растра для OCR")  # как ocr.DEFAULT_DPI
+
+    categorize = commands.add_parser("categorize", help="категории текстов или перекатегоризация хранилища")
+    categorize.add_argument("text", nargs="*", help="тексты операций; без них — перекатегоризация хранилища")
+    categorize.add_argument("-c", "--categories", default="categories.json")
+    categorize.add_argument("--store", default=STORE_FILE, help="файл хранилища транзакций")
+
+    commands.add_parser("report", add_help=False, help="отчёт по выпискам (параметры — report --help)")
+    commands.add_parser("ingest", add_help=False,
+                        help="демон приёма выписок из папки в хранилище (параметры — ingest --help)")
+
+    stats = commands.add_parser("stats", help="сводка хранилища транзакций")
+    stats.add_argument("--store", default=STORE_FILE, help="файл хранилища транзакций")
+    return ap
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    args, rest = build_parser().parse_known_args(argv)
+    if args.command not in ("report", "ingest") and rest:
+        build_parser().error(f"неизвестные аргументы: {' '.join(rest)}")
+    if args.command == "report":
+        # уровень логов и остальное настраивает analyzer.main
+        return _report(args, rest + (["--log-level", args.log_level] if "--log-level" not in rest else []))
+    if args.command == "ingest":
+        return _ingest(args, rest + (["--log-level", args.log_level] if "--log-level" not in rest else []))
+    logging.basicConfig(level=args.log_level, format="%(message)s")
+    return {"parse": _parse, "categorize": _categorize, "stats": _stats}[args.command](args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+
+class AggregateCube:
+    """
+    Суммы и число операций по дням × категориям в двух плотных массивах numpy.
+    Строится по таблице daily хранилища (TransactionStore.cube); фильтр по датам — срез по отсортированным дням
+    (searchsorted), графики и сводки — суммы по осям среза, без прохода по сырым строкам.
+    """
+
+    def __init__(self, days: np.ndarray, categories: list, sums: np.ndarray, counts: np.ndarray):
+        self.days = days  # datetime64[D], по возрастанию
+        self.categories = categories
+        self.sums = sums  # (дни, категории)
+        self.counts = counts
+
+    @classmethod
+    def from_totals(cls, totals: pd.DataFrame) -> "AggregateCube":
+        """Куб из уже сгруппированных строк day/category/amount/count (например, GROUP BY в SQLite)."""
+        day_codes, days = pd.factorize(pd.to_datetime(totals["day"]), sort=True)
+        category_codes, categories = pd.factorize(totals["category"].fillna(""), sort=True)
+        shape = (len(days), len(categories))
+        sums = np.zeros(shape, dtype=np.float64)
+        counts = np.zeros(shape, dtype=np.int64)
+        sums[day_codes, category_codes] = totals["amount"].fillna(0).to_numpy(dtype=np.float64)
+        counts[day_codes, category_codes] = totals["count"].to_numpy(dtype=np.int64)
+        return cls(days.to_numpy().astype("datetime64[D]"), list(categories), sums, counts)
+
+    def __len__(self):
+        return int(self.counts.sum())
+
+    @property
+    def min_date(self):
+        return pd.Timestamp(self.days[0]) if len(self.days) else None
+
+    @property
+    def max_date(self):
+        return pd.Timestamp(self.days[-1]) if len(self.days) else None
+
+    def slice(self, start=None, end=None) -> "AggregateCube":
+        """Дни с start по end включительно (даты или None — без границы); массивы не копируются."""
+        lo = 0 if start is None else np.searchsorted(self.days, np.datetime64(start, "D"), side="left")
+        hi = len(self.days) if end is None else np.searchsorted(self.days, np.datetime64(end, "D"), side="right")
+        return AggregateCube(self.days[lo:hi], self.categories, self.sums[lo:hi], self.counts[lo:hi])
+
+    def total(self, category) -> float:
+        if category not in self.categories:
+            return 0.0
+        return float(self.sums[:, self.categories.index(category)].sum())
+
+    def present_categories(self) -> list:
+        """Категории, у которых в срезе есть хотя бы одна операция."""
+        present = self.counts.sum(axis=0) > 0
+        return [c for c, p in zip(self.categories, present) if p]
+
+    def by_category(self) -> pd.DataFrame:
+        """Сводка category/amount/count по срезу, по убыванию суммы."""
+        counts = self.counts.sum(axis=0)
+        summary = pd.DataFrame({"category": self.categories, "amount": self.sums.sum(axis=0), "count": counts})
+        return summary[counts > 0].sort_values("amount", ascending=False, ignore_index=True)
+
+    def _months(self):
+        # дни отсортированы, поэтому месяцы — подряд идущие отрезки: складываем через reduceat
+        months = self.days.astype("datetime64[M]")
+        labels, starts = np.unique(months, return_index=True)
+        return labels.astype(str), starts
+
+    def by_month(self) -> pd.DataFrame:
+        if not len(self.days):
+            return pd.DataFrame({"year_month": [], "amount": []})
+        labels, starts = self._months()
+        amounts = np.add.reduceat(self.sums.sum(axis=1), starts)
+        return pd.DataFrame({"year_month": labels, "amount": amounts})
+
+    def by_month_category(self) -> pd.DataFrame:
+        if not len(self.days):
+            return pd.DataFrame({"year_month": [], "category": [], "amount": []})
+        labels, starts = self._months()
+        sums = np.add.reduceat(self.sums, starts, axis=0)
+        counts = np.add.reduceat(self.counts, starts, axis=0)
+        trend = pd.DataFrame({
+            "year_month": np.repeat(labels, len(self.categories)),
+            "category": np.tile(self.categories, len(labels)),
+            "amount": sums.ravel(),
+        })
+        return trend[counts.ravel() > 0].reset_index(drop=True)
@@ -1,55 +1,104 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from analyzer import analyze
-from io import StringIO
+from detail import StoreDetail, PAGE_SIZE
+from store import TransactionStore, DEFAULT_STORE_FILE
+from inbox import drop, quarantined, DEFAULT_INBOX_DIR, DEFAULT_QUARANTINE_DIR, DEFAULT_PORT
 import datetime
-import tempfile
+import hashlib
+import json
+import time
 import os
+import urllib.request
 
 
 st.set_page_config(page_title="Анализ банковских выписок", layout="wide")
 
-@st.cache_data
-def cached_analyze(file_paths):
-    return analyze(file_paths)
+# Дашборд только читает хранилище; PDF разбирает демон (`python cli.py ingest`), загрузки уходят в его inbox
+STORE_FILE = os.environ.get("BANK_ANALYZER_STORE", DEFAULT_STORE_FILE)
+INBOX_DIR = os.environ.get("BANK_ANALYZER_INBOX", DEFAULT_INBOX_DIR)
+QUARANTINE_DIR = os.environ.get("BANK_ANALYZER_QUARANTINE", DEFAULT_QUARANTINE_DIR)
+INGEST_URL = os.environ.get("BANK_ANALYZER_INGEST_URL", f"http://127.0.0.1:{DEFAULT_PORT}/status")
+
+@st.cache_data(max_entries=4)
+def load_store_cube(path, revision):
+    # revision меняется при каждой записи в хранилище, так что устаревший куб не отдаётся
+    with TransactionStore(path) as store:
+        return store.cube()
+
+def ingest_status():
+    """Состояние демона или None, если он не запущен."""
+    try:
+        with urllib.request.urlopen(INGEST_URL, timeout=0.5) as response:
+            return json.load(response)
+    except (OSError, ValueError):
+        return None
+
+revision = None
+stored_hashes = set()
+if os.path.exists(STORE_FILE):
+    with TransactionStore(STORE_FILE) as store:
+        revision = store.revision()
+        stored_hashes = {sha256 for sha256, _, _, _ in store.manifest().values()}
 
 uploaded_files = st.file_uploader("Загрузите PDF банковских выписок", type="pdf", accept_multiple_files=True)
 
-file_paths = []
+pending = 0
 if uploaded_files:
-    temp_dir = tempfile.mkdtemp()
+    # --- HANDOFF TO THE INGEST DAEMON ---
+    # Загрузка кладётся в inbox один раз на файл сессии; готова, когда её хэш появился в манифесте хранилища
+    upload_hashes = st.session_state.setdefault("upload_hashes", {})
+    statuses = []
     for uploaded_file in uploaded_files:
-        temp_path = os.path.join(temp_dir, uploaded_file.name)
-        with open(temp_path, "wb") as f:
-            f.write(uploaded_file.getbuffer())
-        file_paths.append(temp_path)
-else:
-    # Use existing PDFs from 'pdfs' folder
-    pdf_folder = "pdfs"
-    if os.path.exists(pdf_folder):
-        file_paths = [os.path.join(pdf_folder, f) for f in os.listdir(pdf_folder) if f.lower().endswith(".pdf")]
-
-df, summary = cached_analyze(file_paths)
-
-# Преобразование типов
-if df is not None and "amount" in df.columns:
-    df["amount"] = pd.to_numeric(df["amount"], errors="coerce")
-if df is not None and "date" in df.columns:
-    df["date"] = pd.to_datetime(df["date"], errors="coerce")
-if summary is not None and "amount" in summary.columns:
-    summary["amount"] = pd.to_numeric(summary["amount"], errors="coerce")
-if summary is not None:
-    summary = summary.sort_values(by="amount", ascending=False)
-
-if df is None:
-    st.warning("Нет данных для анализа. Загрузите PDF банковских выписок.")
+        digest = upload_hashes.get(uploaded_file.file_id)
+        if digest is None:
+            data = uploaded_file.getvalue()
+            digest = upload_hashes[uploaded_file.file_id] = hashlib.sha256(data).hexdigest()
+            if digest not in stored_hashes and quarantined(QUARANTINE_DIR, digest) is None:
+                drop(INBOX_DIR, data, uploaded_file.name)
+        if digest in stored_hashes:
+            statuses.append((uploaded_file.name, "в хранилище"))
+            continue
+        error = quarantined(QUARANTINE_DIR, digest)
+        if error:
+            statuses.append((uploaded_file.name, f"ошибка: {error}"))
+        else:
+            statuses.append((uploaded_file.name, "ждёт разбора"))
+            pending += 1
+    if pending:
+        status = ingest_status()
+        if status is None:
+            st.warning("Демон разбора не отвечает — запустите `python cli.py ingest`, файлы ждут в папке "
+                       f"{INBOX_DIR}.")
+        else:
+            queue = status["queue"]
+            st.progress(1 - pending / len(uploaded_files),
+                        text=f"Ждут разбора: {pending}; у демона в очереди {queue['depth']}, в работе {queue['in_flight']}")
+    with st.expander("Файлы", expanded=bool(pending)):
+        for name, text in statuses:
+            st.text(f"{name}: {text}")
+
+cube = detail_index = None
+if revision is not None:
+    # --- TRANSACTION STORE ---
+    cube = load_store_cube(STORE_FILE, revision)
+    detail_index = StoreDetail(STORE_FILE)
+    st.caption(f"Данные из хранилища {STORE_FILE}")
+    if not len(cube):
+        cube = None
+
+if cube is None:
+    if pending:
+        st.info("Выписки разбираются, результаты появятся по мере готовности файлов.")
+    else:
+        st.warning("Нет данных для анализа. Загрузите PDF банковских выписок или положите их в папку "
+                   f"{INBOX_DIR} и запустите `python cli.py ingest`.")
 else:
     st.header("Анализ банковских выписок")
 
     # --- DATE FILTER (in main page) ---
-    min_date = df["date"].min()
-    max_date = df["date"].max()
+    min_date = cube.min_date if cube.min_date is not None else pd.NaT
+    max_date = cube.max_date if cube.max_date is not None else pd.NaT
     date_range = st.date_input(
         "Диапазон дат",
         value=(min_date.date() if pd.notnull(min_date) else datetime.date.today(),
@@ -59,23 +108,19 @@ else:
     )
 
     # --- APPLY FILTERS ---
-    filtered_df = df.copy()
+    # Графики и сводки считаются по срезу куба (дни × категории), сырые строки нужны только таблице
+    start_date = end_date = None
+    filtered_cube = cube
     if isinstance(date_range, tuple) and len(date_range) == 2:
         start_date, end_date = date_range
-        filtered_df = filtered_df[
-            (filtered_df["date"] >= pd.to_datetime(start_date)) &
-            (filtered_df["date"] <= pd.to_datetime(end_date))
-        ]
+        filtered_cube = cube.slice(start_date, end_date)
 
     # --- SUMMARY STATISTICS ---
     st.subheader("Статистика")
 
-    # Берём суммы по категориям из полного DataFrame df
-    summary_by_category_full = df.groupby("category", as_index=False)["amount"].sum()
-    
-    total_replenishments = summary_by_category_full.loc[summary_by_category_full["category"] == "Пополнения", "amount"].sum()
-    total_expenses = summary_by_category_full.loc[summary_by_category_full["category"] == "Списания", "amount"].sum()
-    
+    # Берём суммы по категориям за весь период
+    total_replenishments = cube.total("Пополнения")
+    total_expenses = cube.total("Списания")
 
     col1, col2 = st.columns(2)
     col1.metric("Пополнения", f"{int(round(total_replenishments)):,}".replace(",", " "))
@@ -90,29 +135,18 @@ else:
     )
 
     # Для графиков нужна агрегированная/группированная таблица
-    filtered_summary = (
-        filtered_df.groupby("category", as_index=False)["amount"].sum()
-        .sort_values(by="amount", ascending=False)
-    )
+    filtered_summary = filtered_cube.by_category()
 
     if chart_type == "Круговая диаграмма":
         fig_pie = px.pie(filtered_summary, names="category", values="amount", title="Распределение расходов по категориям")
         st.plotly_chart(fig_pie, use_container_width=True)
     elif chart_type == "Гистограмма по месяцам":
-        filtered_df["year_month"] = filtered_df["date"].dt.to_period("M").astype(str)
-        monthly = (
-            filtered_df.groupby("year_month", as_index=False)["amount"].sum()
-            .sort_values(by="year_month")
-        )
+        monthly = filtered_cube.by_month()
         fig_bar = px.bar(monthly, x="year_month", y="amount", labels={"year_month": "Месяц", "amount": "Сумма"},
                          title="Гистограмма расходов по месяцам")
         st.plotly_chart(fig_bar, use_container_width=True)
     elif chart_type == "Тренд по категориям":
-        filtered_df["year_month"] = filtered_df["date"].dt.to_period("M").astype(str)
-        trend = (
-            filtered_df.groupby(["year_month", "category"], as_index=False)["amount"].sum()
-            .sort_values(by=["year_month", "category"])
-        )
+        trend = filtered_cube.by_month_category()
         fig_line = px.line(
             trend,
             x="year_month",
@@ -125,12 +159,22 @@ else:
 
     # --- DETAIL TABLE ---
     st.subheader("Детализация")
-    # Фильтр по категориям для таблицы детализации
-    categories = ["Все"] + sorted(filtered_df["category"].dropna().unique().tolist())
-    selected_category = st.selectbox("Фильтр по категории (для таблицы детализации)", categories)
-    detail_df = filtered_df.copy()
-    if selected_category != "Все":
-        detail_df = detail_df[detail_df["category"] == selected_category]
+    # Отбор, сортировка и поиск — в памяти или SQL-запросами к хранилищу, в таблицу уходит только одна страница
+    categories = ["Все"] + filtered_cube.present_categories()
+    col1, col2, col3, col4 = st.columns([2, 3, 2, 2])
+    selected_category = col1.selectbox("Фильтр по категории (для таблицы детализации)", categories)
+    search = col2.text_input("Поиск по описанию и деталям")
+    sort_labels = {"Дата": "date", "Сумма": "amount", "Описание": "description"}
+    sort_by = col3.selectbox("Сортировка", list(sort_labels))
+    descending = col4.radio("Порядок", ("по убыванию", "по возрастанию"), horizontal=True) == "по убыванию"
+
+    mask = detail_index.select(start_date, end_date, None if selected_category == "Все" else selected_category,
+                               search.strip() or None)
+    positions = detail_index.positions(mask, sort_labels[sort_by], descending)
+    pages = max(1, -(-len(positions) // PAGE_SIZE))
+    page_number = st.number_input(f"Страница (всего {pages}, строк {len(positions)})", min_value=1,
+                                  max_value=pages, value=1, step=1)
+    page_df = detail_index.page(positions, page_number - 1)
 
     # Стилизация: выделение больших расходов
     # highlight_threshold = detail_df["amount"].quantile(0.95) if not detail_df.empty else None
@@ -143,46 +187,33 @@ else:
     #         pass
     #     return ""
 
-    detail_df = detail_df.sort_values(by="date", ascending=False)
-    # Преобразуем дату в формат dd.mm.yyyy для отображения
-    detail_df["date"] = detail_df["date"].dt.strftime("%d.%m.%Y")
-    detail_df = detail_df.drop(columns=["currency"], errors="ignore")
-    # Переименование и перестановка колонок
-    rename_map = {
-        "date": "Дата",
-        "description": "Описание",
-        "amount": "Сумма",
-        "details": "Детали",
-    }
-    columns_order = ["Дата", "Сумма", "Описание", "Детали"]
-    detail_df = detail_df.rename(columns=rename_map)
-    # Собираем только нужные колонки
-    detail_df = detail_df[[c for c in columns_order if c in detail_df.columns]]
-    # Стилизация с форматированием суммы
-    styled = detail_df.style.format({"Сумма": "{:,.0f}"})
+    # Форматирование даты и суммы — только для видимой страницы
+    styled = page_df.style.format({"Дата": "{:%d.%m.%Y}", "Сумма": "{:,.0f}"}, na_rep="")
     st.dataframe(
         styled,
         use_container_width=True,
         hide_index=True,
     )
 
-    # --- DOWNLOAD BUTTON ---
-    csv_buffer = StringIO()
-    detail_df.to_csv(csv_buffer, index=False, encoding="utf-8-sig", sep=";")
-    st.download_button(
+    # --- DOWNLOAD BUTTONS ---
+    # Файл собирается пачками только по нажатию кнопки (data — функция)
+    col1, col2 = st.columns(2)
+    col1.download_button(
         label="Скачать таблицу в CSV",
-        data=csv_buffer.getvalue(),
+        data=lambda: detail_index.export_csv(positions),
         file_name="bank_analyzer_export.csv",
         mime="text/csv"
     )
+    col2.download_button(
+        label="Скачать таблицу в Parquet",
+        data=lambda: detail_index.export_parquet(positions),
+        file_name="bank_analyzer_export.parquet",
+        mime="application/octet-stream"
+    )
 
     # --- SUMMARY TABLE BY CATEGORY ---
     st.subheader("Суммы по категориям")
-    summary_filtered = (
-        filtered_df.groupby("category", as_index=False)["amount"].sum()
-        .sort_values(by="amount", ascending=False)
-    )
-    summary_filtered = summary_filtered.rename(columns={"category": "Категория", "amount": "Сумма"})
+    summary_filtered = filtered_summary[["category", "amount"]].rename(columns={"category": "Категория", "amount": "Сумма"})
     styled_summary = summary_filtered.style.format({"Сумма": "{:,.0f}"})
     st.dataframe(
         styled_summary,
@@ -201,4 +232,9 @@ else:
     #     )
     #     st.write(response.choices[0].message["content"])
     # else:
-    #     st.info("Нет данных для анализа рекомендаций.")
\ No newline at end of file
+    #     st.info("Нет данных для анализа рекомендаций.")
+
+# Пока есть неразобранные файлы, страница перерисовывается с уже готовыми
+if pending:
+    time.sleep(1)
+    st.rerun()
@@ -0,0 +1,102 @@
+import os
+from collections import Counter
+import numpy as np
+import pandas as pd
+
+MISSING_AMOUNT = np.iinfo(np.int64).min  # ключ для строк без суммы
+
+def normalize_descriptions(values: pd.Series) -> pd.Series:
+    # переносы строк и повторные пробелы в описании не различаем
+    return values.fillna("").astype(str).str.replace(r"\s+", " ", regex=True).str.strip()
+
+def description_hashes(values: pd.Series) -> np.ndarray:
+    """64-битные хэши описаний без учёта переносов и повторных пробелов, как int64 (INTEGER в SQLite)."""
+    normalized = pd.Series(normalize_descriptions(values).to_numpy(dtype=object))
+    return pd.util.hash_pandas_object(normalized, index=False).to_numpy().view(np.int64)
+
+def dedup_keys(df: pd.DataFrame) -> np.ndarray:
+    """
+    64-битные хэши ключа дедупликации (минута, сумма, описание) для каждой строки.
+    Описание сравнивается без учёта переносов и повторных пробелов: одна и та же
+    операция в месячной и квартальной выписке бывает свёрстана по-разному.
+    """
+    minute = df["date"].to_numpy(dtype="datetime64[ns]").astype("datetime64[m]").astype(np.int64)
+    amount = df["amount"].astype("Int64").fillna(MISSING_AMOUNT).to_numpy(dtype=np.int64)
+    description = normalize_descriptions(df["description"])
+    key = pd.DataFrame({
+        "minute": minute,
+        "amount": amount,
+        "description": description.to_numpy(dtype=object),
+    })
+    return pd.util.hash_pandas_object(key, index=False).to_numpy()
+
+class Deduplicator:
+    """
+    Потоковая дедупликация: множество 64-битных хэшей ключей, по 8 байт на строку.
+    Хэши хранятся отсортированными массивами numpy, которые сливаются, когда
+    соседние сравниваются по размеру (как уровни LSM-дерева), так что проверка
+    пачки — несколько searchsorted, а вставка в среднем O(log n) на ключ.
+    path: файл .npy, чтобы помнить ключи между запусками (None — только в памяти).
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.levels = []
+        self.rows = Counter()  # строк по файлам
+        self.duplicates = Counter()  # из них дубликатов
+        if path and os.path.exists(path):
+            keys = np.load(path)
+            if len(keys):
+                self.levels.append(keys)
+
+    def __len__(self):
+        return sum(len(level) for level in self.levels)
+
+    def __contains__(self, key):
+        return bool(self._seen(np.array([key], dtype=np.uint64))[0])
+
+    def _seen(self, keys: np.ndarray) -> np.ndarray:
+        seen = np.zeros(len(keys), dtype=bool)
+        for level in self.levels:
+            if not len(level):
+                continue
+            positions = np.searchsorted(level, keys).clip(max=len(level) - 1)
+            seen |= level[positions] == keys
+        return seen
+
+    def _add(self, keys: np.ndarray):
+        # keys уникальны и ещё не встречались, поэтому уровни не пересекаются и слияние —
+        # просто сортировка двух отсортированных кусков (timsort делает это за линейное время)
+        self.levels.append(np.sort(keys))
+        while len(self.levels) > 1 and len(self.levels[-2]) <= 2 * len(self.levels[-1]):
+            last = self.levels.pop()
+            self.levels[-1] = np.sort(np.concatenate([self.levels[-1], last]), kind="stable")
+
+    def mask(self, df: pd.DataFrame, source=None) -> np.ndarray:
+        """
+        Булева маска строк, ключи которых ещё не встречались (ни в пачке выше, ни в прошлых).
+        Новые ключи запоминаются; source — файл, которому засчитываются дубликаты.
+        """
+        if df.empty:
+            return np.zeros(0, dtype=bool)
+        keys = dedup_keys(df)
+        keep = ~pd.Series(keys).duplicated().to_numpy() & ~self._seen(keys)
+        if keep.any():
+            self._add(keys[keep])
+        self.rows[source] += len(keys)
+        self.duplicates[source] += int((~keep).sum())
+        return keep
+
+    def filter(self, df: pd.DataFrame, source=None) -> pd.DataFrame:
+        return df[self.mask(df, source)]
+
+    def save(self):
+        if not self.path:
+            return
+        if not len(self):
+            # пустой уровень не пишем: ключей нет, и прежний файл (если был) уже загружен в levels
+            return
+        self.levels = [np.sort(np.concatenate(self.levels), kind="stable")]
+        tmp = self.path + ".tmp.npy"
+        np.save(tmp, self.levels[0])
+        os.replace(tmp, self.path)
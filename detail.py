@@ -0,0 +1,157 @@
+import os
+import json
+import codecs
+import sqlite3
+import tempfile
+import urllib.request
+from contextlib import closing
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from store import DATE_FORMAT
+
+# Колонки таблицы детализации в дашборде и выгрузке, в порядке показа
+DISPLAY_COLUMNS = {"date": "Дата", "amount": "Сумма", "description": "Описание", "details": "Детали"}
+SORT_COLUMNS = ("date", "amount", "description")
+PAGE_SIZE = 100
+EXPORT_CHUNK_ROWS = 50000
+SPOOL_BYTES = 32 * 1024 * 1024  # собираемая выгрузка больше этого уходит из памяти во временный файл
+
+def _typed(df: pd.DataFrame) -> pd.DataFrame:
+    # типы колонок для показа и выгрузки, в том числе у пустой выборки (схема Parquet)
+    df["date"] = pd.to_datetime(df["date"], format=DATE_FORMAT).astype("datetime64[us]")
+    df["amount"] = df["amount"].astype("Int64")
+    for column in ("description", "details"):
+        df[column] = df[column].astype("str")
+    return df
+
+def _contents(out) -> bytes:
+    # download_button (и его отложенный вызов data) принимает bytes, а не временный файл
+    out.seek(0)
+    return out.read()
+
+class StoreQuery:
+    """
+    Отобранные строки хранилища в порядке сортировки, вместо массива номеров строк:
+    len() — COUNT(*), срез — rowid нужной страницы через LIMIT/OFFSET.
+    """
+
+    def __init__(self, detail, where, params, order):
+        self.detail = detail
+        self.where = where
+        self.params = params
+        self.order = order
+        self.count = None
+
+    def __len__(self):
+        if self.count is None:
+            with closing(self.detail.connect()) as connection:
+                self.count = connection.execute(
+                    f"SELECT COUNT(*) FROM transactions WHERE {self.where}", self.params).fetchone()[0]
+        return self.count
+
+    def __getitem__(self, item: slice) -> np.ndarray:
+        start, stop, _ = item.indices(len(self))
+        if stop <= start:
+            return np.zeros(0, dtype=np.int64)
+        with closing(self.detail.connect()) as connection:
+            rows = connection.execute(
+                f"SELECT rowid FROM transactions WHERE {self.where} ORDER BY {self.order} LIMIT ? OFFSET ?",
+                (*self.params, stop - start, start),
+            ).fetchall()
+        return np.array([row[0] for row in rows], dtype=np.int64)
+
+class StoreDetail:
+    """
+    Таблица детализации поверх TransactionStore: отбор, сортировка и страница — SQL-запросы
+    по индексам хранилища, в память читается только показываемая страница или пачка выгрузки.
+    Соединение открывается на каждый запрос (только чтение), так что объект можно делить между сессиями.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.uri = "file:" + urllib.request.pathname2url(os.path.abspath(path)) + "?mode=ro"
+
+    def connect(self):
+        connection = sqlite3.connect(self.uri, uri=True)
+        # lower() в SQLite меняет регистр только у латиницы
+        connection.create_function("lower_text", 1, lambda text: text.lower() if text else text, deterministic=True)
+        return connection
+
+    def __len__(self):
+        with closing(self.connect()) as connection:
+            return connection.execute("SELECT COUNT(*) FROM transactions WHERE kept = 1").fetchone()[0]
+
+    def select(self, start=None, end=None, category=None, search=None):
+        """Условие WHERE с параметрами: даты с start по end включительно, категория, подстрока."""
+        where, params = ["kept = 1"], []
+        if start is not None:
+            where.append("date >= ?")
+            params.append(pd.Timestamp(start).strftime(DATE_FORMAT))
+        if end is not None:
+            where.append("date < ?")
+            params.append((pd.Timestamp(end) + pd.Timedelta(days=1)).strftime(DATE_FORMAT))
+        if category is not None:
+            where.append("category = ?")
+            params.append(category)
+        if search:
+            where.append("instr(lower_text(COALESCE(description, '') || ' ' || COALESCE(details, '')), ?) > 0")
+            params.append(search.lower())
+        return " AND ".join(where), tuple(params)
+
+    def positions(self, selection, sort="date", descending=True) -> StoreQuery:
+        if sort not in SORT_COLUMNS:
+            raise ValueError(f"Неизвестная колонка сортировки: {sort}")
+        # пустые значения — в конце, при равенстве — порядок вставки
+        order = f"{sort} IS NULL, " if sort != "date" else ""
+        order += f"{sort} {'DESC' if descending else 'ASC'}, rowid"
+        where, params = selection
+        return StoreQuery(self, where, params, order)
+
+    def frame(self, positions: np.ndarray) -> pd.DataFrame:
+        """Строки по rowid в виде для показа и выгрузки: русские заголовки, только колонки DISPLAY_COLUMNS."""
+        columns = ", ".join(DISPLAY_COLUMNS)
+        with closing(self.connect()) as connection:
+            # список rowid — одним JSON-параметром: у SQLite ограничено число параметров запроса
+            df = pd.read_sql_query(
+                f"SELECT rowid, {columns} FROM transactions WHERE rowid IN (SELECT value FROM json_each(?))",
+                connection, params=(json.dumps(positions.tolist()),),
+            )
+        df = df.set_index("rowid").reindex(positions).reset_index(drop=True)
+        return _typed(df).rename(columns=DISPLAY_COLUMNS)
+
+    def page(self, positions: StoreQuery, number=0, size=PAGE_SIZE) -> pd.DataFrame:
+        return self.frame(positions[number * size:(number + 1) * size])
+
+    def export_csv(self, positions: StoreQuery) -> bytes:
+        """CSV (utf-8 с BOM, ";"): пачки собираются во временном файле, результат — bytes для download_button."""
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES) as out:
+            out.write(codecs.BOM_UTF8)
+            header = True
+            for chunk in self._chunks(positions):
+                chunk["Дата"] = chunk["Дата"].dt.strftime("%d.%m.%Y")
+                out.write(chunk.to_csv(index=False, sep=";", header=header).encode("utf-8"))
+                header = False
+            if header:
+                out.write(";".join(self.frame(positions[:0]).columns).encode("utf-8") + b"\n")
+            return _contents(out)
+
+    def export_parquet(self, positions: StoreQuery) -> bytes:
+        """Parquet группами по EXPORT_CHUNK_ROWS строк во временном файле, результат — bytes для download_button."""
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES) as out:
+            schema = pa.Schema.from_pandas(self.frame(positions[:0]), preserve_index=False)
+            with pq.ParquetWriter(out, schema, compression="zstd") as writer:
+                for chunk in self._chunks(positions):
+                    writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            return _contents(out)
+
+    def _chunks(self, positions: StoreQuery):
+        # выгрузка — один проход курсором по отсортированной выборке, без OFFSET на каждую пачку
+        columns = ", ".join(DISPLAY_COLUMNS)
+        with closing(self.connect()) as connection:
+            for df in pd.read_sql_query(
+                f"SELECT {columns} FROM transactions WHERE {positions.where} ORDER BY {positions.order}",
+                connection, params=positions.params, chunksize=EXPORT_CHUNK_ROWS,
+            ):
+                yield _typed(df).rename(columns=DISPLAY_COLUMNS)
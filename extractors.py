@@ -0,0 +1,345 @@
+import re
+import time
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import pypdfium2 as pdfium
+from parser import (ParseState, SCANNED_REASON, column_map, iter_batches, page_has_transactions, parse_table,
+                    skip_reason, warn_scanned)
+from rowbatch import RowBatch
+from templates import page_signature
+from metrics import current
+from normalize import DATE_PATTERN
+
+logger = logging.getLogger(__name__)
+
+CAMELOT_BATCH_PAGES = 20  # страниц на один вызов camelot.read_pdf
+PROBE_PAGES = 2  # столько страниц с операциями пробует AutoExtractor каждым движком
+DATE_START = re.compile(DATE_PATTERN)  # те же даты, что разбирает normalize: 05.01.24, 2024-01-05, 5 1 2024
+AMOUNT = re.compile(
+    r"[+-]?\s?(?:\d{1,3}(?:[   ]\d{3})+|\d+)(?:[.,]\d{2})(?:\s?(?:₸|[A-Z]{3}\b))?"  # 21 325,65 ₸, 4948.60 USD
+    r"|[+-]\s?\d[\d   ]*(?:\s?₸)?"  # + 21 325 ₸
+    r"|\d[\d   ]*\s?₸"  # 21 325 ₸
+)
+CURRENCY = re.compile(r"\b[A-Z]{3}\b")
+TEXT_KINDS = ("description", "details")
+
+class Extractor:
+    """
+    Движок извлечения строк из PDF. extract_batches — генератор RowBatch сырых строк
+    (date/description/amount строками, currency/details/page — если есть), как у parser.iter_batches;
+    extract — те же строки словарями, как у parser.iter_transactions.
+    Таблицы каждый движок находит по-своему, а строки из них собирает общий parser.parse_table:
+    поиск шапки, индексы колонок между страницами и отсев мусора у всех движков одинаковые.
+    """
+
+    name = None
+    ocr = None  # ocr.PageOcr: страницы-сканы распознаются и разбираются как текст, None — пропускаются
+
+    def available(self) -> bool:
+        """Установлены ли зависимости движка."""
+        return True
+
+    def with_ocr(self, ocr):
+        """Включить OCR страниц без текстового слоя; возвращает сам движок."""
+        self.ocr = ocr
+        return self
+
+    def extract_batches(self, file_path, pages=None, state: ParseState = None, registry=None):
+        raise NotImplementedError
+
+    def extract(self, file_path, pages=None, state: ParseState = None, registry=None):
+        for batch in self.extract_batches(file_path, pages=pages, state=state, registry=registry):
+            yield from batch
+
+class PdfplumberExtractor(Extractor):
+    """Таблицы pdfplumber по линиям разметки, с предфильтром страниц и шаблонами банков."""
+
+    name = "pdfplumber"
+
+    def __init__(self, engine=None):
+        self.engine = engine  # "lines" или "words", None — как в шаблоне банка
+
+    def extract_batches(self, file_path, pages=None, state=None, registry=None):
+        return iter_batches(file_path, pages=pages, state=state, registry=registry, engine=self.engine, ocr=self.ocr)
+
+def _transaction_pages(file_path, pages=None):
+    # номера страниц с датами и суммами (с единицы, как у camelot): остальные движку не отдаём
+    doc = pdfium.PdfDocument(file_path)
+    try:
+        start, stop = pages if pages is not None else (0, len(doc))
+        return [index + 1 for index in range(start, stop) if page_has_transactions(doc[index])]
+    finally:
+        doc.close()
+
+def _camelot_rows(df):
+    # ячейки таблицы camelot по колонкам: переносы строк внутри ячейки -> пробел, пустые строки таблицы — прочь
+    df = df.replace(r"\s*\n\s*", " ", regex=True)
+    df = df[(df != "").any(axis=1)]
+    return df.to_numpy().tolist()
+
+def _camelot_batch(file_path, numbers, flavors):
+    """
+    Таблицы страниц numbers (с единицы) списком (страница, строки) по порядку страниц.
+    Первый flavor разбирает все страницы, следующий — только те, где предыдущий таблиц не нашёл.
+    """
+    import camelot
+
+    found = {}
+    pending = list(numbers)
+    for flavor in flavors:
+        if not pending:
+            break
+        for table in camelot.read_pdf(file_path, pages=",".join(map(str, pending)), flavor=flavor):
+            rows = _camelot_rows(table.df)
+            if rows:
+                found.setdefault(int(table.page), []).append(rows)
+        pending = [number for number in pending if number not in found]
+    return [(number, rows) for number in numbers for rows in found.get(number, [])]
+
+class CamelotExtractor(Extractor):
+    """
+    Таблицы camelot: flavor="lattice" — по линиям сетки, "stream" — по выравниванию текста
+    (для выписок без рамок), "auto" — lattice, а для страниц без таблиц — stream.
+    Страницы разбираются пачками по batch_pages, при workers > 1 — в пуле процессов.
+    camelot — необязательная зависимость. Сканы camelot не читает, OCR этим движком не используется.
+    """
+
+    def __init__(self, flavor="lattice", workers=None, batch_pages=CAMELOT_BATCH_PAGES):
+        self.flavor = flavor
+        self.flavors = ("lattice", "stream") if flavor == "auto" else (flavor,)
+        self.name = "camelot" if flavor == "auto" else f"camelot-{flavor}"
+        self.workers = workers
+        self.batch_pages = batch_pages
+
+    def available(self) -> bool:
+        try:
+            import camelot  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def with_ocr(self, ocr):
+        # OCR не включается: строки и с --ocr те же, и в кэше разбора у них тот же ключ движка
+        return self
+
+    def extract_batches(self, file_path, pages=None, state=None, registry=None):
+        if state is None:
+            state = ParseState()
+        numbers = _transaction_pages(file_path, pages)
+        batches = [numbers[i:i + self.batch_pages] for i in range(0, len(numbers), self.batch_pages)]
+        if self.workers and self.workers > 1 and len(batches) > 1:
+            # пачки читаются параллельно, а строки собираются по порядку: шапка может быть на первой странице
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                results = pool.map(_camelot_batch, repeat(file_path), batches, repeat(self.flavors))
+                for tables in results:
+                    yield self._rows(tables, state)
+        else:
+            for batch in batches:
+                yield self._rows(_camelot_batch(file_path, batch, self.flavors), state)
+
+    def _rows(self, tables, state) -> RowBatch:
+        rows = RowBatch()
+        for table_number, (page_number, table) in enumerate(tables, start=1):
+            parse_table(table, None, state, page_number, table_number, out=rows)
+        return rows
+
+def _header_cells(line):
+    # названия колонок из column_map в порядке их появления в строке; длинные варианты — раньше коротких
+    aliases = sorted((alias for names in column_map.values() for alias in names), key=len, reverse=True)
+    pattern = r"\b(" + "|".join(map(re.escape, aliases)) + r")\b"
+    return [m.group(1) for m in re.finditer(pattern, line, flags=re.IGNORECASE)]
+
+def _kind(header):
+    header = header.lower()
+    for kind, aliases in column_map.items():
+        if any(a.lower() in header for a in aliases):
+            return kind
+    return None
+
+def _split_line(line, kinds):
+    """Строка текста -> ячейки в порядке шапки kinds или None, если это не операция."""
+    date = DATE_START.match(line)
+    if not date:
+        return None
+    amount = AMOUNT.search(line, date.end())
+    if not amount:
+        return None
+    cells = {"date": date.group(0).strip(), "amount": amount.group(0).strip()}
+    spans = [date.span(), amount.span()]
+    if "currency" in kinds:
+        currency = CURRENCY.search(line, amount.end())
+        if currency:
+            cells["currency"] = currency.group(0)
+            spans.append(currency.span())
+    # свободный текст между найденными полями раскладываем по текстовым колонкам в порядке шапки
+    spans.sort()
+    gaps = [line[a[1]:b[0]].strip() for a, b in zip(spans, spans[1:] + [(len(line), len(line))])]
+    gaps = [gap for gap in gaps if gap]
+    text_kinds = [kind for kind in kinds if kind in TEXT_KINDS]
+    if len(gaps) < len(text_kinds) and gaps:
+        # описание и детали слились в один кусок: описание — первое слово (Покупка, Перевод...)
+        first, _, rest = gaps[-1].partition(" ")
+        gaps[-1:] = [first, rest] if rest else [first]
+    if len(gaps) > len(text_kinds) and text_kinds:
+        gaps[len(text_kinds) - 1:] = [" ".join(gaps[len(text_kinds) - 1:])]
+    cells.update(zip(text_kinds, gaps))
+    return [cells.get(kind, "") for kind in kinds]
+
+def text_table(lines, state, headers=None):
+    """
+    Строки текста страницы -> (таблица для parse_table, шапка). Шапка передаётся на следующие
+    страницы; без неё порядок колонок берётся из state.saved_indices.
+    """
+    table = []
+    for line in lines:
+        cells = _header_cells(line)
+        kinds = [_kind(cell) for cell in cells]
+        if "date" in kinds and "amount" in kinds and len(cells) >= 3:
+            headers = cells
+            table.append(headers)
+            continue
+        if headers is None and state.saved_indices is None:
+            continue
+        row = _split_line(line, [_kind(h) for h in headers] if headers else _saved_kinds(state))
+        if row is not None:
+            table.append(row)
+    return table, headers
+
+class TextExtractor(Extractor):
+    """
+    Запасной движок без поиска таблиц: текстовый слой страницы (pdfium) построчно.
+    Дата в начале строки, сумма и код валюты ищутся регулярными выражениями, остальной
+    текст делится между описанием и деталями по порядку колонок в шапке.
+    Для описаний из нескольких слов без деталей граница угадывается неточно.
+    С OCR так же разбирается распознанный текст страниц-сканов.
+    """
+
+    name = "text"
+
+    def extract_batches(self, file_path, pages=None, state=None, registry=None):
+        if state is None:
+            state = ParseState()
+        metrics = current()
+        doc = pdfium.PdfDocument(file_path)
+        texts = None
+        scanned_skipped = 0
+        try:
+            start, stop = pages if pages is not None else (0, len(doc))
+            scanned = set()
+            if self.ocr is not None:
+                from ocr import is_image_only
+
+                scanned = {index for index in range(start, stop) if is_image_only(doc[index])}
+                texts = self.ocr.recognize(file_path, sorted(scanned))
+            headers = None
+            for index in range(start, stop):
+                started = time.perf_counter()
+                page = doc[index]
+                if index in scanned:
+                    lines = next(texts).splitlines()
+                elif not page_has_transactions(page):
+                    reason = skip_reason(page)
+                    scanned_skipped += reason == SCANNED_REASON
+                    metrics.skip(index + 1, None, reason)
+                    continue
+                else:
+                    textpage = page.get_textpage()
+                    lines = textpage.get_text_range().splitlines()
+                    textpage.close()
+                table, headers = text_table(lines, state, headers)
+                page_rows = parse_table(table, None, state, index + 1, 1) if table else RowBatch()
+                metrics.page(index + 1, time.perf_counter() - started, int(bool(table)), len(page_rows))
+                if page_rows:
+                    yield page_rows
+        finally:
+            if texts is not None:
+                texts.close()
+            doc.close()
+        warn_scanned(file_path, scanned_skipped)
+
+def _saved_kinds(state):
+    # шапка была в предыдущем куске файла: порядок колонок восстанавливаем по сохранённым индексам
+    names = {"desc": "description"}
+    indices = {names.get(key, key): value for key, value in state.saved_indices.items() if value is not None}
+    kinds = [None] * (max(indices.values()) + 1)
+    for kind, index in indices.items():
+        kinds[index] = kind
+    return kinds
+
+class AutoExtractor(Extractor):
+    """
+    Движок на каждый файл: кандидаты по очереди разбирают первые PROBE_PAGES страниц с операциями,
+    выбирается первый, нашедший больше всего строк (кандидаты перечислены от быстрых к медленным).
+    Выбор запоминается по отпечатку первой страницы, так что выписки одного банка не пробуются заново.
+    """
+
+    name = "auto"
+
+    def __init__(self, candidates=None):
+        self.candidates = [c for c in (candidates or _default_candidates()) if c.available()]
+        self.choices = {}  # отпечаток первой страницы -> движок
+
+    def with_ocr(self, ocr):
+        for candidate in self.candidates:
+            candidate.with_ocr(ocr)
+        return super().with_ocr(ocr)
+
+    def choose(self, file_path) -> Extractor:
+        doc = pdfium.PdfDocument(file_path)
+        try:
+            key = page_signature(doc[0]) if len(doc) else None
+        finally:
+            doc.close()
+        if key in self.choices:
+            return self.choices[key]
+        numbers = _transaction_pages(file_path)
+        best, best_rows = self.candidates[0], -1
+        if numbers:
+            probe = (0, min(numbers[0] - 1 + PROBE_PAGES, numbers[-1]))
+            for candidate in self.candidates:
+                try:
+                    found = sum(map(len, candidate.extract_batches(file_path, pages=probe, state=ParseState())))
+                except Exception as e:
+                    logger.warning("%s: движок %s не справился: %s: %s", file_path, candidate.name, type(e).__name__, e)
+                    continue
+                if found > best_rows:
+                    best, best_rows = candidate, found
+        logger.info("%s: выбран движок %s", file_path, best.name)
+        self.choices[key] = best
+        return best
+
+    def extract_batches(self, file_path, pages=None, state=None, registry=None):
+        return self.choose(file_path).extract_batches(file_path, pages=pages, state=state, registry=registry)
+
+def _default_candidates():
+    return [PdfplumberExtractor(), CamelotExtractor("auto"), TextExtractor()]
+
+EXTRACTORS = {
+    "pdfplumber": PdfplumberExtractor,
+    "camelot": lambda: CamelotExtractor("auto"),
+    "camelot-lattice": lambda: CamelotExtractor("lattice"),
+    "camelot-stream": lambda: CamelotExtractor("stream"),
+    "text": TextExtractor,
+    "auto": AutoExtractor,
+}
+DEFAULT_EXTRACTOR = "pdfplumber"
+
+def get_extractor(engine=DEFAULT_EXTRACTOR, ocr=None) -> Extractor:
+    """
+    Движок по имени из EXTRACTORS; готовый Extractor возвращается как есть.
+    ocr: ocr.PageOcr — распознавать страницы-сканы (движки pdfplumber, text и auto; camelot его не использует).
+    """
+    if isinstance(engine, Extractor):
+        extractor = engine
+    elif engine not in EXTRACTORS:
+        raise ValueError(f"Неизвестный движок извлечения: {engine}. Доступны: {', '.join(EXTRACTORS)}")
+    else:
+        extractor = EXTRACTORS[engine]()
+        if not extractor.available():
+            raise ValueError(f"Движок {engine} недоступен: не установлены его зависимости")
+    if ocr is not None:
+        extractor.with_ocr(ocr)
+        if extractor.ocr is not None and not ocr.available():
+            raise ValueError(f"OCR недоступен: не найдена программа {ocr.command}")
+    return extractor
@@ -0,0 +1,86 @@
+"""
+Курсы валют из локального CSV и пересчёт сумм в валюту отчёта целой колонкой.
+
+    date,currency,rate
+    2024-07-01,USD,472.15
+    2024-07-01,RUB,5.41
+
+rate — сколько единиц базовой валюты (по умолчанию KZT) стоит единица currency на дату.
+"""
+import hashlib
+import numpy as np
+import pandas as pd
+from normalize import DEFAULT_CURRENCY
+
+DAY_OFFSET = 1 << 31  # дни от 1970 могут быть отрицательными, в ключе — только неотрицательные
+
+class FxRates:
+    """
+    Таблица дневных курсов. Для строки берётся последний курс не позже её даты (как merge_asof),
+    но без сортировки строк и группировки по валютам: ключ курса — код валюты и день в одном int64,
+    так что вся колонка ищется одним np.searchsorted по отсортированным ключам.
+    target — валюта отчёта (по умолчанию base); валюты нет в таблице — ValueError.
+    """
+
+    def __init__(self, rates: pd.DataFrame, base=DEFAULT_CURRENCY, target=None):
+        rates = rates.dropna(subset=["date", "currency", "rate"])
+        currency = rates["currency"].astype(str).str.strip().str.upper()
+        self.base = base
+        self.currencies = sorted(set(currency) | {base})
+        self.target = self._target(target)
+        keys = self._keys(currency, pd.to_datetime(rates["date"]))
+        order = np.argsort(keys, kind="stable")
+        self.keys = keys[order]
+        self.rates = rates["rate"].to_numpy(dtype=np.float64)[order]
+        digest = hashlib.sha256(self.keys.tobytes() + self.rates.tobytes() + base.encode())
+        self.fingerprint = digest.hexdigest()[:16]
+
+    @classmethod
+    def load(cls, path, base=DEFAULT_CURRENCY, target=None) -> "FxRates":
+        return cls(pd.read_csv(path, dtype={"currency": str}), base, target)
+
+    def to(self, target) -> "FxRates":
+        """Те же курсы с другой валютой отчёта."""
+        other = object.__new__(FxRates)
+        other.__dict__.update(self.__dict__)
+        other.target = other._target(target)
+        return other
+
+    def _target(self, target) -> str:
+        target = (target or self.base).strip().upper()
+        if target not in self.currencies:
+            raise ValueError(f"валюты отчёта {target} нет в таблице курсов (есть: {', '.join(self.currencies)})")
+        return target
+
+    def _codes(self, currency) -> np.ndarray:
+        # валют в колонке единицы: factorize и поиск только по уникальным; неизвестная валюта -> -1
+        inverse, uniques = pd.factorize(pd.Series(currency, dtype="str").str.strip().str.upper())
+        lookup = pd.Index(self.currencies).get_indexer(uniques)
+        return np.where(inverse >= 0, lookup[inverse] if len(lookup) else -1, -1).astype(np.int64)
+
+    def _keys(self, currency, dates):
+        # код -1 дает ключ меньше любого ключа таблицы
+        days = pd.Series(dates).to_numpy(dtype="datetime64[D]").astype(np.int64)
+        return (self._codes(currency) << 32) + days + DAY_OFFSET
+
+    def rates_for(self, currency: pd.Series, dates: pd.Series) -> np.ndarray:
+        """Курс к base на каждую строку; NaN — валюты нет в таблице или курса на дату ещё нет."""
+        keys = self._keys(currency, dates)
+        index = np.searchsorted(self.keys, keys, side="right") - 1
+        found = np.maximum(index, 0)
+        same = (index >= 0) & (self.keys[found] >> 32 == keys >> 32) if len(self.keys) else np.zeros(len(keys), bool)
+        rates = np.where(same, self.rates[found] if len(self.rates) else np.nan, np.nan)
+        rates[keys >> 32 == self.currencies.index(self.base)] = 1.0
+        rates[dates.isna().to_numpy()] = np.nan
+        return rates
+
+    def convert(self, minor: pd.Series, currency: pd.Series, dates: pd.Series) -> pd.Series:
+        """
+        Суммы в минимальных единицах своей валюты -> в минимальных единицах target (Int64,
+        со знаком); без курса — <NA>.
+        """
+        rates = self.rates_for(currency, dates)
+        if self.target != self.base:
+            rates = rates / self.rates_for(pd.Series(self.target, index=currency.index), dates)
+        converted = np.round(minor.to_numpy(dtype=np.float64, na_value=np.nan) * rates)
+        return pd.Series(pd.array(converted, dtype="Int64"), index=minor.index, name=minor.name)
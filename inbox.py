@@ -0,0 +1,45 @@
+"""
+Папки демона приёма (inbox, processed, quarantine) и работа с ними без зависимостей разбора:
+дашборд кладёт загрузки в inbox и читает ошибки из quarantine, не импортируя ingest.
+"""
+import os
+import hashlib
+
+DEFAULT_INBOX_DIR = "inbox"
+DEFAULT_PROCESSED_DIR = "processed"
+DEFAULT_QUARANTINE_DIR = "quarantine"
+DEFAULT_PORT = 8765
+ERROR_SUFFIX = ".error.txt"
+
+def archive_name(name, digest) -> str:
+    """Имя в processed и quarantine: с префиксом хэша содержимого, одноимённые выписки не затирают друг друга."""
+    prefix = digest[:16] + "_"
+    return name if name.startswith(prefix) else prefix + name
+
+def drop(inbox, data: bytes, name) -> str:
+    """
+    Кладёт PDF в inbox (так его передаёт демону дашборд). Запись идёт во временный скрытый файл
+    и переименовывается целиком, так что демон не возьмёт недописанный файл.
+    Возвращает SHA-256 содержимого — по нему файл находится в манифесте хранилища и в quarantine.
+    """
+    os.makedirs(inbox, exist_ok=True)
+    digest = hashlib.sha256(data).hexdigest()
+    path = os.path.join(inbox, archive_name(os.path.basename(name), digest))
+    tmp = os.path.join(inbox, f".{os.path.basename(path)}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+    return digest
+
+def quarantined(directory, digest):
+    """Текст ошибки, если файл с таким содержимым попал в quarantine, иначе None."""
+    prefix = digest[:16] + "_"
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return None
+    for name in names:
+        if name.startswith(prefix) and name.endswith(ERROR_SUFFIX):
+            with open(os.path.join(directory, name), encoding="utf-8") as f:
+                return f.read().strip()
+    return None
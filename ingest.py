@@ -0,0 +1,428 @@
+"""
+Демон приёма выписок. Следит за папкой inbox, ставит новые PDF в очередь и разбирает их в пуле
+процессов: в работе не больше workers файлов, в очереди — не больше queue_size, а когда очередь
+полна, новые файлы просто ждут в inbox (backpressure). Разобранные файлы переносятся в processed
+и пачками записываются в хранилище транзакций, которое читает дашборд; файлы с ошибкой уходят
+в quarantine вместе с текстом ошибки. Состояние отдаётся JSON по HTTP на localhost:
+
+    python cli.py ingest --inbox inbox -w 4
+    curl http://127.0.0.1:8765/status
+"""
+import os
+import json
+import time
+import signal
+import logging
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from analyzer import FileResult, parse_files, store_fingerprint, store_results
+from cache import ParseCache, file_sha256
+from categorizer import CategoryMatcher
+from extractors import EXTRACTORS, DEFAULT_EXTRACTOR, get_extractor
+from fx import FxRates
+from inbox import (DEFAULT_INBOX_DIR, DEFAULT_PROCESSED_DIR, DEFAULT_QUARANTINE_DIR, DEFAULT_PORT, ERROR_SUFFIX,
+                   archive_name)
+from ocr import PageOcr, DEFAULT_DPI, DEFAULT_LANG
+from parser import load_categories
+from store import TransactionStore, DEFAULT_STORE_FILE, categories_fingerprint
+from templates import TemplateRegistry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = "127.0.0.1"
+THROUGHPUT_WINDOW = 300  # скорость считается по файлам, записанным за последние столько секунд
+RECENT_FILES = 100  # столько последних файлов с задержками отдаёт /status
+MAX_ATTEMPTS = 2  # после стольких падений процесса пула на файле он уходит в quarantine
+
+def _ignore_signals():
+    # Ctrl+C и SIGTERM получает вся группа процессов: воркеры дорабатывают файл, остановкой управляет демон
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+
+def _parse_one(path, templates, extractor=None):
+    # в процессе пула: одна задача — один файл. Шаблоны — копия реестра демона без файла: выученный
+    # шаблон возвращается в FileResult.learned, и bank_templates.json пишет только процесс демона
+    registry = TemplateRegistry(None)
+    registry.templates = templates
+    digest = file_sha256(path)
+    result = parse_files([path], cache=ParseCache(), registry=registry, extractor=extractor, digests=[digest])[0]
+    return result, digest
+
+def _unique(path):
+    base, ext = os.path.splitext(path)
+    number = 1
+    while os.path.exists(path):
+        path = f"{base}.{number}{ext}"
+        number += 1
+    return path
+
+@dataclass
+class _Job:
+    path: str  # где файл сейчас: в inbox, а после разбора — в processed
+    detected: float
+    source: str = None  # путь в inbox, по нему файл помнится, пока не записан
+    digest: str = None
+    result: FileResult = None
+    parsed: float = None
+    attempts: int = 0
+
+class Ingestor:
+    """
+    Цикл демона в одном потоке: опрос inbox, очередь, пул процессов, запись пачками в store.
+    Файл считается дописанным, когда его mtime старше settle секунд (копирование по сети идёт долго).
+    Пачка записывается, когда набралось batch_files файлов или первый ждёт дольше batch_seconds.
+    Файл переносится в processed до записи в хранилище: после сбоя между ними при запуске
+    сверяются processed и манифест хранилища, и незаписанные файлы разбираются заново (из кэша разбора).
+    Шаблоны банков выучиваются в процессах пула, а добавляются в registry и сохраняются здесь.
+    """
+
+    def __init__(self, store: TransactionStore, categories_file="categories.json", inbox=DEFAULT_INBOX_DIR,
+                 processed=DEFAULT_PROCESSED_DIR, quarantine=DEFAULT_QUARANTINE_DIR, workers=None, queue_size=None,
+                 batch_files=20, batch_seconds=5.0, poll=2.0, settle=2.0, extractor=None, fx: FxRates = None,
+                 registry: TemplateRegistry = None):
+        self.store = store
+        self.categories_file = categories_file
+        self.inbox = inbox
+        self.processed = processed
+        self.quarantine = quarantine
+        for directory in (inbox, processed, quarantine):
+            os.makedirs(directory, exist_ok=True)
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = queue_size or self.workers * 4
+        self.batch_files = batch_files
+        self.batch_seconds = batch_seconds
+        self.poll = poll
+        self.settle = settle
+        self.extractor = extractor
+        self.fx = fx
+        self.registry = registry if registry is not None else TemplateRegistry()
+        self.fingerprint = store_fingerprint(extractor, fx)
+        self.matcher = self.rules = self.rules_mtime = None
+
+        self.queue = deque()
+        self.in_flight = {}  # future -> _Job
+        self.pending = []  # разобраны и перенесены, ждут записи в хранилище
+        self.removed = []  # пути, строки которых надо убрать из хранилища
+        self.seen = set()  # пути inbox в очереди, в работе или в ожидании записи
+        self.stale = set()  # файлы processed, разобранные прежним парсером и ещё не перезаписанные
+        self.waiting = 0  # готовых файлов в inbox, не поместившихся в очередь
+        self.recent = deque(maxlen=RECENT_FILES)
+        self.committed = deque()  # (время записи, строк) за THROUGHPUT_WINDOW
+        self.totals = {"files": 0, "failed": 0, "rows": 0, "commits": 0}
+        self.started = time.time()
+        self.stopping = threading.Event()
+        self.pool = None
+        self.snapshot = {}
+
+    def stop(self):
+        """Остановка: новые файлы не берутся, начатые дописываются в хранилище."""
+        self.stopping.set()
+
+    def _load_rules(self):
+        # categories.json перечитывается при изменении: строки хранилища перекатегоризируются без разбора PDF
+        mtime = os.path.getmtime(self.categories_file)
+        if mtime == self.rules_mtime:
+            return
+        categories = load_categories(self.categories_file)
+        self.matcher = CategoryMatcher(categories)
+        self.rules = categories_fingerprint(categories)
+        self.rules_mtime = mtime
+        known = self.store.get_meta("categories")
+        if known != self.rules:
+            moved = self.store.recategorize(self.matcher)
+            with self.store.connection:
+                self.store.set_meta("categories", self.rules)
+            if known is not None:
+                logger.info("Правила категорий изменились: категория сменилась у %d строк", moved)
+
+    def recover(self):
+        """Сверяет processed с хранилищем: незаписанные и разобранные другим парсером файлы — в очередь."""
+        self._load_rules()
+        files = [os.path.join(self.processed, name) for name in sorted(os.listdir(self.processed))
+                 if name.lower().endswith(".pdf")]
+        force = self.store.get_meta("parser") != self.fingerprint
+        # в общем хранилище бывают и выписки других папок (analyzer.py --incremental): diff с folders
+        # считает удалёнными только пропавшие из processed, а analyze — только из разобранной им папки
+        changed, hashes, removed = self.store.diff(files, force=force, folders=[self.processed])
+        self.removed += removed
+        now = time.time()
+        for path in changed:
+            self.queue.append(_Job(path, now, digest=hashes[path]))
+        self.stale = set(changed) if force else set()
+        if changed:
+            logger.info("К повторной записи в хранилище: %d файлов из %s", len(changed), self.processed)
+
+    def _scan(self):
+        self.waiting = 0
+        now = time.time()
+        try:
+            entries = list(os.scandir(self.inbox))
+        except FileNotFoundError:
+            return
+        for entry in sorted(entries, key=lambda e: e.name):
+            if entry.name.startswith(".") or not entry.name.lower().endswith(".pdf") or entry.path in self.seen:
+                continue
+            try:
+                if not entry.is_file() or now - entry.stat().st_mtime < self.settle:
+                    continue
+            except FileNotFoundError:
+                continue
+            if len(self.queue) >= self.queue_size:
+                self.waiting += 1
+                continue
+            self.seen.add(entry.path)
+            self.queue.append(_Job(entry.path, now, source=entry.path))
+
+    def _dispatch(self):
+        while self.queue and len(self.in_flight) < self.workers:
+            # после падения пула начатые тогда файлы разбираются по одному: новое падение укажет на виновника
+            if self.in_flight and (self.queue[0].attempts or any(job.attempts for job in self.in_flight.values())):
+                break
+            job = self.queue.popleft()
+            self.in_flight[self.pool.submit(_parse_one, job.path, self.registry.templates, self.extractor)] = job
+
+    def _new_pool(self):
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=_ignore_signals)
+
+    def _collect(self, timeout):
+        done, _ = wait(list(self.in_flight), timeout=timeout, return_when=FIRST_COMPLETED)
+        broken = False
+        for future in done:
+            job = self.in_flight.pop(future)
+            job.parsed = time.time()
+            try:
+                result, job.digest = future.result()
+            except BrokenProcessPool as e:
+                # процесс пула упал (например, pdfium на битом файле): все начатые файлы разбираются заново
+                # по одному, а файл, на котором пул падает снова, уходит в quarantine
+                broken = True
+                job.attempts += 1
+                if job.attempts < MAX_ATTEMPTS:
+                    self.queue.appendleft(job)
+                    continue
+                result = FileResult(job.path, error=f"{type(e).__name__}: процесс разбора упал")
+            except Exception as e:  # например, файл удалили из inbox
+                result = FileResult(job.path, error=f"{type(e).__name__}: {e}")
+            if result.error:
+                self._fail(job, result.error)
+                continue
+            if result.learned is not None:
+                self.registry.add(result.learned)
+                self.registry.save()
+            if job.source is not None:
+                target = os.path.join(self.processed, archive_name(os.path.basename(job.path), job.digest))
+                try:
+                    os.replace(job.path, target)
+                except OSError as e:
+                    self._fail(job, f"{type(e).__name__}: {e}")
+                    continue
+                job.path = result.path = target
+            job.result = result
+            self.pending.append(job)
+        if broken:
+            for job in self.in_flight.values():
+                job.attempts += 1
+                self.queue.appendleft(job)
+            self.in_flight.clear()
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = self._new_pool()
+
+    def _fail(self, job, error):
+        logger.warning("Файл %s не разобран: %s", job.path, error)
+        name = os.path.basename(job.path)
+        target = _unique(os.path.join(self.quarantine, archive_name(name, job.digest) if job.digest else name))
+        try:
+            os.replace(job.path, target)
+            with open(target + ERROR_SUFFIX, "w", encoding="utf-8") as f:
+                f.write(error + "\n")
+        except OSError as e:
+            logger.warning("Не удалось перенести %s в %s: %s", job.path, self.quarantine, e)
+        if job.source is None:
+            # файл из processed: его прежние строки уходят из хранилища
+            self.removed.append(job.path)
+            self.stale.discard(job.path)
+        self.seen.discard(job.source)
+        self.totals["failed"] += 1
+        self.recent.append(self._record(job, "quarantine", error=error))
+
+    def _record(self, job, status, rows=0, error=None):
+        finished = time.time()
+        return {
+            "file": job.path, "status": status, "rows": rows, "error": error,
+            "parse_seconds": round(job.result.seconds, 3) if job.result is not None else None,
+            "latency_seconds": round(finished - job.detected, 3),
+            "finished": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(finished)),
+        }
+
+    def _commit(self, force=False):
+        now = time.time()
+        due = len(self.pending) >= self.batch_files or (self.pending and now - self.pending[0].parsed >= self.batch_seconds)
+        if not (due or force and self.pending or self.removed):
+            return
+        batch = self.pending
+        try:
+            self._load_rules()
+            stale = self.stale - {job.path for job in batch}
+            store_results(self.store, [job.result for job in batch], {job.path: job.digest for job in batch},
+                          self.matcher, self.rules, self.removed, None if stale else self.fingerprint, self.fx)
+        except Exception:
+            # пачка остаётся в pending и записывается на следующем круге
+            logger.exception("Не удалось записать %d файлов в хранилище", len(batch))
+            return
+        self.stale = stale
+        self.pending, self.removed = [], []
+        for job in batch:
+            self.seen.discard(job.source)
+            self.totals["files"] += 1
+            self.totals["rows"] += job.result.count
+            self.committed.append((now, job.result.count))
+            self.recent.append(self._record(job, "stored", rows=job.result.count))
+        self.totals["commits"] += 1
+        if batch:
+            logger.info("В хранилище записано файлов: %d", len(batch))
+
+    def status(self) -> dict:
+        now = time.time()
+        while self.committed and self.committed[0][0] < now - THROUGHPUT_WINDOW:
+            self.committed.popleft()
+        window = min(THROUGHPUT_WINDOW, max(now - self.started, 1e-9))
+        latencies = sorted(r["latency_seconds"] for r in self.recent if r["status"] == "stored")
+
+        def percentile(q):
+            return latencies[min(int(q * len(latencies)), len(latencies) - 1)] if latencies else None
+        return {
+            "state": "stopping" if self.stopping.is_set() else "running",
+            "uptime_seconds": round(now - self.started, 1),
+            "store": self.store.path,
+            "revision": self.store.revision(),
+            "queue": {
+                "depth": len(self.queue), "capacity": self.queue_size, "in_flight": len(self.in_flight),
+                "workers": self.workers, "pending_commit": len(self.pending), "waiting_in_inbox": self.waiting,
+                "backpressure": self.waiting > 0,
+            },
+            "totals": dict(self.totals),
+            "throughput": {
+                "window_seconds": round(window, 1),
+                "files_per_minute": round(len(self.committed) * 60 / window, 2),
+                "rows_per_second": round(sum(rows for _, rows in self.committed) / window, 2),
+            },
+            "latency_seconds": {"p50": percentile(0.5), "p95": percentile(0.95),
+                                "max": latencies[-1] if latencies else None},
+            "recent": list(self.recent)[::-1],
+        }
+
+    def run(self, once=False):
+        """
+        Основной цикл до stop(). once=True — разобрать то, что уже лежит в inbox, записать и выйти.
+        """
+        self.recover()
+        self.snapshot = self.status()
+        self.pool = self._new_pool()
+        try:
+            while True:
+                stopping = self.stopping.is_set()
+                if stopping:
+                    # не начатые файлы остаются в inbox (или в processed) до следующего запуска
+                    self.queue.clear()
+                else:
+                    self._scan()
+                    self._dispatch()
+                if self.in_flight:
+                    self._collect(self.poll)
+                    if not stopping:
+                        self._dispatch()  # освободившиеся процессы берут следующие файлы сразу
+                idle = not self.queue and not self.in_flight
+                self._commit(force=idle and (stopping or once))
+                self.snapshot = self.status()  # HTTP-поток читает готовый словарь, без блокировок
+                if idle and (stopping or once):
+                    break
+                if idle:
+                    self.stopping.wait(self.poll)
+        finally:
+            self.pool.shutdown(cancel_futures=True)
+        return self.totals
+
+class _StatusHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/status"):
+            self.send_error(404)
+            return
+        body = json.dumps(self.server.ingestor.snapshot, ensure_ascii=False).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("status: " + format, *args)
+
+def serve_status(ingestor: Ingestor, host=DEFAULT_HOST, port=DEFAULT_PORT) -> ThreadingHTTPServer:
+    """Отдаёт Ingestor.status() по GET /status в фоновом потоке; остановка — server.shutdown()."""
+    server = ThreadingHTTPServer((host, port), _StatusHandler)
+    server.daemon_threads = True
+    server.ingestor = ingestor
+    threading.Thread(target=server.serve_forever, name="ingest-status", daemon=True).start()
+    return server
+
+def main(argv=None, prog=None):
+    ap = argparse.ArgumentParser(prog=prog, description="Демон приёма выписок из папки inbox в хранилище транзакций")
+    ap.add_argument("--inbox", default=DEFAULT_INBOX_DIR, help="папка, куда приходят новые PDF")
+    ap.add_argument("--processed", default=DEFAULT_PROCESSED_DIR, help="куда переносятся разобранные PDF")
+    ap.add_argument("--quarantine", default=DEFAULT_QUARANTINE_DIR, help="куда переносятся PDF с ошибкой разбора")
+    ap.add_argument("--store", default=DEFAULT_STORE_FILE, help="файл хранилища транзакций")
+    ap.add_argument("-c", "--categories", default="categories.json")
+    ap.add_argument("-w", "--workers", type=int, default=None, help="число процессов разбора (по умолчанию — по ядрам)")
+    ap.add_argument("--queue-size", type=int, default=None, help="длина очереди (по умолчанию — 4 на процесс)")
+    ap.add_argument("--batch-files", type=int, default=20, help="файлов в одной записи в хранилище")
+    ap.add_argument("--batch-seconds", type=float, default=5.0, help="дольше этого разобранный файл не ждёт записи")
+    ap.add_argument("--poll", type=float, default=2.0, help="интервал опроса inbox, секунд")
+    ap.add_argument("--settle", type=float, default=2.0, help="файл берётся, если не менялся столько секунд")
+    ap.add_argument("-e", "--engine", choices=list(EXTRACTORS), default=DEFAULT_EXTRACTOR,
+                    help="движок извлечения таблиц")
+    ap.add_argument("--ocr", action="store_true", help="распознавать страницы-сканы (нужен tesseract)")
+    ap.add_argument("--ocr-dpi", type=int, default=DEFAULT_DPI, help="разрешение растра для OCR")
+    ap.add_argument("--ocr-lang", default=DEFAULT_LANG, help="языки tesseract")
+    ap.add_argument("--fx-rates", default=None,
+                    help="CSV дневных курсов (date, currency, rate к KZT): суммы пересчитываются в валюту отчёта")
+    ap.add_argument("--currency", default=None, help="валюта отчёта для --fx-rates (по умолчанию KZT)")
+    ap.add_argument("--host", default=DEFAULT_HOST, help="адрес HTTP-статуса")
+    ap.add_argument("--port", type=int, default=DEFAULT_PORT, help="порт HTTP-статуса; 0 — без HTTP")
+    ap.add_argument("--once", action="store_true", help="разобрать то, что уже есть в inbox, и выйти")
+    ap.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"])
+    args = ap.parse_args(argv)
+    logging.basicConfig(level=args.log_level, format="%(asctime)s %(message)s")
+
+    # OCR внутри процесса разбора — в одном потоке, параллельность уже даёт пул демона
+    extractor = get_extractor(args.engine, ocr=PageOcr(args.ocr_dpi, args.ocr_lang, workers=1) if args.ocr else None)
+    fx = None
+    if args.fx_rates:
+        try:
+            fx = FxRates.load(args.fx_rates, target=args.currency)
+        except ValueError as e:
+            ap.error(str(e))
+
+    with TransactionStore(args.store) as store:
+        ingestor = Ingestor(store, args.categories, args.inbox, args.processed, args.quarantine, args.workers,
+                            args.queue_size, args.batch_files, args.batch_seconds, args.poll,
+                            0 if args.once else args.settle, extractor, fx)
+        for number in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(number, lambda *_: ingestor.stop())
+        server = serve_status(ingestor, args.host, args.port) if args.port else None
+        if server is not None:
+            logger.info("Статус: http://%s:%d/status", *server.server_address[:2])
+        try:
+            totals = ingestor.run(once=args.once)
+        finally:
+            if server is not None:
+                server.shutdown()
+    logger.info("Записано файлов: %d, строк: %d, в карантине: %d", totals["files"], totals["rows"], totals["failed"])
+    return 1 if args.once and totals["failed"] else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,205 @@
+import os
+import json
+import time
+from contextlib import contextmanager, nullcontext
+from collections import defaultdict
+
+PROFILERS = ("cprofile", "pyinstrument")
+PROMETHEUS_PREFIX = "bank_analyzer"
+
+def _label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+class Metrics:
+    """
+    Сборщик замеров разбора: время по файлам, страницам и этапам, число строк, пропущенные
+    таблицы с причиной, попадания в кэш. Включается явно (analyze(metrics=...), --metrics);
+    код разбора обращается к текущему сборщику через current(), по умолчанию это NullMetrics.
+    profile: "cprofile" или "pyinstrument" — профиль разбора каждого файла в profile_dir.
+    """
+
+    def __init__(self, profile=None, profile_dir="profiles"):
+        if profile is not None and profile not in PROFILERS:
+            raise ValueError(f"Неизвестный профилировщик: {profile}. Доступны: {', '.join(PROFILERS)}")
+        self.profile = profile
+        self.profile_dir = profile_dir
+        self.files = {}  # путь -> замеры файла
+        self.stages = {}  # этап -> {"seconds", "calls"}
+        self.path = None  # файл, который сейчас разбирается: к нему относятся page и skip
+
+    def _file(self, path):
+        return self.files.setdefault(path, {
+            "seconds": 0.0, "rows": 0, "cache_hit": None, "error": None, "pages": [], "skipped": [],
+        })
+
+    @contextmanager
+    def stage(self, name, path=None):
+        """Время этапа (parse, prepare, dedup, write...) суммируется по всем вызовам."""
+        previous = self.path
+        if path is not None:
+            self.path = path
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            stage = self.stages.setdefault(name, {"seconds": 0.0, "calls": 0})
+            stage["seconds"] += time.perf_counter() - start
+            stage["calls"] += 1
+            self.path = previous
+
+    def page(self, number, seconds, tables, rows):
+        self._file(self.path)["pages"].append(
+            {"page": number, "seconds": round(seconds, 6), "tables": tables, "rows": rows})
+
+    def skip(self, page, table, reason):
+        self._file(self.path)["skipped"].append({"page": page, "table": table, "reason": reason})
+
+    def cache(self, path, hit):
+        self._file(path)["cache_hit"] = hit
+
+    def file(self, path, rows, seconds, error=None):
+        entry = self._file(path)
+        entry["rows"] = rows
+        entry["seconds"] = round(seconds, 6)
+        entry["error"] = error
+
+    def profiled(self, path, pages=None):
+        """Профиль разбора файла (или куска pages) в profile_dir, если профилировщик задан."""
+        if self.profile is None:
+            return nullcontext()
+        name = os.path.splitext(os.path.basename(path))[0]
+        if pages is not None:
+            name += f".{pages[0] + 1}-{pages[1]}"
+        os.makedirs(self.profile_dir, exist_ok=True)
+        return self._profile(os.path.join(self.profile_dir, name))
+
+    @contextmanager
+    def _profile(self, stem):
+        if self.profile == "cprofile":
+            import cProfile
+
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+                profiler.dump_stats(stem + ".prof")
+        else:
+            from pyinstrument import Profiler
+
+            profiler = Profiler()
+            profiler.start()
+            try:
+                yield
+            finally:
+                profiler.stop()
+                with open(stem + ".html", "w", encoding="utf-8") as f:
+                    f.write(profiler.output_html())
+
+    def child(self) -> "Metrics":
+        """Пустой сборщик с теми же настройками — для процесса пула, его замеры потом сливаются через merge."""
+        return Metrics(self.profile, self.profile_dir)
+
+    def merge(self, other: "Metrics"):
+        for path, entry in other.files.items():
+            mine = self._file(path)
+            mine["pages"].extend(entry["pages"])
+            mine["skipped"].extend(entry["skipped"])
+            if entry["cache_hit"] is not None:
+                mine["cache_hit"] = entry["cache_hit"]
+        for name, stage in other.stages.items():
+            mine = self.stages.setdefault(name, {"seconds": 0.0, "calls": 0})
+            mine["seconds"] += stage["seconds"]
+            mine["calls"] += stage["calls"]
+
+    def to_dict(self) -> dict:
+        return {
+            "stages": {name: {"seconds": round(s["seconds"], 6), "calls": s["calls"]} for name, s in self.stages.items()},
+            "files": self.files,
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), ensure_ascii=False, indent=2)
+
+    def to_prometheus(self) -> str:
+        """Текстовый формат Prometheus (для node_exporter textfile collector)."""
+        p = PROMETHEUS_PREFIX
+        lines = [
+            f"# HELP {p}_stage_seconds_total Время этапа обработки.",
+            f"# TYPE {p}_stage_seconds_total counter",
+        ]
+        lines += [f'{p}_stage_seconds_total{{stage="{_label(name)}"}} {s["seconds"]:.6f}'
+                  for name, s in self.stages.items()]
+        lines += [f"# HELP {p}_file_seconds Время разбора файла.", f"# TYPE {p}_file_seconds gauge"]
+        lines += [f'{p}_file_seconds{{file="{_label(path)}"}} {e["seconds"]:.6f}' for path, e in self.files.items()]
+        lines += [f"# HELP {p}_file_rows Строк извлечено из файла.", f"# TYPE {p}_file_rows gauge"]
+        lines += [f'{p}_file_rows{{file="{_label(path)}"}} {e["rows"]}' for path, e in self.files.items()]
+
+        pages = [page for e in self.files.values() for page in e["pages"]]
+        lines += [
+            f"# HELP {p}_page_seconds Время разбора страницы.",
+            f"# TYPE {p}_page_seconds summary",
+            f"{p}_page_seconds_sum {sum(page['seconds'] for page in pages):.6f}",
+            f"{p}_page_seconds_count {len(pages)}",
+        ]
+        reasons = defaultdict(int)
+        for e in self.files.values():
+            for skipped in e["skipped"]:
+                reasons[skipped["reason"]] += 1
+        lines += [f"# HELP {p}_skipped_total Пропущено страниц и таблиц по причинам.",
+                  f"# TYPE {p}_skipped_total counter"]
+        lines += [f'{p}_skipped_total{{reason="{_label(reason)}"}} {count}' for reason, count in reasons.items()]
+        hits = [e["cache_hit"] for e in self.files.values() if e["cache_hit"] is not None]
+        lines += [
+            f"# HELP {p}_cache_requests_total Обращения к кэшу разбора.",
+            f"# TYPE {p}_cache_requests_total counter",
+            f'{p}_cache_requests_total{{result="hit"}} {sum(hits)}',
+            f'{p}_cache_requests_total{{result="miss"}} {len(hits) - sum(hits)}',
+        ]
+        return "\n".join(lines) + "\n"
+
+    def save(self, path):
+        """JSON, а для .prom/.txt — текстовый формат Prometheus."""
+        text = self.to_prometheus() if path.endswith((".prom", ".txt")) else self.to_json()
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp, path)
+
+class NullMetrics(Metrics):
+    """Выключенный сборщик: все замеры — пустые вызовы."""
+
+    def stage(self, name, path=None):
+        return nullcontext()
+
+    def page(self, number, seconds, tables, rows):
+        pass
+
+    def skip(self, page, table, reason):
+        pass
+
+    def cache(self, path, hit):
+        pass
+
+    def file(self, path, rows, seconds, error=None):
+        pass
+
+    def child(self):
+        return None
+
+_current = NullMetrics()
+
+def current() -> Metrics:
+    """Сборщик, в который сейчас пишут замеры (NullMetrics, если замеры не включены)."""
+    return _current
+
+@contextmanager
+def use(metrics: Metrics):
+    """Сделать metrics текущим сборщиком на время блока."""
+    global _current
+    previous, _current = _current, metrics
+    try:
+        yield metrics
+    finally:
+        _current = previous
@@ -0,0 +1,172 @@
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Формат выписки определяется один раз на файл и применяется ко всем её строкам
+StatementFormat = namedtuple("StatementFormat", ["date_order", "decimal"])
+
+# Регулярные выражения выполняются в Arrow (RE2) сразу над всей колонкой
+DATE_PARTS_PATTERN = r"(?P<a>\d{1,4})[./\- ](?P<b>\d{1,2})[./\- ](?P<c>\d{1,4})"  # порядок частей — detect_date_order
+DATE_PATTERN = (
+    r"^\s*" + DATE_PARTS_PATTERN +
+    r"(?:[ T,]+(?P<hh>\d{1,2}):(?P<mm>\d{2})(?::(?P<ss>\d{2}))?)?"
+)
+COMPACT_DATE_PATTERN = r"^\s*(?P<a>\d{2})(?P<b>\d{2})(?P<c>\d{4})\s*$"  # ddmmyyyy без разделителей
+AMOUNT_PATTERN = r"(?P<n>[+-]?\d[\d,.]*)"
+SPACES_PATTERN = r"[\s\x{00A0}\x{202F}₸]"  # \s в RE2 — только ASCII
+NUMBER_PATTERN = r"^[+-]?\d+(\.\d*)?$"
+# до 16 цифр целой части: в минимальных единицах сумма помещается в int64
+MINOR_PATTERN = r"^(?P<sign>[+-]?)(?P<units>\d{1,16})(?:\.(?P<fraction>\d*))?$"
+CURRENCY_PATTERN = r"(?P<code>\b[A-Z]{3}\b|[₸$₽€])"
+CURRENCY_SYMBOLS = {"₸": "KZT", "$": "USD", "₽": "RUB", "€": "EUR"}
+DEFAULT_CURRENCY = "KZT"  # валюта сумм без кода и символа
+MINOR_DIGITS = 2  # тиыны, центы, копейки
+SAMPLE_ROWS = 5000  # по скольким строкам определяется формат выписки
+
+def _arrow(values: pd.Series) -> pa.Array:
+    return pa.array(values, type=pa.string(), from_pandas=True)
+
+def _to_float(strings) -> np.ndarray:
+    # пустые и отсутствующие группы -> NaN
+    strings = pc.if_else(pc.equal(strings, ""), pa.scalar(None, pa.string()), strings)
+    return pc.cast(strings, pa.float64()).to_numpy(zero_copy_only=False)
+
+def _date_parts(values: pd.Series) -> dict:
+    text = _arrow(values)
+    parts = pc.extract_regex(text, DATE_PATTERN)
+    compact = pc.extract_regex(text, COMPACT_DATE_PATTERN)
+    result = {}
+    for name in ("a", "b", "c"):
+        full = pc.struct_field(parts, name)
+        result[name] = _to_float(pc.coalesce(full, pc.struct_field(compact, name)))
+    for name in ("hh", "mm", "ss"):
+        result[name] = np.nan_to_num(_to_float(pc.struct_field(parts, name)))
+    return result
+
+def amount_numbers(values: pd.Series) -> pa.Array:
+    # первое число в ячейке, без пробелов и ₸: "- 12 500,50 ₸" -> "-12500,50"; типографский минус — как "-"
+    text = pc.replace_substring_regex(_arrow(values), SPACES_PATTERN, "")
+    text = pc.replace_substring(text, "\u2212", "-")
+    return pc.struct_field(pc.extract_regex(text, AMOUNT_PATTERN), "n")
+
+def detect_date_order(values: pd.Series) -> str:
+    parts = _date_parts(values.dropna().head(SAMPLE_ROWS))
+    a, b = parts["a"], parts["b"]
+    a, b = a[~np.isnan(a)], b[~np.isnan(b)]
+    if a.size == 0:
+        return "DMY"
+    if (a >= 100).mean() > 0.5:
+        return "YMD"
+    if (b > 12).any() and not (a > 12).any():
+        return "MDY"
+    return "DMY"
+
+def detect_decimal(values: pd.Series) -> str:
+    numbers = pd.Series(amount_numbers(values.dropna().head(SAMPLE_ROWS)).to_pylist(), dtype=object).dropna()
+    if numbers.empty:
+        return ","
+    has_comma = numbers.str.contains(",", regex=False)
+    has_dot = numbers.str.contains(".", regex=False)
+    both = numbers[has_comma & has_dot]
+    if not both.empty:
+        # десятичный разделитель стоит последним: "1,234.50" / "1.234,50"
+        return "." if (both.str.rfind(".") > both.str.rfind(",")).mean() >= 0.5 else ","
+    for sep, other in ((",", "."), (".", ",")):
+        only = numbers[numbers.str.contains(sep, regex=False)]
+        if only.empty:
+            continue
+        tails = only.str.rsplit(sep, n=1).str[1].str.len()
+        repeated = only.str.count("\\" + sep) > 1
+        # "1,234" и "1,234,567" — разделитель тысяч, "12,5" и "12,50" — десятичный
+        if (tails == 3).all() and (repeated.any() or sep == ","):
+            return other
+        return sep
+    return ","
+
+def detect_format(df: pd.DataFrame) -> StatementFormat:
+    return StatementFormat(detect_date_order(df["date"]), detect_decimal(df["amount"]))
+
+def parse_dates(values: pd.Series, order: str = "DMY") -> pd.Series:
+    parts = _date_parts(values)
+    a, b, c = parts["a"], parts["b"], parts["c"]
+    if order == "YMD":
+        year, month, day = a, b, c
+    elif order == "MDY":
+        month, day, year = a, b, c
+    else:
+        day, month, year = a, b, c
+    if order != "YMD":
+        # отдельные даты вида 2024-01-05 в выписке с другим порядком
+        year_first = a >= 100
+        year = np.where(year_first, a, year)
+        month = np.where(year_first, b, month)
+        day = np.where(year_first, c, day)
+    # двузначный год — как %y в strptime
+    year = np.where(year >= 100, year, year + np.where(year < 69, 2000, 1900))
+    assembled = pd.DataFrame({
+        "year": year, "month": month, "day": day,
+        "hour": parts["hh"], "minute": parts["mm"], "second": parts["ss"],
+    }, index=values.index)
+    return pd.to_datetime(assembled, errors="coerce")
+
+def _decimal_numbers(values: pd.Series, decimal: str) -> pa.Array:
+    # "-12 500,50 ₸" -> "-12500.50"; не число — null
+    numbers = amount_numbers(values)
+    thousands = "." if decimal == "," else ","
+    numbers = pc.replace_substring(numbers, thousands, "")
+    if decimal == ",":
+        numbers = pc.replace_substring(numbers, ",", ".")
+    return pc.if_else(pc.match_substring_regex(numbers, NUMBER_PATTERN), numbers, pa.scalar(None, pa.string()))
+
+def parse_minor_units(values: pd.Series, decimal: str = ",") -> pd.Series:
+    """
+    Сумма со знаком в минимальных единицах валюты, точно, без float: "- 12 500,50 ₸" -> -1250050.
+    Знаков после разделителя больше MINOR_DIGITS — лишние отбрасываются.
+    """
+    parts = pc.extract_regex(_decimal_numbers(values, decimal), MINOR_PATTERN)
+    units = pc.cast(pc.struct_field(parts, "units"), pa.int64())
+    fraction = pc.utf8_slice_codeunits(pc.utf8_rpad(pc.struct_field(parts, "fraction"), MINOR_DIGITS, "0"),
+                                       0, MINOR_DIGITS)
+    minor = pc.add(pc.multiply(units, 10 ** MINOR_DIGITS), pc.cast(fraction, pa.int64()))
+    minor = pc.if_else(pc.equal(pc.struct_field(parts, "sign"), "-"), pc.negate(minor), minor)
+    return pd.Series(minor.to_pandas(types_mapper={pa.int64(): pd.Int64Dtype()}.get),
+                     index=values.index, name=values.name, dtype="Int64")
+
+def whole_units(minor: pd.Series) -> pd.Series:
+    """Округлённый модуль суммы в целых единицах валюты — то, что идёт в сводки отчёта."""
+    return (minor.abs() / 10 ** MINOR_DIGITS).round().astype("Int64")
+
+def parse_amounts(values: pd.Series, decimal: str = ",") -> pd.Series:
+    # как и раньше, в отчёт идёт округлённый модуль суммы
+    return whole_units(parse_minor_units(values, decimal)).rename(values.name)
+
+def parse_currency(amounts: pd.Series, currency: pd.Series = None, default: str = DEFAULT_CURRENCY) -> pd.Series:
+    """
+    Код валюты строки (ISO 4217): из колонки валюты, иначе по коду или символу (₸, $, ₽, €)
+    в ячейке суммы, иначе default.
+    """
+    found = pc.struct_field(pc.extract_regex(_arrow(amounts), CURRENCY_PATTERN), "code")
+    if currency is not None:
+        column = pc.utf8_upper(pc.utf8_trim_whitespace(_arrow(currency)))
+        found = pc.coalesce(pc.struct_field(pc.extract_regex(column, CURRENCY_PATTERN), "code"), found)
+    for symbol, code in CURRENCY_SYMBOLS.items():
+        found = pc.replace_substring(found, symbol, code)
+    found = pc.fill_null(found, default)
+    return pd.Series(found.to_pandas(), index=amounts.index, name="currency", dtype="str")
+
+def normalize_frame(df: pd.DataFrame, fmt: StatementFormat = None, currency: str = DEFAULT_CURRENCY) -> pd.DataFrame:
+    """
+    Сырые строки "date"/"amount" одной выписки -> datetime64 и Int64 целиком по колонкам.
+    amount — округлённый модуль суммы, amount_minor — точная сумма со знаком в минимальных
+    единицах, currency — код валюты строки (currency — для строк без кода и символа валюты).
+    fmt: формат выписки; если не задан, определяется по первым SAMPLE_ROWS строкам.
+    """
+    if fmt is None:
+        fmt = detect_format(df)
+    df["date"] = parse_dates(df["date"], fmt.date_order)
+    df["currency"] = parse_currency(df["amount"], df["currency"] if "currency" in df.columns else None, currency)
+    df["amount_minor"] = parse_minor_units(df["amount"], fmt.decimal)
+    df["amount"] = whole_units(df["amount_minor"])
+    return df
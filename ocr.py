@@ -0,0 +1,116 @@
+"""
+OCR страниц без текстового слоя (сканы, выгрузки картинками): страница растрируется pdfium
+и распознаётся локальным Tesseract (программа tesseract в PATH, без сети). Страницы
+распознаются в пуле процессов, текст кэшируется по SHA-256 растра, так что один и тот же
+скан не распознаётся дважды — даже в другом файле или после переименования.
+"""
+import os
+import shutil
+import hashlib
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+DEFAULT_DPI = 300
+DEFAULT_LANG = "rus+eng"
+DEFAULT_OCR_CACHE_DIR = ".ocr_cache"
+PAGE_SEGMENTATION = "6"  # --psm 6: один блок текста — строки таблицы не перемешиваются по колонкам
+
+def is_image_only(page) -> bool:
+    """Страница (pypdfium2) без текстового слоя, но с картинками — скан."""
+    import pypdfium2.raw as pdfium_c
+
+    textpage = page.get_textpage()
+    try:
+        text = textpage.get_text_range()
+    finally:
+        textpage.close()
+    if text.strip():
+        return False
+    return next(page.get_objects(filter=[pdfium_c.FPDF_PAGEOBJ_IMAGE]), None) is not None
+
+def render_page(file_path, index, dpi=DEFAULT_DPI) -> bytes:
+    """Страница в оттенках серого, формат PGM (его читает tesseract, Pillow не нужен)."""
+    import pypdfium2 as pdfium
+
+    doc = pdfium.PdfDocument(file_path)
+    try:
+        bitmap = doc[index].render(scale=dpi / 72, grayscale=True)
+        width, height, stride = bitmap.width, bitmap.height, bitmap.stride
+        buffer = memoryview(bitmap.buffer)
+        pixels = b"".join(buffer[row * stride:row * stride + width] for row in range(height)) \
+            if stride != width else bytes(buffer[:width * height])
+    finally:
+        doc.close()
+    return f"P5 {width} {height} 255\n".encode("ascii") + pixels
+
+class OcrCache:
+    """Распознанный текст страниц на диске, по файлу на растр."""
+
+    def __init__(self, directory=DEFAULT_OCR_CACHE_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _entry_path(self, key):
+        return os.path.join(self.directory, key + ".txt")
+
+    def get(self, key):
+        try:
+            with open(self._entry_path(key), encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, text):
+        # запись атомарная: процессы пула пишут в кэш одновременно
+        entry = self._entry_path(key)
+        tmp = f"{entry}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp, entry)
+
+def _recognize(file_path, index, dpi, lang, command, cache_dir):
+    # выполняется в процессе пула: растр, кэш, tesseract
+    image = render_page(file_path, index, dpi)
+    cache = OcrCache(cache_dir) if cache_dir else None
+    key = f"{hashlib.sha256(image).hexdigest()}-{lang}"
+    text = cache.get(key) if cache is not None else None
+    if text is None:
+        done = subprocess.run([command, "stdin", "stdout", "-l", lang, "--dpi", str(dpi), "--psm", PAGE_SEGMENTATION],
+                              input=image, capture_output=True, check=True)
+        text = done.stdout.decode("utf-8")
+        if cache is not None:
+            cache.put(key, text)
+    return text
+
+class PageOcr:
+    """
+    Настройки OCR: dpi растра, языки tesseract, размер пула (None — по числу ядер,
+    1 — в текущем процессе), папка кэша (None — без кэша).
+    """
+
+    def __init__(self, dpi=DEFAULT_DPI, lang=DEFAULT_LANG, workers=None, cache_dir=DEFAULT_OCR_CACHE_DIR,
+                 command="tesseract"):
+        self.dpi = dpi
+        self.lang = lang
+        self.workers = workers
+        self.cache_dir = cache_dir
+        self.command = command
+
+    def available(self) -> bool:
+        return shutil.which(self.command) is not None
+
+    def recognize(self, file_path, indices):
+        """
+        Генератор текста страниц indices (с нуля) в их порядке. Пул распознаёт страницы
+        наперёд, пока вызывающий разбирает уже готовые; процессов не больше workers.
+        """
+        indices = list(indices)
+        workers = min(self.workers or os.cpu_count() or 1, len(indices))
+        args = (repeat(file_path), indices, repeat(self.dpi), repeat(self.lang), repeat(self.command),
+                repeat(self.cache_dir))
+        if workers <= 1:
+            yield from map(_recognize, *args)
+            return
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            yield from pool.map(_recognize, *args)
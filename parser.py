@@ -1,8 +1,17 @@
 import re
-import pdfplumber
+import time
+import logging
 import json
-from collections import defaultdict
+import hashlib
+from bisect import bisect_right
+from functools import lru_cache
 from datetime import datetime
+from categorizer import CategoryMatcher
+from templates import page_signature, row_signature, union_bbox, crop_to_template, crosses_crop
+from metrics import current
+from rowbatch import RowBatch
+
+logger = logging.getLogger(__name__)
 
 column_map = {
     "date": ["Дата", "Date"],
@@ -42,165 +51,433 @@ def normalize_date(date_str: str) -> str:
             pass
     return date_str  # fallback: return original if can't parse
 
-def parse_pdf(file_path: str, categories: dict):
-    rows = []
-    saved_indices = None  # сохраняем индексы колонок после первой страницы
-
-    def looks_like_headers(row):
-        if not row:
-            return False
-        text = " ".join([c or "" for c in row]).lower()
-        # если нет даты и суммы, считаем строку частью шапки
-        return not re.search(r"\d{2}[./-]\d{2}[./-]\d{2,4}", text) and "₸" not in text and not re.search(r"[+-]?\d[\d\s,.]*", text)
-    
-    def looks_like_transaction(row):
-        if not row:
-            return False
-        text = " ".join([c or "" for c in row]).lower()
-        return re.search(r"\d{2}[./-]\d{2}[./-]\d{2,4}", text) or "₸" in text or re.search(r"[+-]?\d[\d\s,.]*", text)
-
-    with pdfplumber.open(file_path) as pdf:
-        for page_number, page in enumerate(pdf.pages, start=1):
-            table_settings = {
-                "vertical_strategy": "lines",
-                "horizontal_strategy": "lines",
-                "snap_tolerance": 3,
-                "join_tolerance": 3,
-                "intersection_tolerance": 3,
-                "edge_min_length": 3,
-                "min_words_vertical": 1,
-                "min_words_horizontal": 1,
+TABLE_SETTINGS = {
+    "vertical_strategy": "lines",
+    "horizontal_strategy": "lines",
+    "snap_tolerance": 3,
+    "join_tolerance": 3,
+    "intersection_tolerance": 3,
+    "edge_min_length": 3,
+    "min_words_vertical": 1,
+    "min_words_horizontal": 1,
+}
+
+DATE_HINT = re.compile(r"\d{1,4}[./-]\d{1,2}[./-]\d{2,4}")
+SCANNED_REASON = "нет текстового слоя"  # причина пропуска страниц-сканов без OCR
+WORD_LINE_TOLERANCE = 3  # слова с такой разницей top считаются одной строкой, pt
+
+PARSER_VERSION = 5  # увеличить при изменении логики разбора строк (сбрасывает кэш)
+
+def parser_fingerprint() -> str:
+    payload = json.dumps(
+        {"version": PARSER_VERSION, "table_settings": TABLE_SETTINGS, "column_map": column_map},
+        sort_keys=True, ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+class ParseState:
+    """
+    Состояние разбора, которое переходит со страницы на страницу.
+    keep_orphans=True: таблицы без шапки, встреченные до первой шапки, не пропускаются,
+    а складываются в orphans — их дочитывают с индексами из предыдущего куска файла.
+    """
+
+    def __init__(self, saved_indices=None, keep_orphans=False):
+        self.saved_indices = saved_indices  # индексы колонок после первой шапки
+        self.keep_orphans = keep_orphans
+        self.orphans = []
+        self.template = None  # шаблон банка из TemplateRegistry
+        self.page_key = None  # отпечаток первой страницы файла
+        self.bbox = None  # объединённая область найденных таблиц
+        self.learned = None  # новый шаблон, если шапку пришлось разбирать
+        self.registry = None
+
+def looks_like_headers(row):
+    if not row:
+        return False
+    text = " ".join([c or "" for c in row]).lower()
+    # если нет даты и суммы, считаем строку частью шапки
+    return not re.search(r"\d{2}[./-]\d{2}[./-]\d{2,4}", text) and "₸" not in text and not re.search(r"[+-]?\d[\d\s,.]*", text)
+
+def looks_like_transaction(row):
+    if not row:
+        return False
+    text = " ".join([c or "" for c in row]).lower()
+    return re.search(r"\d{2}[./-]\d{2}[./-]\d{2,4}", text) or "₸" in text or re.search(r"[+-]?\d[\d\s,.]*", text)
+
+def parse_table(table, matcher: CategoryMatcher, state: ParseState, page_number=None, table_number=None,
+                out: RowBatch = None) -> RowBatch:
+    """Строки таблицы в RowBatch; out — дописать в уже начатую пачку (например, страницы)."""
+    rows = RowBatch() if out is None else out
+    logger.debug("Страница %s, таблица %s: %d строк, %d колонок", page_number, table_number,
+                 len(table), len(table[0]) if table and table[0] else 0)
+    if not table or not table[0]:
+        return rows
+
+    raw_headers = table[0]
+    template = state.template
+
+    if template is not None and len(raw_headers) == template["columns"]:
+        # известный шаблон банка: шапку узнаём по отпечатку строки, без регулярок и поиска колонок
+        is_header = row_signature(raw_headers) == template["header_key"]
+        data_rows = table[template["header_rows"]:] if is_header else table
+        idx_date = template["indices"].get("date")
+        idx_desc = template["indices"].get("desc")
+        idx_amount = template["indices"].get("amount")
+        idx_currency = template["indices"].get("currency")
+        idx_details = template["indices"].get("details")
+    elif looks_like_transaction(raw_headers) and state.saved_indices is None and state.keep_orphans:
+        # продолжение таблицы с предыдущей страницы, шапка в другом куске файла
+        state.orphans.append((page_number, table_number, table))
+        return rows
+
+    elif looks_like_transaction(raw_headers) and state.saved_indices is not None:
+        headers = None
+        data_rows = table
+        idx_date = state.saved_indices.get("date")
+        idx_desc = state.saved_indices.get("desc")
+        idx_amount = state.saved_indices.get("amount")
+        idx_currency = state.saved_indices.get("currency")
+        idx_details = state.saved_indices.get("details")
+    else:
+        if len(table) > 1 and looks_like_headers(table[1]):
+            combined = []
+            for i in range(len(raw_headers)):
+                h1 = raw_headers[i] or ""
+                h2 = table[1][i] or ""
+                combined.append((h1 + " " + h2).replace("\n", " ").strip().lower())
+            headers = combined
+            data_rows = table[2:]
+        else:
+            headers = [h.replace("\n", " ").strip().lower() if h else "" for h in raw_headers]
+            data_rows = table[1:]
+
+        idx_date = idx_desc = idx_amount = idx_currency = idx_details = None
+
+        if headers and any(headers):  # определяем индексы только если есть заголовки
+            for i, header_lower in enumerate(headers):
+                if any(h.lower() in header_lower for h in column_map["date"]):
+                    idx_date = i
+                elif any(h.lower() in header_lower for h in column_map["description"]):
+                    idx_desc = i
+                elif any(h.lower() in header_lower for h in column_map["amount"]):
+                    idx_amount = i
+                elif any(h.lower() in header_lower for h in column_map["currency"]):
+                    idx_currency = i
+                elif any(h.lower() in header_lower for h in column_map["details"]):
+                    idx_details = i
+            state.saved_indices = {
+                "date": idx_date,
+                "desc": idx_desc,
+                "amount": idx_amount,
+                "currency": idx_currency,
+                "details": idx_details
             }
-            tables = page.extract_tables(table_settings=table_settings)
-            print(f"Страница {page_number}: найдено {len(tables)} таблиц")
-            if not tables:
-                print(f"Страница {page_number}: таблиц не найдено")
-                continue
-
-            for table_number, table in enumerate(tables, start=1):
-                print(f"  Таблица {table_number}: {len(table)} строк, {len(table[0]) if table and table[0] else 0} колонок")
-                if not table or not table[0]:
-                    continue
+            header_key = row_signature(raw_headers)
+            if state.template is None and state.registry is not None:
+                # первая страница у выписки другая, но шапка таблицы уже знакома
+                state.template = state.registry.find(header_key=header_key)
+            if state.template is None and state.learned is None and None not in (idx_date, idx_desc, idx_amount):
+                state.learned = {
+                    "page_key": state.page_key,
+                    "header_key": header_key,
+                    "header_rows": len(table) - len(data_rows),
+                    "columns": len(raw_headers),
+                    "indices": state.saved_indices,
+                    "table_settings": TABLE_SETTINGS,
+                    "engine": "lines",
+                }
+        else:  # если заголовков нет, используем сохранённые индексы
+            logger.debug("Нет заголовков, используем сохранённые индексы: %s", state.saved_indices)
+            if state.saved_indices is None:
+                if state.keep_orphans:
+                    state.orphans.append((page_number, table_number, table))
+                    return rows
+                logger.debug("Страница %s, таблица %s: пропущена, нет заголовков и сохранённых индексов",
+                             page_number, table_number)
+                current().skip(page_number, table_number, "нет заголовков")
+                return rows
+            idx_date = state.saved_indices.get("date")
+            idx_desc = state.saved_indices.get("desc")
+            idx_amount = state.saved_indices.get("amount")
+            idx_currency = state.saved_indices.get("currency")
+            idx_details = state.saved_indices.get("details")
 
-                raw_headers = table[0]
-
-                if looks_like_transaction(raw_headers) and saved_indices is not None:
-                    headers = None
-                    data_rows = table
-                    idx_date = saved_indices.get("date")
-                    idx_desc = saved_indices.get("desc")
-                    idx_amount = saved_indices.get("amount")
-                    idx_currency = saved_indices.get("currency")
-                    idx_details = saved_indices.get("details")
-                else:
-                    if len(table) > 1 and looks_like_headers(table[1]):
-                        combined = []
-                        for i in range(len(raw_headers)):
-                            h1 = raw_headers[i] or ""
-                            h2 = table[1][i] or ""
-                            combined.append((h1 + " " + h2).replace("\n", " ").strip().lower())
-                        headers = combined
-                        data_rows = table[2:]
-                    else:
-                        headers = [h.replace("\n", " ").strip().lower() if h else "" for h in raw_headers]
-                        data_rows = table[1:]
-
-                    idx_date = idx_desc = idx_amount = idx_currency = idx_details = None
-
-                    if headers and any(headers):  # определяем индексы только если есть заголовки
-                        for i, header_lower in enumerate(headers):
-                            if any(h.lower() in header_lower for h in column_map["date"]):
-                                idx_date = i
-                            elif any(h.lower() in header_lower for h in column_map["description"]):
-                                idx_desc = i
-                            elif any(h.lower() in header_lower for h in column_map["amount"]):
-                                idx_amount = i
-                            elif any(h.lower() in header_lower for h in column_map["currency"]):
-                                idx_currency = i
-                            elif any(h.lower() in header_lower for h in column_map["details"]):
-                                idx_details = i
-                        saved_indices = {
-                            "date": idx_date,
-                            "desc": idx_desc,
-                            "amount": idx_amount,
-                            "currency": idx_currency,
-                            "details": idx_details
-                        }
-                    else:  # если заголовков нет, используем сохранённые индексы
-                        print(f"    Нет заголовков, используем сохранённые индексы: {saved_indices}")
-                        if saved_indices is None:
-                            print(f"Страница {page_number}, таблица {table_number}: пропущена, нет заголовков и сохранённых индексов")
-                            continue
-                        idx_date = saved_indices.get("date")
-                        idx_desc = saved_indices.get("desc")
-                        idx_amount = saved_indices.get("amount")
-                        idx_currency = saved_indices.get("currency")
-                        idx_details = saved_indices.get("details")
-
-                if idx_date is None or idx_desc is None or idx_amount is None:
-                    print(f"Страница {page_number}, таблица {table_number}: пропущена, нет обязательных колонок")
-                    print(f"    Индексы: date={idx_date}, desc={idx_desc}, amount={idx_amount}")
-                    continue
+    if idx_date is None or idx_desc is None or idx_amount is None:
+        logger.debug("Страница %s, таблица %s: пропущена, нет обязательных колонок "
+                     "(date=%s, desc=%s, amount=%s)", page_number, table_number, idx_date, idx_desc, idx_amount)
+        current().skip(page_number, table_number, "нет обязательных колонок")
+        return rows
 
-                for row in data_rows:
-                    if row is None or len(row) <= max(idx_date, idx_desc, idx_amount):
-                        continue
+    for row in data_rows:
+        if row is None or len(row) <= max(idx_date, idx_desc, idx_amount):
+            continue
+
+        date_raw = row[idx_date]
+        desc = row[idx_desc]
+        amount_str = row[idx_amount]
+        if date_raw is None or desc is None or amount_str is None:
+            continue
+
+        full_text = desc or ""
+        if idx_details is not None and len(row) > idx_details:
+            details = row[idx_details]
+            if details:
+                full_text += " " + details
+
+        # дата и сумма остаются строками, типы им даёт normalize.normalize_frame по всей выписке
+        category = None
+        if matcher is not None:  # без matcher — сырые строки, категории проставят позже
+            category = matcher.categorize(full_text.strip())
+        currency = details = None
+        if idx_currency is not None and len(row) > idx_currency:
+            currency = row[idx_currency] or None
+        if idx_details is not None and len(row) > idx_details:
+            details = row[idx_details] or None
+
+        # номер страницы PDF — для происхождения строки в хранилище
+        rows.append(date_raw.strip(), desc.strip(), amount_str.strip(), currency=currency, details=details,
+                    page=page_number, category=category)
+
+    return rows
 
-                    date_raw = row[idx_date]
-                    desc = row[idx_desc]
-                    amount_str = row[idx_amount]
-                    if date_raw is None or desc is None or amount_str is None:
+@lru_cache(maxsize=None)
+def _transaction_hint():
+    """
+    Признаки строк выписки: даты в тех же формах, что разбирает normalize (части из 1–2 цифр,
+    пробел в качестве разделителя, ISO, ddmmyyyy), суммы с дробной частью, символы валют
+    и трёхбуквенные коды рядом с числом.
+    """
+    from normalize import DATE_PARTS_PATTERN, CURRENCY_SYMBOLS
+
+    symbols = "".join(map(re.escape, CURRENCY_SYMBOLS))
+    return re.compile("|".join((
+        rf"(?<!\d){DATE_PARTS_PATTERN}(?!\d)",
+        r"(?<!\d)\d{8}(?!\d)",
+        r"\d[.,]\d{2}(?!\d)",
+        r"\d\s?[A-Z]{3}\b|\b[A-Z]{3}\s?\d",
+        f"[{symbols}]",
+    )))
+
+def page_has_transactions(page) -> bool:
+    """
+    Есть ли на странице (pypdfium2) даты, суммы или валюты. Текстовый слой pdfium на порядки
+    дешевле разметки pdfminer, которую pdfplumber строит для поиска таблиц,
+    так что обложки и юридический текст не разбираются вовсе.
+    """
+    textpage = page.get_textpage()
+    try:
+        text = textpage.get_text_range()
+    finally:
+        textpage.close()
+    return _transaction_hint().search(text) is not None
+
+def skip_reason(page) -> str:
+    """Причина пропуска страницы (pypdfium2) без дат и сумм: сканы отмечаются отдельно, чтобы их было видно."""
+    from ocr import is_image_only
+
+    return SCANNED_REASON if is_image_only(page) else "нет дат и сумм"
+
+def warn_scanned(file_path, count):
+    if count:
+        logger.warning("%s: пропущено страниц без текстового слоя (сканов): %d, для них нужен OCR (--ocr)",
+                       file_path, count)
+
+def iter_transactions(file_path: str, matcher: CategoryMatcher = None, pages=None, state=None, registry=None,
+                      prefilter=True, engine=None, ocr=None):
+    """
+    Генератор строк выписки словарями, параметры как у iter_batches.
+    """
+    for batch in iter_batches(file_path, matcher, pages=pages, state=state, registry=registry,
+                              prefilter=prefilter, engine=engine, ocr=ocr):
+        yield from batch
+
+def iter_batches(file_path: str, matcher: CategoryMatcher = None, pages=None, state=None, registry=None,
+                 prefilter=True, engine=None, ocr=None):
+    """
+    Генератор строк выписки постранично, по RowBatch на страницу: после каждой страницы
+    кэш её объектов разметки сбрасывается, так что память не растёт с числом страниц.
+    pages: (start, stop) — срез страниц с нуля, None — весь файл
+    state: ParseState, если разбор продолжается с предыдущего куска
+    matcher: None — строки без категорий (для кэша и отдельной категоризации)
+    registry: TemplateRegistry — для известных банков шапка не ищется, таблицы
+              ищутся только в запомненной области; новый шаблон кладётся в state.learned
+    prefilter: пропускать страницы без дат, сумм и валют, не запуская поиск таблиц
+    engine: "lines" или "words"; None — как указано в шаблоне банка (по умолчанию "lines")
+    ocr: ocr.PageOcr — страницы без текстового слоя распознаются (в пуле, наперёд) и разбираются
+         как текст движка "text"; None — такие страницы пропускаются с предупреждением
+    """
+    # ~200 мс на импорт: грузятся, только когда PDF действительно разбирается
+    import pdfplumber
+    import pypdfium2 as pdfium
+
+    if state is None:
+        state = ParseState()
+    metrics = current()
+
+    # pdfium — для дешёвых проверок текста, pdfplumber — для таблиц
+    doc = pdfium.PdfDocument(file_path)
+    texts = None
+    scanned_skipped = 0
+    try:
+        with pdfplumber.open(file_path) as pdf:
+            if registry is not None and pdf.pages:
+                state.registry = registry
+                state.page_key = page_signature(doc[0])
+                if state.template is None:
+                    state.template = registry.find(page_key=state.page_key)
+                    if state.template is not None and state.saved_indices is None:
+                        state.saved_indices = state.template["indices"]
+
+            start, stop = pages if pages is not None else (0, len(pdf.pages))
+            scanned = set()
+            if ocr is not None:
+                from ocr import is_image_only
+                from extractors import text_table
+
+                scanned = {index for index in range(start, stop) if is_image_only(doc[index])}
+                texts = ocr.recognize(file_path, sorted(scanned))
+                headers = None
+            for index in range(start, stop):
+                if index in scanned:
+                    started = time.perf_counter()
+                    table, headers = text_table(next(texts).splitlines(), state, headers)
+                    page_rows = parse_table(table, matcher, state, index + 1, 1) if table else RowBatch()
+                    logger.debug("Страница %s: распознана OCR, %d строк", index + 1, len(page_rows))
+                    metrics.page(index + 1, time.perf_counter() - started, int(bool(table)), len(page_rows))
+                    if page_rows:
+                        yield page_rows
+                    continue
+                page = pdf.pages[index]
+                page_number = page.page_number
+                started = time.perf_counter()
+                try:
+                    if prefilter and not page_has_transactions(doc[index]):
+                        reason = skip_reason(doc[index])
+                        scanned_skipped += reason == SCANNED_REASON
+                        logger.debug("Страница %s: пропущена, %s", page_number, reason)
+                        metrics.skip(page_number, None, reason)
                         continue
+                    tables = _find_tables(page, state.template, engine)
+                finally:
+                    page.close()
+                logger.debug("Страница %s: найдено %d таблиц", page_number, len(tables))
+                if not tables:
+                    metrics.skip(page_number, None, "таблиц не найдено")
 
-                    date = normalize_date(date_raw)
-                    amount_str = amount_str.replace("₸", "")
-                    matches = re.findall(r"[+-]?\d[\d\s,.]*", amount_str)
-                    if matches:
-                        try:
-                            normalized = matches[0].replace(" ", "").replace("\u00A0", "")
-                            if "," in normalized and "." in normalized:
-                                normalized = normalized.replace(",", "")
-                            elif "," in normalized and "." not in normalized:
-                                normalized = normalized.replace(",", ".")
-                            amount = round(abs(float(normalized)))
-                        except ValueError:
-                            amount = None
-                    else:
-                        amount = None
-
-                    full_text = desc or ""
-                    if idx_details is not None and len(row) > idx_details:
-                        details = row[idx_details]
-                        if details:
-                            full_text += " " + details
-
-                    entry = {
-                        "date": date,
-                        "description": desc.strip(),
-                        "amount": amount,
-                        "category": categorize(full_text.strip(), categories)
-                    }
-
-                    if idx_currency is not None and len(row) > idx_currency:
-                        currency = row[idx_currency]
-                        if currency:
-                            entry["currency"] = currency
-                    if idx_details is not None and len(row) > idx_details:
-                        details = row[idx_details]
-                        if details:
-                            entry["details"] = details
-
-                    rows.append(entry)
+                page_rows = RowBatch()
+                for table_number, (bbox, table, columns_x) in enumerate(tables, start=1):
+                    state.bbox = union_bbox(state.bbox, bbox)
+                    learned = state.learned
+                    parse_table(table, matcher, state, page_number, table_number, out=page_rows)
+                    if state.learned is not None and learned is None:
+                        state.learned["columns_x"] = columns_x
+                metrics.page(page_number, time.perf_counter() - started, len(tables), len(page_rows))
+                if page_rows:
+                    yield page_rows
+    finally:
+        if texts is not None:
+            texts.close()
+        doc.close()
+
+    warn_scanned(file_path, scanned_skipped)
+    if state.learned is not None:
+        state.learned["bbox"] = state.bbox
+
+def _find_tables(page, template=None, engine=None):
+    """Список (bbox, строки таблицы, x-границы колонок) для страницы."""
+    if template is not None:
+        engine = engine or template.get("engine", "lines")
+        if engine == "words" and template.get("columns_x"):
+            table = extract_word_grid(page, template)
+            if table is not None:
+                return [table] if table[1] else []
+        settings = template.get("table_settings") or TABLE_SETTINGS
+        area = crop_to_template(page, template)
+        tables = [(t.bbox, t.extract(), _columns_x(t)) for t in area.find_tables(table_settings=settings)]
+        if tables and (area is page or not crosses_crop(page, area)):
+            return tables
+    # шаблона нет, в его области ничего не нашлось или таблица выходит за область — ищем по всей странице
+    return [(t.bbox, t.extract(), _columns_x(t)) for t in page.find_tables(table_settings=TABLE_SETTINGS)]
+
+def _columns_x(table):
+    return sorted({round(cell[0], 1) for cell in table.cells}) + [round(table.bbox[2], 1)]
+
+def extract_word_grid(page, template):
+    """
+    Движок "words": вместо поиска линий и пересечений слова страницы раскладываются
+    по колонкам с известными из шаблона x-границами. Новая строка таблицы начинается
+    со строки текста, у которой в колонке даты стоит дата; остальные строки текста —
+    перенос внутри ячеек предыдущей строки. Текст выше шапки таблицы отбрасывается.
+    None — сетка не подошла к странице (ни одной даты в колонке дат), нужен движок "lines".
+    """
+    area = crop_to_template(page, template)
+    if crosses_crop(page, area):
+        area = page
+    edges = _ruled_columns_x(area, len(template["columns_x"])) or template["columns_x"]
+    n_columns = len(edges) - 1
+    idx_date = template["indices"].get("date")
+
+    lines = []
+    for word in sorted(area.extract_words(), key=lambda w: (round(w["top"]), w["x0"])):
+        if lines and abs(word["top"] - lines[-1][0]) <= WORD_LINE_TOLERANCE:
+            lines[-1][1].append(word)
+        else:
+            lines.append((word["top"], [word]))
+
+    table = []
+    header_left = 0
+    for _, words in lines:
+        cells = [[] for _ in range(n_columns)]
+        for word in words:
+            column = bisect_right(edges, (word["x0"] + word["x1"]) / 2) - 1
+            cells[min(max(column, 0), n_columns - 1)].append(word["text"])
+        cells = [" ".join(c) for c in cells]
+        if row_signature(cells) == template["header_key"]:
+            # всё, что выше шапки (название выписки, период), к таблице не относится
+            table = [cells]
+            header_left = template["header_rows"] - 1
+            continue
+        if header_left > 0:  # вторая строка многострочной шапки — отдельной строкой, как у "lines"
+            table.append(cells)
+            header_left -= 1
+            continue
+        starts_row = idx_date is not None and DATE_HINT.search(cells[idx_date])
+        if table and not starts_row:
+            table[-1] = [f"{a}\n{b}" if a and b else a or b for a, b in zip(table[-1], cells)]
+        else:
+            table.append(cells)
+    if idx_date is not None and not any(DATE_HINT.search(row[idx_date]) for row in table):
+        return None
+    return area.bbox, table, edges
+
+def _ruled_columns_x(area, count):
+    # в расчерченной таблице ширина колонок может меняться от страницы к странице:
+    # x-границы берём по вертикальным линиям, если их столько же, сколько в шаблоне
+    xs = []
+    for x in sorted(e["x0"] for e in area.vertical_edges):
+        if not xs or x - xs[-1] > WORD_LINE_TOLERANCE:
+            xs.append(x)
+    return [round(x, 1) for x in xs] if len(xs) == count else None
+
+def parse_pdf(file_path: str, matcher: CategoryMatcher = None, pages=None, state=None, registry=None,
+              prefilter=True, engine=None):
+    """
+    Все строки выписки одной RowBatch, параметры как у iter_transactions.
+    """
+    rows = RowBatch.concat(iter_batches(file_path, matcher, pages=pages, state=state, registry=registry,
+                                        prefilter=prefilter, engine=engine))
+
+    if matcher is None or not rows:
+        return rows
 
     # Суммы по категориям
-    from collections import defaultdict
-    totals = defaultdict(float)
-    for r in rows:
-        if r.get("amount") is not None:
-            totals[r["category"]] += r["amount"]
+    from normalize import parse_amounts, detect_decimal
+
+    df = rows.to_frame()
+    amounts = parse_amounts(df["amount"], detect_decimal(df["amount"]))
+    totals = amounts.groupby(df["category"], sort=False).sum()
 
-    print("\nСуммы по категориям:")
-    for cat, total in totals.items():
-        print(f"{cat}: {total:,.2f}")
+    logger.info("Суммы по категориям:\n%s", "\n".join(f"{cat}: {total:,.2f}" for cat, total in totals.items()))
 
-    return rows
\ No newline at end of file
+    return rows
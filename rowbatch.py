@@ -0,0 +1,262 @@
+import array
+
+# Порядок ключей строки, как у словарей, которые раньше собирал parser.parse_table
+FIELDS = ("date", "description", "amount", "category", "currency", "details", "page")
+REQUIRED_FIELDS = ("date", "description", "amount")
+
+class _Text:
+    """
+    Строковая колонка в раскладке Arrow: UTF-8 всех значений подряд в bytearray, смещения
+    в array("i") и байт валидности на строку. На строку — длина текста плюс 5 байт,
+    а не отдельный объект str с заголовком.
+    """
+
+    __slots__ = ("data", "offsets", "valid", "nulls")
+
+    def __init__(self):
+        self.data = bytearray()
+        self.offsets = array.array("i", [0])
+        self.valid = bytearray()
+        self.nulls = 0
+
+    def append(self, value):
+        if value is None:
+            self.valid.append(0)
+            self.nulls += 1
+        else:
+            self.data += value.encode("utf-8")
+            self.valid.append(1)
+        self.offsets.append(len(self.data))
+
+    def get(self, i):
+        if not self.valid[i]:
+            return None
+        return self.data[self.offsets[i]:self.offsets[i + 1]].decode("utf-8")
+
+    def extend(self, other: "_Text"):
+        base = len(self.data)
+        self.data += other.data
+        self.offsets.extend(offset + base for offset in other.offsets[1:])
+        self.valid += other.valid
+        self.nulls += other.nulls
+
+    def to_arrow(self):
+        import numpy as np
+        import pyarrow as pa
+
+        # буферы отдаются Arrow без копирования; пока массив жив, bytearray нельзя дописывать
+        validity = None
+        if self.nulls:
+            validity = pa.py_buffer(np.packbits(np.frombuffer(self.valid, dtype=np.uint8), bitorder="little"))
+        return pa.StringArray.from_buffers(len(self.valid), pa.py_buffer(self.offsets), pa.py_buffer(self.data),
+                                           validity, self.nulls)
+
+    @classmethod
+    def from_arrow(cls, values) -> "_Text":
+        import numpy as np
+
+        column = cls()
+        if len(values) == 0:
+            return column
+        _, offsets_buffer, data_buffer = values.buffers()
+        offsets = np.frombuffer(offsets_buffer, dtype=np.int32)[values.offset:values.offset + len(values) + 1]
+        column.data = bytearray(memoryview(data_buffer)[offsets[0]:offsets[-1]])
+        column.offsets = array.array("i", (offsets - offsets[0]).astype(np.int32).tobytes())
+        column.valid = bytearray(values.is_valid().to_numpy(zero_copy_only=False).astype(np.uint8).tobytes())
+        column.nulls = values.null_count
+        return column
+
+class _Codes:
+    """Колонка с повторяющимися значениями (валюта, категория): коды в array("i"), -1 — нет значения."""
+
+    __slots__ = ("codes", "values", "index")
+
+    def __init__(self):
+        self.codes = array.array("i")
+        self.values = []
+        self.index = {}
+
+    def _code(self, value):
+        code = self.index.get(value)
+        if code is None:
+            code = self.index[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def append(self, value):
+        self.codes.append(-1 if value is None else self._code(value))
+
+    def get(self, i):
+        code = self.codes[i]
+        return None if code < 0 else self.values[code]
+
+    def extend(self, other: "_Codes"):
+        remap = [self._code(value) for value in other.values]
+        self.codes.extend(remap[code] if code >= 0 else -1 for code in other.codes)
+
+    def any(self):
+        return bool(self.values)
+
+    def to_arrow(self):
+        import numpy as np
+        import pyarrow as pa
+
+        codes = np.frombuffer(self.codes, dtype=np.int32)
+        indices = pa.array(codes, mask=codes < 0)
+        return pa.DictionaryArray.from_arrays(indices, pa.array(self.values, type=pa.string()))
+
+    @classmethod
+    def from_arrow(cls, values) -> "_Codes":
+        column = cls()
+        for value in values.to_pylist():
+            column.append(value)
+        return column
+
+class RowBatch:
+    """
+    Сырые строки выписки по колонкам, только на добавление: текст — в буферах раскладки Arrow,
+    валюта и категория — кодами словаря, номер страницы — int32. Вместо списка словарей:
+    ключи не повторяются в каждой строке, а в pandas/Arrow пачка уходит через to_arrow без
+    поштучного разбора словарей. Итерация по пачке даёт прежние словари — для кода,
+    которому нужны отдельные строки.
+    Сумма остаётся текстом ячейки: десятичный разделитель определяется по всей выписке
+    (normalize.detect_format), в Int64 колонку переводит normalize_frame.
+    """
+
+    def __init__(self):
+        self.date = _Text()
+        self.description = _Text()
+        self.amount = _Text()
+        self.details = _Text()
+        self.currency = _Codes()
+        self.category = _Codes()
+        self.page = array.array("i")  # -1 — страница неизвестна
+        self.length = 0
+
+    def append(self, date, description, amount, currency=None, details=None, page=None, category=None):
+        self.date.append(date)
+        self.description.append(description)
+        self.amount.append(amount)
+        self.details.append(details)
+        self.currency.append(currency)
+        self.category.append(category)
+        self.page.append(-1 if page is None else page)
+        self.length += 1
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        for i in range(self.length):
+            yield self.row(i)
+
+    def row(self, i) -> dict:
+        """Строка словарём, как раньше: необязательные ключи — только если значение есть."""
+        row = {"date": self.date.get(i), "description": self.description.get(i), "amount": self.amount.get(i)}
+        category = self.category.get(i)
+        if category is not None:
+            row["category"] = category
+        currency = self.currency.get(i)
+        if currency is not None:
+            row["currency"] = currency
+        details = self.details.get(i)
+        if details is not None:
+            row["details"] = details
+        if self.page[i] >= 0:
+            row["page"] = self.page[i]
+        return row
+
+    def extend(self, other: "RowBatch"):
+        for name in ("date", "description", "amount", "details", "currency", "category"):
+            getattr(self, name).extend(getattr(other, name))
+        self.page.extend(other.page)
+        self.length += other.length
+        return self
+
+    @classmethod
+    def concat(cls, batches) -> "RowBatch":
+        result = cls()
+        for batch in batches:
+            result.extend(batch)
+        return result
+
+    def _present(self):
+        # необязательные колонки — только если хоть в одной строке есть значение, как у DataFrame из словарей
+        present = {"category": self.category.any(), "currency": self.currency.any(),
+                   "details": self.details.nulls < self.length, "page": any(page >= 0 for page in self.page)}
+        return [name for name in FIELDS if name in REQUIRED_FIELDS or present[name]]
+
+    def _column(self, name):
+        import numpy as np
+        import pyarrow as pa
+
+        if name == "page":
+            pages = np.frombuffer(self.page, dtype=np.int32)
+            return pa.array(pages, mask=pages < 0)
+        return getattr(self, name).to_arrow()
+
+    def to_arrow(self, schema=None):
+        """
+        pa.Table: по умолчанию колонки, в которых есть значения (валюта и категория — словарём);
+        schema — ровно эти колонки и типы (недостающие — пустые), как для кэша разбора.
+        """
+        import pyarrow as pa
+
+        if schema is None:
+            names = self._present()
+            return pa.table([self._column(name) for name in names], names=names)
+        columns = []
+        for field in schema:
+            if field.name in FIELDS:
+                columns.append(self._column(field.name).cast(field.type))
+            else:
+                columns.append(pa.nulls(self.length, field.type))
+        return pa.Table.from_arrays(columns, schema=schema)
+
+    def to_frame(self):
+        """DataFrame для normalize_frame и категоризации: строки — типом str, страница — Int64."""
+        import pyarrow as pa
+
+        table = self.to_arrow()
+        for i, field in enumerate(table.schema):
+            if pa.types.is_dictionary(field.type):
+                table = table.set_column(i, field.name, table.column(i).cast(pa.string()))
+        df = table.to_pandas()
+        if "page" in df.columns:
+            df["page"] = df["page"].astype("Int64")
+        return df
+
+    @classmethod
+    def from_arrow(cls, table) -> "RowBatch":
+        """Пачка из pa.Table или pa.RecordBatch с колонками из FIELDS (например, из кэша разбора)."""
+        import numpy as np
+        import pyarrow as pa
+
+        batch = cls()
+        batch.length = table.num_rows
+        names = table.schema.names
+        for name in FIELDS:
+            if name not in names:
+                continue
+            values = table.column(name)
+            if isinstance(values, pa.ChunkedArray):
+                values = values.combine_chunks()
+            if name == "page":
+                pages = values.fill_null(-1).to_numpy(zero_copy_only=False).astype(np.int32)
+                batch.page = array.array("i", pages.tobytes())
+            elif name in ("currency", "category"):
+                setattr(batch, name, _Codes.from_arrow(values))
+            else:
+                setattr(batch, name, _Text.from_arrow(values.cast(pa.string())))
+        # колонок, которых нет в таблице, — пустые значения на каждую строку
+        for name in ("date", "description", "amount", "details"):
+            if name not in names:
+                column = getattr(batch, name)
+                for _ in range(batch.length):
+                    column.append(None)
+        for name in ("currency", "category"):
+            if name not in names:
+                getattr(batch, name).codes.extend([-1] * batch.length)
+        if "page" not in names:
+            batch.page.extend([-1] * batch.length)
+        return batch
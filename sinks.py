@@ -0,0 +1,211 @@
+import os
+import sqlite3
+from contextlib import closing
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+DETAIL_COLUMNS = ["date", "description", "amount", "category", "amount_minor", "currency", "details"]
+DETAIL_SCHEMA = pa.schema([
+    ("date", pa.timestamp("us")),
+    ("description", pa.string()),
+    ("amount", pa.int64()),
+    ("category", pa.string()),
+    ("amount_minor", pa.int64()),  # сумма со знаком в минимальных единицах валюты currency
+    ("currency", pa.string()),
+    ("details", pa.string()),
+])
+SUMMARY_SCHEMA = pa.schema([("category", pa.string()), ("amount", pa.int64())])
+EXCEL_MAX_ROWS = 1_048_576  # предел строк листа xlsx вместе с шапкой
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+def _records(df: pd.DataFrame):
+    # NaN/NaT в xlsx не пишутся, заменяем на пустые ячейки
+    values = df.astype(object).where(df.notna(), None)
+    return values.itertuples(index=False, name=None)
+
+def _arrow_table(df: pd.DataFrame, schema: pa.Schema) -> pa.Table:
+    df = df.reindex(columns=schema.names)
+    return pa.Table.from_pandas(df, schema=schema, preserve_index=False, safe=False)
+
+def _summary_path(path):
+    # у форматов с одной таблицей на файл сводка пишется рядом: report.parquet -> report.summary.parquet
+    stem, ext = os.path.splitext(path)
+    return f"{stem}.summary{ext}"
+
+class Sink:
+    """Приёмник отчёта: детализация пачками через write, сводка один раз через write_summary."""
+
+    def write(self, df: pd.DataFrame):
+        raise NotImplementedError
+
+    def write_summary(self, summary: pd.DataFrame):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def discard(self):
+        """Удаляет недописанный отчёт (вызывается после close, если запись прервалась)."""
+        for path in (self.path, _summary_path(self.path)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # закрывается всегда, иначе файл и писатель остаются открытыми; при ошибке отчёт удаляется целиком
+        try:
+            self.close()
+        finally:
+            if exc_type is not None:
+                self.discard()
+        return False
+
+class ExcelSink(Sink):
+    """
+    Потоковая запись отчёта в xlsx: openpyxl в режиме write_only сбрасывает
+    строки на диск по мере добавления, в памяти не держится весь лист.
+    Детализация больше предела xlsx продолжается на листах "Детализация 2", "Детализация 3"...
+    """
+
+    def __init__(self, path: str, columns=DETAIL_COLUMNS, max_rows=EXCEL_MAX_ROWS):
+        from openpyxl import Workbook  # ~0.3 с на импорт, нужен только для xlsx
+
+        self.path = path
+        self.columns = list(columns)
+        self.max_rows = max_rows
+        self.workbook = Workbook(write_only=True)
+        self.summary_sheet = self.workbook.create_sheet("Сводка")
+        self.detail_sheets = 0
+        self._new_detail_sheet()
+
+    def _new_detail_sheet(self):
+        self.detail_sheets += 1
+        title = "Детализация" if self.detail_sheets == 1 else f"Детализация {self.detail_sheets}"
+        self.detail_sheet = self.workbook.create_sheet(title)
+        self.detail_sheet.append(self.columns)
+        self.detail_rows = 1
+
+    def write(self, df: pd.DataFrame):
+        for record in _records(df.reindex(columns=self.columns)):
+            if self.detail_rows >= self.max_rows:
+                self._new_detail_sheet()
+            self.detail_sheet.append(record)
+            self.detail_rows += 1
+
+    def write_summary(self, summary: pd.DataFrame):
+        self.summary_sheet.append(list(summary.columns))
+        for record in _records(summary):
+            self.summary_sheet.append(record)
+
+    def close(self):
+        self.workbook.save(self.path)
+
+class ParquetSink(Sink):
+    """Детализация в Parquet (zstd) группами строк по мере записи, сводка — в <имя>.summary.parquet."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.writer = pq.ParquetWriter(path, DETAIL_SCHEMA, compression="zstd")
+
+    def write(self, df: pd.DataFrame):
+        self.writer.write_table(_arrow_table(df, DETAIL_SCHEMA))
+
+    def write_summary(self, summary: pd.DataFrame):
+        pq.write_table(_arrow_table(summary, SUMMARY_SCHEMA), _summary_path(self.path))
+
+    def close(self):
+        self.writer.close()
+
+class FeatherSink(ParquetSink):
+    """Arrow IPC (Feather v2): читается через memory map без разбора."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.writer = pa.ipc.new_file(path, DETAIL_SCHEMA)
+
+    def write_summary(self, summary: pd.DataFrame):
+        with pa.ipc.new_file(_summary_path(self.path), SUMMARY_SCHEMA) as writer:
+            writer.write_table(_arrow_table(summary, SUMMARY_SCHEMA))
+
+class CsvSink(Sink):
+    """CSV в формате выгрузки дашборда (utf-8 с BOM, разделитель ";"), сводка — в <имя>.summary.csv."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, "w", encoding="utf-8-sig", newline="")
+        self.header = True
+
+    def write(self, df: pd.DataFrame):
+        df.reindex(columns=DETAIL_COLUMNS).to_csv(self.file, index=False, sep=";", header=self.header,
+                                                  date_format=DATE_FORMAT)
+        self.header = False
+
+    def write_summary(self, summary: pd.DataFrame):
+        summary.to_csv(_summary_path(self.path), index=False, sep=";", encoding="utf-8-sig")
+
+    def close(self):
+        self.file.close()
+
+class SqliteSink(Sink):
+    """Таблицы details и summary в файле SQLite; существующие таблицы перезаписываются."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        columns = ", ".join(f"{name} {'INTEGER' if name.startswith('amount') else 'TEXT'}" for name in DETAIL_COLUMNS)
+        with self.connection:
+            self.connection.execute("DROP TABLE IF EXISTS details")
+            self.connection.execute("DROP TABLE IF EXISTS summary")
+            self.connection.execute(f"CREATE TABLE details ({columns})")
+            self.connection.execute("CREATE TABLE summary (category TEXT, amount INTEGER)")
+
+    def write(self, df: pd.DataFrame):
+        df = df.reindex(columns=DETAIL_COLUMNS)
+        df["date"] = df["date"].dt.strftime(DATE_FORMAT)
+        placeholders = ", ".join("?" * len(DETAIL_COLUMNS))
+        with self.connection:
+            self.connection.executemany(f"INSERT INTO details VALUES ({placeholders})", _records(df))
+
+    def write_summary(self, summary: pd.DataFrame):
+        with self.connection:
+            self.connection.executemany("INSERT INTO summary VALUES (?, ?)",
+                                        _records(summary.reindex(columns=SUMMARY_SCHEMA.names)))
+
+    def close(self):
+        self.connection.close()
+
+    def discard(self):
+        # файл может быть базой с другими таблицами: удаляются только таблицы отчёта
+        with closing(sqlite3.connect(self.path)) as connection, connection:
+            connection.execute("DROP TABLE IF EXISTS details")
+            connection.execute("DROP TABLE IF EXISTS summary")
+
+SINKS = {
+    "xlsx": ExcelSink,
+    "parquet": ParquetSink,
+    "feather": FeatherSink,
+    "csv": CsvSink,
+    "sqlite": SqliteSink,
+}
+EXTENSIONS = {
+    ".xlsx": "xlsx",
+    ".parquet": "parquet",
+    ".feather": "feather",
+    ".arrow": "feather",
+    ".csv": "csv",
+    ".sqlite": "sqlite",
+    ".db": "sqlite",
+}
+
+def open_sink(path: str, fmt: str = None):
+    """Приёмник отчёта по формату fmt или, если он не задан, по расширению файла (по умолчанию xlsx)."""
+    if fmt is None:
+        fmt = EXTENSIONS.get(os.path.splitext(path)[1].lower(), "xlsx")
+    if fmt not in SINKS:
+        raise ValueError(f"Неизвестный формат отчёта: {fmt}. Доступны: {', '.join(SINKS)}")
+    return SINKS[fmt](path)
@@ -0,0 +1,423 @@
+import os
+import json
+import sqlite3
+import hashlib
+import pandas as pd
+from cache import file_sha256
+from cube import AggregateCube
+from categorizer import CategoryMatcher, rules_diff, contains_any
+from dedup import dedup_keys, description_hashes
+
+DEFAULT_STORE_FILE = "transactions.sqlite"
+STORE_COLUMNS = ["date", "description", "amount", "category", "amount_minor", "currency", "details"]
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"  # в SQLite даты — текст, сравнение строк совпадает с хронологическим
+DAY = "substr(date, 1, 10)"
+FETCH_ROWS = 10000
+INSERT_ROWS = 50000  # строк на один executemany при записи
+RECATEGORIZE_ROWS = 100000  # строк за одно чтение при пересчёте категорий
+REINDEX_ROWS = 100000  # при вставке больше стольких строк (и больше, чем уже есть) индексы строятся заново
+CACHE_KB = 64 * 1024
+SCHEMA_VERSION = 1  # PRAGMA user_version; увеличить при изменении таблиц — старые файлы не откроются
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    sha256 TEXT NOT NULL,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    rows INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS transactions (
+    path TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    description TEXT,
+    amount INTEGER,
+    category TEXT,
+    amount_minor INTEGER,
+    currency TEXT,
+    details TEXT,
+    kept INTEGER NOT NULL DEFAULT 1,
+    page INTEGER,
+    desc_hash INTEGER,
+    dedup_key INTEGER,
+    rules TEXT,
+    PRIMARY KEY (path, seq)
+);
+CREATE TABLE IF NOT EXISTS summary (
+    category TEXT PRIMARY KEY,
+    amount INTEGER NOT NULL,
+    count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS daily (
+    day TEXT NOT NULL,
+    category TEXT NOT NULL,
+    amount INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (day, category)
+);
+CREATE TABLE IF NOT EXISTS rules (
+    fingerprint TEXT PRIMARY KEY,
+    categories TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+# индексы отдельно: при большой заливке они удаляются и строятся заново
+INDEXES = """
+CREATE INDEX IF NOT EXISTS transactions_date ON transactions (date);
+CREATE INDEX IF NOT EXISTS transactions_category ON transactions (category, date);
+CREATE INDEX IF NOT EXISTS transactions_description ON transactions (desc_hash);
+"""
+INDEX_NAMES = ("transactions_date", "transactions_category", "transactions_description")
+
+def categories_fingerprint(categories: dict) -> str:
+    # порядок категорий значим (при нескольких совпадениях побеждает первая), ключи не сортируем
+    text = json.dumps(categories, ensure_ascii=False)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+def _window(dates: pd.Series):
+    # дубликаты ищутся в пределах минуты, поэтому окно расширяем до целых минут
+    dates = dates.dropna()
+    if dates.empty:
+        return None
+    return dates.min()[:16] + ":00", dates.max()[:16] + ":59"
+
+def _union(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return min(a[0], b[0]), max(a[1], b[1])
+
+class TransactionStore:
+    """
+    Постоянное хранилище транзакций (SQLite): его наполняет инкрементальный анализ,
+    из него же читают дашборд и отчёты.
+    files — манифест разобранных файлов (хэш, mtime, размер, число строк),
+    transactions — строки всех файлов с происхождением (файл, страница, номер строки),
+    kept=0 у дубликатов; индексы по дате, категории и хэшу описания,
+    summary и daily — суммы по категориям и по дням × категориям с учётом только kept-строк
+    (по daily дашборд строит графики без чтения строк).
+    При добавлении файлов дедупликация и пересчёт сводки идут только
+    в окне дат, которое затронули новые и удалённые строки.
+    """
+
+    def __init__(self, path=DEFAULT_STORE_FILE):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        # WAL: дашборд читает, пока анализ пишет; synchronous=NORMAL — без fsync на каждую транзакцию
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+        self.connection.execute(f"PRAGMA cache_size = -{CACHE_KB}")  # страницы индексов при массовой вставке
+        self._check_version()
+        self.connection.executescript(SCHEMA)
+        self.connection.executescript(INDEXES)
+
+    def _check_version(self):
+        version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+        if version == SCHEMA_VERSION:
+            return
+        tables = self.connection.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table'").fetchone()[0]
+        if version or tables:
+            self.connection.close()
+            raise ValueError(f"{self.path}: хранилище со схемой версии {version}, нужна {SCHEMA_VERSION}. "
+                             "Удалите файл: analyze --incremental или ingest заполнят его заново")
+        self.connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")  # новый файл
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def get_meta(self, key):
+        row = self.connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def manifest(self) -> dict:
+        rows = self.connection.execute("SELECT path, sha256, mtime, size, rows FROM files")
+        return {path: (sha256, mtime, size, count) for path, sha256, mtime, size, count in rows}
+
+    def diff(self, files, force=False, folders=()):
+        """
+        Сравнивает файлы с манифестом: (новые или изменённые пути, {путь: хэш}, удалённые пути).
+        Файл с теми же mtime и размером не читается; при другом mtime сверяется хэш.
+        force: считать изменёнными все файлы (например, после смены версии парсера).
+        folders: папки, из которых files — полный список PDF. Удалёнными считаются только пропавшие
+                 файлы этих папок: выписки из других папок (и отдельно разобранные файлы) остаются.
+        """
+        manifest = self.manifest()
+        changed, hashes = [], {}
+        with self.connection:
+            for path in files:
+                stat = os.stat(path)
+                known = manifest.get(path)
+                if not force and known and known[2] == stat.st_size and known[1] == stat.st_mtime:
+                    continue
+                digest = file_sha256(path)
+                if not force and known and known[0] == digest:
+                    # содержимое то же (например, файл скопировали заново) — обновляем только mtime
+                    self.connection.execute("UPDATE files SET mtime = ? WHERE path = ?", (stat.st_mtime, path))
+                    continue
+                changed.append(path)
+                hashes[path] = digest
+        present = set(files)
+        folders = {os.path.normpath(folder) for folder in folders}
+        removed = [path for path in manifest
+                   if path not in present and os.path.normpath(os.path.dirname(path)) in folders]
+        return changed, hashes, removed
+
+    def _old_window(self, path):
+        row = self.connection.execute("SELECT MIN(date), MAX(date) FROM transactions WHERE path = ?", (path,)).fetchone()
+        return _window(pd.Series(row, dtype=object))
+
+    def _in_window(self, window) -> str:
+        # окно на всю базу (первая заливка архива) быстрее пройти подряд, чем по индексу дат
+        # со случайным доступом к строкам: "+date" не даёт планировщику взять индекс
+        # MIN и MAX — отдельными подзапросами: так каждый берётся с края индекса, без прохода по таблице
+        first, last = self.connection.execute(
+            "SELECT (SELECT MIN(date) FROM transactions), (SELECT MAX(date) FROM transactions)").fetchone()
+        if first is None or (window[0] <= first and last <= window[1]):
+            return "+date BETWEEN ? AND ?"
+        return "date BETWEEN ? AND ?"
+
+    def _kept_totals(self, window) -> pd.DataFrame:
+        return pd.read_sql_query(
+            f"SELECT {DAY} AS day, category, COALESCE(SUM(amount), 0) AS amount, COUNT(*) AS count "
+            f"FROM transactions WHERE kept = 1 AND {self._in_window(window)} GROUP BY day, category",
+            self.connection, params=window,
+        )
+
+    def update(self, frames: dict, hashes: dict, removed=(), rules=None):
+        """
+        Заменяет строки изменённых файлов и удаляет строки пропавших, одной транзакцией.
+        frames: {путь: DataFrame с колонками STORE_COLUMNS} — уже нормализованные и категоризированные
+                строки; None — в файле нет транзакций.
+        rules: отпечаток правил (categories_fingerprint), которыми проставлены категории в frames.
+        Возвращает окно дат (начало, конец), в котором пересчитаны дубликаты и сводка, или None.
+        """
+        window = None
+        for path in list(frames) + list(removed):
+            window = _union(window, self._old_window(path))
+        prepared = {}
+        for path, df in frames.items():
+            if df is None or df.empty:
+                prepared[path] = pd.DataFrame(columns=STORE_COLUMNS)
+                continue
+            page = df["page"] if "page" in df.columns else None
+            key = dedup_keys(df).view("int64")  # хэши — int64, чтобы поместиться в INTEGER SQLite
+            df = df.reindex(columns=STORE_COLUMNS).copy()
+            df["date"] = df["date"].dt.strftime(DATE_FORMAT)
+            for column in ("amount", "amount_minor"):
+                df[column] = df[column].astype(object).where(df[column].notna(), None)
+            df["page"] = page.astype("Int64").astype(object).where(page.notna(), None) if page is not None else None
+            df["desc_hash"] = description_hashes(df["description"])
+            df["dedup_key"] = key
+            df["rules"] = rules
+            prepared[path] = df.astype(object).where(df.notna(), None)
+            window = _union(window, _window(prepared[path]["date"]))
+
+        with self.connection:
+            before = self._kept_totals(window) if window else None
+            for path in list(frames) + list(removed):
+                self.connection.execute("DELETE FROM transactions WHERE path = ?", (path,))
+                self.connection.execute("DELETE FROM files WHERE path = ?", (path,))
+            # большая заливка (первый запуск, архив за годы): индексы дешевле построить заново
+            # одной сортировкой, чем обновлять на каждую вставку
+            rebuild = sum(len(df) for df in prepared.values()) > max(REINDEX_ROWS, self._count())
+            if rebuild:
+                self._drop_indexes()
+            for path, df in prepared.items():
+                self._insert(path, df)
+                stat = os.stat(path)
+                self.connection.execute(
+                    "INSERT INTO files (path, sha256, mtime, size, rows) VALUES (?, ?, ?, ?, ?)",
+                    (path, hashes[path], stat.st_mtime, stat.st_size, len(df)),
+                )
+            if rebuild:
+                self._create_indexes()
+            if window:
+                self._dedup(window)
+                self._apply_totals(before, self._kept_totals(window))
+            if frames or removed:
+                self._bump_revision()
+        return window
+
+    def _insert(self, path, df: pd.DataFrame):
+        # колонки целиком в кортежи и executemany пачками: без построчного Python-кода на стороне pandas
+        columns = list(df.columns)
+        placeholders = ", ".join("?" * (len(columns) + 2))
+        sql = f"INSERT INTO transactions (path, seq, {', '.join(columns)}) VALUES ({placeholders})"
+        values = [df[column].tolist() for column in columns]
+        for start in range(0, len(df), INSERT_ROWS):
+            stop = min(start + INSERT_ROWS, len(df))
+            self.connection.executemany(sql, zip(
+                [path] * (stop - start), range(start, stop), *(column[start:stop] for column in values)))
+
+    def _count(self) -> int:
+        # по манифесту: COUNT(*) по transactions — полный проход
+        return self.connection.execute("SELECT COALESCE(SUM(rows), 0) FROM files").fetchone()[0]
+
+    def _drop_indexes(self):
+        for name in INDEX_NAMES:
+            self.connection.execute(f"DROP INDEX IF EXISTS {name}")
+
+    def _create_indexes(self):
+        # по одной команде: executescript зафиксировал бы открытую транзакцию
+        for statement in INDEXES.split(";"):
+            if statement.strip():
+                self.connection.execute(statement)
+
+    def _bump_revision(self):
+        # номер версии данных: по нему дашборд понимает, что кэшированные агрегаты устарели
+        self.connection.execute(
+            "INSERT INTO meta (key, value) VALUES ('revision', '1') "
+            "ON CONFLICT (key) DO UPDATE SET value = CAST(value AS INTEGER) + 1"
+        )
+
+    def revision(self) -> int:
+        return int(self.get_meta("revision") or 0)
+
+    def _dedup(self, window):
+        # первая встреча ключа (минута, сумма, описание) в порядке файлов и строк остаётся, остальные — kept=0;
+        # хэши ключей посчитаны при вставке, так что читаются только числа
+        df = pd.read_sql_query(
+            f"SELECT rowid, path, seq, dedup_key, kept FROM transactions WHERE {self._in_window(window)}",
+            self.connection, params=window,
+        ).sort_values(["path", "seq"], kind="stable", ignore_index=True)  # сортировка в pandas дешевле ORDER BY
+        kept = (~df["dedup_key"].duplicated()).astype(int)
+        changed = kept.to_numpy() != df["kept"].to_numpy()  # новые строки уже с kept=1
+        self.connection.executemany(
+            "UPDATE transactions SET kept = ? WHERE rowid = ?",
+            zip(kept[changed].tolist(), df["rowid"][changed].tolist()),
+        )
+
+    def _apply_totals(self, before: pd.DataFrame, after: pd.DataFrame):
+        # NULL-категория не годится в ключ ON CONFLICT, поэтому в итогах это ""
+        before, after = (df.fillna({"category": ""}).set_index(["day", "category"]) for df in (before, after))
+        delta = after.sub(before, fill_value=0)
+        delta = delta[(delta["amount"] != 0) | (delta["count"] != 0)]
+        self.connection.executemany(
+            "INSERT INTO daily (day, category, amount, count) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (day, category) DO UPDATE SET amount = amount + excluded.amount, count = count + excluded.count",
+            ((day, category, int(amount), int(count)) for (day, category), amount, count in delta.itertuples(name=None)),
+        )
+        by_category = delta.groupby(level="category").sum()
+        self.connection.executemany(
+            "INSERT INTO summary (category, amount, count) VALUES (?, ?, ?) "
+            "ON CONFLICT (category) DO UPDATE SET amount = amount + excluded.amount, count = count + excluded.count",
+            ((category, int(amount), int(count)) for category, amount, count in by_category.itertuples(name=None)),
+        )
+        self.connection.execute("DELETE FROM daily WHERE count <= 0")
+        self.connection.execute("DELETE FROM summary WHERE count <= 0")
+
+    def _rules(self, fingerprint):
+        row = self.connection.execute("SELECT categories FROM rules WHERE fingerprint = ?", (fingerprint,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def recategorize(self, matcher: CategoryMatcher) -> int:
+        """
+        Переводит строки на правила matcher (после правки categories.json) без повторного разбора PDF.
+        У каждой строки хранится отпечаток правил, которыми она категоризирована; по разнице
+        ключевых слов между той версией и новой заново категоризируются только строки, в тексте
+        которых есть добавленное или убранное слово. Сводки правятся на разницу сумм.
+        Возвращает число строк, у которых сменилась категория.
+        """
+        fingerprint = categories_fingerprint(matcher.categories)
+        updates = []
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR IGNORE INTO rules (fingerprint, categories) VALUES (?, ?)",
+                (fingerprint, json.dumps(matcher.categories, ensure_ascii=False)),
+            )
+            versions = [row[0] for row in self.connection.execute(
+                "SELECT DISTINCT rules FROM transactions WHERE rules IS NOT ?", (fingerprint,))]
+            for version in versions:
+                old = self._rules(version)
+                keywords = rules_diff(old, matcher.categories) if old is not None else None
+                if keywords is not None and not keywords:
+                    continue
+                for rows in pd.read_sql_query(
+                    "SELECT rowid, category, description, details FROM transactions WHERE rules IS ?",
+                    self.connection, params=(version,), chunksize=RECATEGORIZE_ROWS,
+                ):
+                    text = (rows["description"].fillna("") + " " + rows["details"].fillna("")).str.strip()
+                    if keywords is not None:
+                        affected = contains_any(text, keywords)
+                        rows, text = rows[affected], text[affected]
+                    category = pd.Series(matcher.categorize_many(text), index=rows.index, dtype=object)
+                    moved = category != rows["category"].astype(object)
+                    updates.append(pd.DataFrame({"rowid": rows["rowid"][moved], "new_category": category[moved]}))
+            moved = pd.concat(updates, ignore_index=True) if updates else pd.DataFrame(columns=["rowid", "new_category"])
+            if not moved.empty:
+                # старые категории и суммы — только для сменивших категорию строк, чтобы поправить сводки
+                rows = pd.read_sql_query(
+                    f"SELECT rowid, {DAY} AS day, amount, category FROM transactions "
+                    "WHERE kept = 1 AND rowid IN (SELECT value FROM json_each(?))",
+                    self.connection, params=(json.dumps(moved["rowid"].tolist()),),
+                ).merge(moved, on="rowid")
+                for category, rowids in moved.groupby("new_category")["rowid"]:
+                    self.connection.execute(
+                        "UPDATE transactions SET category = ? WHERE rowid IN (SELECT value FROM json_each(?))",
+                        (category, json.dumps(rowids.tolist())),
+                    )
+
+                def totals(column):
+                    return (rows.groupby(["day", column], dropna=False)["amount"]
+                            .agg(amount="sum", count="size").reset_index()
+                            .rename(columns={column: "category"}))
+                self._apply_totals(totals("category"), totals("new_category"))
+                self._bump_revision()
+            self.connection.execute("UPDATE transactions SET rules = ? WHERE rules IS NOT ?", (fingerprint, fingerprint))
+        return len(moved)
+
+    def duplicates(self) -> dict:
+        rows = self.connection.execute("SELECT path, COUNT(*) - SUM(kept) FROM transactions GROUP BY path")
+        return {path: count for path, count in rows}
+
+    def summary(self) -> pd.DataFrame:
+        return pd.read_sql_query("SELECT category, amount FROM summary ORDER BY category", self.connection)
+
+    def cube(self) -> AggregateCube:
+        """Куб дни × категории из таблицы daily — без чтения самих строк."""
+        totals = pd.read_sql_query("SELECT day, category, amount, count FROM daily", self.connection)
+        return AggregateCube.from_totals(totals)
+
+    def same_description(self, description: str) -> pd.DataFrame:
+        """Все операции с тем же описанием (без учёта пробелов и переносов) — поиск по индексу хэша."""
+        key = int(description_hashes(pd.Series([description]))[0])
+        columns = ", ".join(STORE_COLUMNS)
+        df = pd.read_sql_query(
+            f"SELECT path, page, seq, {columns} FROM transactions WHERE desc_hash = ? AND kept = 1 ORDER BY date",
+            self.connection, params=(key,),
+        )
+        df["date"] = pd.to_datetime(df["date"], format=DATE_FORMAT)
+        return df
+
+    def iter_frames(self, chunk_rows=FETCH_ROWS):
+        """Строки без дубликатов пачками DataFrame в порядке файлов."""
+        columns = ", ".join(STORE_COLUMNS)
+        for df in pd.read_sql_query(
+            f"SELECT {columns} FROM transactions WHERE kept = 1 ORDER BY path, seq",
+            self.connection, chunksize=chunk_rows,
+        ):
+            df["date"] = pd.to_datetime(df["date"], format=DATE_FORMAT)
+            df["amount"] = df["amount"].astype("Int64")
+            df["amount_minor"] = df["amount_minor"].astype("Int64")
+            yield df
+
+    def frame(self) -> pd.DataFrame:
+        frames = list(self.iter_frames())
+        if not frames:
+            return pd.DataFrame(columns=STORE_COLUMNS)
+        return pd.concat(frames, ignore_index=True)
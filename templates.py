@@ -0,0 +1,107 @@
+import os
+import re
+import json
+import hashlib
+
+DEFAULT_TEMPLATES_FILE = "bank_templates.json"
+BBOX_MARGIN = 10  # запас вокруг известной области таблиц, pt
+
+def _signature(text: str):
+    # цифры (номера счетов, даты, суммы) выкидываем — остаётся вид документа
+    text = " ".join(re.sub(r"\d+", " ", text.lower()).split())
+    if not text:
+        return None
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+def page_signature(page, lines=3):
+    """
+    Отпечаток выписки по первым строкам текста в верхней четверти первой страницы.
+    page — страница pypdfium2: текстовый слой без разбора разметки pdfminer.
+    """
+    width, height = page.get_size()
+    textpage = page.get_textpage()
+    try:
+        top = textpage.get_text_bounded(0, height * 3 / 4, width, height)  # у pdfium y растёт вверх
+    finally:
+        textpage.close()
+    return _signature("\n".join(top.splitlines()[:lines]))
+
+def row_signature(row):
+    return _signature(" ".join(c or "" for c in row))
+
+def union_bbox(a, b):
+    if a is None:
+        return tuple(b)
+    return (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+
+class TemplateRegistry:
+    """
+    Шаблоны выписок по банкам: отпечаток первой страницы и строки шапки ->
+    индексы колонок, число строк шапки, настройки таблиц и область таблиц на странице.
+    Шаблон запоминается после первого удачно разобранного файла и хранится в JSON.
+    """
+
+    def __init__(self, path=DEFAULT_TEMPLATES_FILE):
+        self.path = path
+        self.templates = []
+        self.changed = False
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.templates = json.load(f)
+
+    def find(self, page_key=None, header_key=None):
+        for template in self.templates:
+            if page_key and template.get("page_key") == page_key:
+                return template
+            if header_key and template.get("header_key") == header_key:
+                return template
+        return None
+
+    def add(self, learned):
+        template = self.find(learned.get("page_key"), learned["header_key"])
+        if template is None:
+            self.templates.append(dict(learned))
+        elif learned.get("bbox"):
+            template["bbox"] = list(union_bbox(template.get("bbox"), learned["bbox"]))
+        else:
+            return
+        self.changed = True
+
+    def save(self):
+        if not self.changed or not self.path:
+            return
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.templates, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
+        self.changed = False
+
+def crop_to_template(page, template):
+    """
+    Область поиска таблиц по шаблону: x-границы и верх известной области таблиц (с запасом),
+    низ — до конца страницы. Область выучена по первой выписке банка, а следующие бывают длиннее,
+    поэтому снизу не обрезаем.
+    """
+    bbox = template.get("bbox")
+    if not bbox:
+        return page
+    x0 = max(page.bbox[0], bbox[0] - BBOX_MARGIN)
+    top = max(page.bbox[1], bbox[1] - BBOX_MARGIN)
+    x1 = min(page.bbox[2], bbox[2] + BBOX_MARGIN)
+    if x0 >= x1 or top >= page.bbox[3]:
+        return page
+    return page.crop((x0, top, x1, page.bbox[3]))
+
+def crosses_crop(page, area, tolerance=1.0):
+    """
+    Линии таблиц страницы пересекают левый, правый или верхний край области: таблица шире шаблона
+    или начинается выше (продолжение на следующей странице), и в области она обрезана.
+    """
+    x0, top, x1, _ = area.bbox
+    for edge in page.edges:
+        if edge["orientation"] == "v":
+            if x0 <= edge["x0"] <= x1 and edge["top"] < top - tolerance and edge["bottom"] > top + tolerance:
+                return True
+        elif edge["bottom"] > top and (edge["x0"] < x0 - tolerance < edge["x1"] or edge["x0"] < x1 + tolerance < edge["x1"]):
+            return True
+    return False